@@ -78,5 +78,9 @@ class AgentManager:
         if self._message_bus:
             await self._message_bus.cleanup()
 
+        # Đóng async Neo4j driver dùng bởi các agent
+        from ...neo4j_client.connection import close_async_neo4j_connection
+        await close_async_neo4j_connection()
+
 # Global instance
 agent_manager = AgentManager() 
\ No newline at end of file
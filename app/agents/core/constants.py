@@ -70,6 +70,11 @@ SUCCESS_MESSAGES = {
     "SYSTEM_STOPPED": "Hệ thống đã dừng",
 }
 
+# Timeout settings (seconds)
+TIMEOUT_SETTINGS = {
+    "query": 30,  # Thời gian chờ tối đa để lấy slot truy vấn Neo4j
+}
+
 # Face recognition constants
 FACE_RECOGNITION_MODEL_PATH = "models/face_recognition"
 FACE_RECOGNITION_THRESHOLD = 0.6
@@ -1,9 +1,14 @@
 from typing import Dict, Any, List, Optional, Callable
 import asyncio
+import hashlib
+import json
 import logging
 import time
+import unicodedata
 import gc
+import threading
 import psutil
+from collections import OrderedDict
 from functools import wraps
 from datetime import datetime
 
@@ -39,48 +44,66 @@ def async_timeout(seconds: float):
     return decorator
 
 class AsyncCache:
-    """Async cache with TTL"""
-    def __init__(self, ttl: int = 3600):
-        self._cache: Dict[str, Dict[str, Any]] = {}
+    """Async LRU cache with TTL, size bound and hit/miss stats
+
+    Uses a threading lock (held only for dict operations, never across an await)
+    so one cache can be shared by coroutines on different event loops.
+    """
+    def __init__(self, ttl: int = 3600, max_size: int = 1000):
+        self._cache: OrderedDict = OrderedDict()
         self._ttl = ttl
-        self._lock = asyncio.Lock()
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
         
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache if not expired"""
-        async with self._lock:
+        with self._lock:
             if key not in self._cache:
+                self._misses += 1
                 return None
                 
             item = self._cache[key]
-            if time.time() - item['timestamp'] > self._ttl:
+            if time.time() - item['timestamp'] > item['ttl']:
                 del self._cache[key]
+                self._expirations += 1
+                self._misses += 1
                 return None
                 
+            self._cache.move_to_end(key)
+            self._hits += 1
             return item['value']
             
     async def set(self, key: str, value: Any, ttl: Optional[int] = None):
-        """Set value in cache with optional TTL"""
-        async with self._lock:
+        """Set value in cache with optional TTL, evicting the least recently used items"""
+        with self._lock:
             self._cache[key] = {
                 'value': value,
                 'timestamp': time.time(),
                 'ttl': ttl or self._ttl
             }
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+                self._evictions += 1
             
     async def delete(self, key: str):
         """Delete value from cache"""
-        async with self._lock:
+        with self._lock:
             if key in self._cache:
                 del self._cache[key]
                 
     async def clear(self):
         """Clear all cache"""
-        async with self._lock:
+        with self._lock:
             self._cache.clear()
             
     async def cleanup(self):
         """Remove expired items"""
-        async with self._lock:
+        with self._lock:
             now = time.time()
             expired_keys = [
                 key for key, item in self._cache.items()
@@ -88,6 +111,75 @@ class AsyncCache:
             ]
             for key in expired_keys:
                 del self._cache[key]
+            self._expirations += len(expired_keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics"""
+        requests = self._hits + self._misses
+        return {
+            'size': len(self._cache),
+            'max_size': self._max_size,
+            'ttl': self._ttl,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': self._hits / requests if requests else 0.0,
+            'evictions': self._evictions,
+            'expirations': self._expirations
+        }
+
+def _normalize_text(value: Any) -> str:
+    """Lowercase, NFC-normalize and collapse whitespace"""
+    text = unicodedata.normalize('NFC', str(value)).lower()
+    return ' '.join(text.split())
+
+def _normalize_names(names: Any) -> List[str]:
+    """Flatten names (list or {'vi': [...], 'en': [...]}) into a sorted, de-duplicated list"""
+    if isinstance(names, dict):
+        names = [name for values in names.values() for name in (values or [])]
+    elif isinstance(names, str):
+        names = [names]
+    return sorted({_normalize_text(name) for name in names or [] if name})
+
+def _canonical(value: Any) -> Any:
+    """Canonical JSON-able form: dict keys sorted by json.dumps, strings normalized, sets sorted"""
+    if isinstance(value, dict):
+        return {_normalize_text(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_canonical(item) for item in value]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True)) if isinstance(value, set) else items
+    if isinstance(value, str):
+        return _normalize_text(value)
+    return value
+
+def intent_fingerprint(intent_data: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Canonical fingerprint of extracted intent data, used as a result cache key
+
+    Only the fields that decide the query are included (intent type, product and
+    category names, filters, store/order flags, statistical fields), so the same
+    question asked in different words maps to the same key.
+
+    Args:
+        intent_data: Extracted intent data
+        extra: Additional fields that decide the result (e.g. derived query shape)
+
+    Returns:
+        Hex digest of the canonical form
+    """
+    canonical = {
+        'intent_type': _normalize_text(intent_data.get('intent_type') or intent_data.get('type') or ''),
+        'product_names': _normalize_names(intent_data.get('product_names')),
+        'category_names': _normalize_names(intent_data.get('category_names')),
+        'filters': _canonical(intent_data.get('filters') or {}),
+        'is_store_query': bool(intent_data.get('is_store_query')),
+        'is_order_query': bool(intent_data.get('is_order_query')),
+        'statistical_type': intent_data.get('statistical_type'),
+        'attributes': _normalize_names(intent_data.get('attributes')),
+        'comparison_value': _canonical(intent_data.get('comparison_value')),
+        'extra': _canonical(extra or {})
+    }
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
 class AsyncRateLimiter:
     """Rate limiter for async functions"""
@@ -99,7 +191,7 @@ class AsyncRateLimiter:
         
     async def acquire(self):
         """Acquire rate limit token"""
-        async with self._lock:
+        with self._lock:
             now = time.time()
             
             # Remove old calls
@@ -115,7 +207,7 @@ class AsyncRateLimiter:
             
     async def release(self):
         """Release rate limit token"""
-        async with self._lock:
+        with self._lock:
             if self._calls:
                 self._calls.pop(0)
 
@@ -2,9 +2,40 @@
 Database operations for Customer Agent
 """
 import json
-from ...neo4j_client.connection import execute_query, execute_query_with_semaphore
+from ...neo4j_client.connection import (
+    execute_query, execute_query_with_semaphore, execute_write_batch, execute_point_lookup
+)
+from ...neo4j_client.batch_loader import BatchLoader
 from ...utils.logger import log_info, log_error, log_warning
 
+def _load_customers_by_ids(ids):
+    """Batch function: {id: customer} cho các id (số hoặc chuỗi) tìm thấy"""
+    query = """
+    UNWIND $ids AS id
+    MATCH (c:Customer)
+    WHERE c.id = id
+    WITH id, head(collect(c {.*})) AS customer
+    RETURN id AS key, customer
+    """
+    result = execute_query_with_semaphore(query, {'ids': ids}, use_cache=False)
+    return {row['key']: row['customer'] for row in result}
+
+def _load_embeddings_by_ids(ids):
+    """Batch function: {id: embedding} cho các khách hàng có embedding"""
+    query = """
+    UNWIND $ids AS id
+    MATCH (c:Customer {id: id})
+    WITH id, head(collect(c.embedding)) AS embedding
+    WHERE embedding IS NOT NULL
+    RETURN id AS key, embedding
+    """
+    result = execute_query_with_semaphore(query, {'ids': ids}, use_cache=False)
+    return {row['key']: row['embedding'] for row in result}
+
+# Gom các tra cứu theo id từ nhiều request đồng thời thành một truy vấn UNWIND
+_customer_loader = BatchLoader(_load_customers_by_ids, name="customer")
+_embedding_loader = BatchLoader(_load_embeddings_by_ids, name="customer_embedding")
+
 class CustomerDB:
     """Class xử lý các thao tác cơ sở dữ liệu liên quan đến khách hàng"""
 
@@ -32,36 +63,22 @@ class CustomerDB:
                 customer_id_int = int(customer_id)
                 log_info(f"Thử tìm khách hàng với ID dạng số: {customer_id_int}")
 
-                query = """
-                MATCH (c:Customer)
-                WHERE c.id = $customer_id
-                RETURN c {.*} as customer
-                LIMIT 1
-                """
-
-                result = execute_query_with_semaphore(query, {'customer_id': customer_id_int}, use_cache=False)
+                customer = _customer_loader.load(customer_id_int)
 
-                if result and 'customer' in result[0]:
+                if customer:
                     log_info(f"Tìm thấy khách hàng với ID số {customer_id_int}")
-                    return result[0]['customer']
+                    return customer
             except (ValueError, TypeError):
                 log_info(f"customer_id '{customer_id}' không phải dạng số")
 
             # Nếu không tìm thấy với ID số, thử với ID dạng chuỗi
             log_info(f"Thử tìm khách hàng với ID dạng chuỗi: {customer_id}")
 
-            query = """
-            MATCH (c:Customer)
-            WHERE c.id = $customer_id
-            RETURN c {.*} as customer
-            LIMIT 1
-            """
-
-            result = execute_query_with_semaphore(query, {'customer_id': str(customer_id)}, use_cache=False)
+            customer = _customer_loader.load(str(customer_id))
 
-            if result and 'customer' in result[0]:
+            if customer:
                 log_info(f"Tìm thấy khách hàng với ID chuỗi {customer_id}")
-                return result[0]['customer']
+                return customer
 
             log_warning(f"Không tìm thấy khách hàng với ID {customer_id} (cả dạng số và chuỗi)")
             return None
@@ -170,7 +187,9 @@ class CustomerDB:
             RETURN c.embedding as embedding
             """
 
-            result = execute_query_with_semaphore(query, {'customer_id': customer_id}, use_cache=True)
+            # Dùng chung cache với truy vấn đơn lẻ; khi cache miss thì gom với các tra cứu đồng thời khác
+            result = execute_point_lookup(query, {'customer_id': customer_id}, _embedding_loader,
+                                          customer_id, 'embedding')
 
             if not result or 'embedding' not in result[0] or not result[0]['embedding']:
                 return []
@@ -187,6 +206,44 @@ class CustomerDB:
             log_error(f"Lỗi khi lấy embedding của khách hàng {customer_id}: {str(e)}")
             return []
 
+    def update_customer_embeddings(self, embeddings_by_customer, batch_size=None):
+        """
+        Cập nhật vector đặc trưng khuôn mặt cho nhiều khách hàng bằng ghi hàng loạt (UNWIND)
+
+        Args:
+            embeddings_by_customer (dict): {customer_id: danh sách vector đặc trưng}
+            batch_size (int): Số khách hàng mỗi lô ghi
+
+        Returns:
+            int: Số khách hàng đã được cập nhật
+        """
+        try:
+            rows = []
+            for customer_id, embeddings in embeddings_by_customer.items():
+                # Lưu dưới dạng chuỗi JSON giống get_customer_embedding
+                serializable = [list(map(float, embedding)) for embedding in embeddings]
+                rows.append({'customer_id': customer_id, 'embedding': json.dumps(serializable)})
+
+            if not rows:
+                return 0
+
+            query = """
+            UNWIND $rows AS row
+            MATCH (c:Customer {id: row.customer_id})
+            SET c.embedding = row.embedding
+            """
+
+            result = execute_write_batch(query, rows, batch_size=batch_size)
+            if not result['success']:
+                log_warning(f"Cập nhật embedding: {result['failedBatches']}/{result['batches']} lô ghi thất bại")
+
+            log_info(f"Đã cập nhật embedding cho {result['rows']} khách hàng")
+            return result['rows']
+
+        except Exception as e:
+            log_error(f"Lỗi khi cập nhật embedding của khách hàng: {str(e)}")
+            return 0
+
     def get_all_customer_orders(self, customer_id):
         """
         Lấy toàn bộ danh sách đơn hàng của khách hàng để hiển thị trong popup "Thông tin toàn bộ đơn hàng"
@@ -13,7 +13,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import multiprocessing
 
 from ...utils.logger import log_info, log_error, log_warning
-from ...neo4j_client.connection import execute_query_with_semaphore
+from ...neo4j_client.connection import stream_query
 from .customer_db import CustomerDB
 from ...utils.cv2_wrapper import cv2
 from insightface.model_zoo import get_model
@@ -1051,26 +1051,16 @@ class FaceAuthManager:
                 """
 
                 log_info("🔍 Đang truy vấn face embeddings từ Neo4j...")
-                result = execute_query_with_semaphore(
-                    query,
-                    use_cache=True,
-                    max_retries=5,
-                    retry_delay=2,
-                    semaphore_timeout=30
-                )
-
-                if not result:
-                    log_warning("❌ Không tìm thấy khách hàng nào có embedding trong cơ sở dữ liệu")
-                    self.embeddings_loaded = False
-                    return False
-
-                log_info(f"✅ Tìm thấy {len(result)} khách hàng có embedding")
+                # Stream từng khách hàng thay vì tải toàn bộ kết quả (và bản sao trong cache) vào bộ nhớ
+                result = stream_query(query, max_retries=5, retry_delay=2)
 
-                # Xóa cache cũ
-                self.all_customer_embeddings = []
+                # Dựng danh sách mới rồi mới thay thế, để verify_face vẫn dùng được embedding cũ trong lúc tải
+                loaded_embeddings = []
+                customer_count = 0
 
                 # Xử lý kết quả truy vấn
                 for customer in result:
+                    customer_count += 1
                     customer_id = customer['id']
                     customer_name = customer['name']
 
@@ -1093,7 +1083,7 @@ class FaceAuthManager:
                                     continue
 
                         if embeddings:
-                            self.all_customer_embeddings.append({
+                            loaded_embeddings.append({
                                 'customer_id': customer_id,
                                 'customer_name': customer_name,
                                 'embeddings': embeddings
@@ -1146,7 +1136,7 @@ class FaceAuthManager:
 
                             if numpy_embeddings:
                                 # Lưu thông tin khách hàng và embedding vào cache
-                                self.all_customer_embeddings.append({
+                                loaded_embeddings.append({
                                     'customer_id': customer_id,
                                     'customer_name': customer_name,
                                     'embeddings': numpy_embeddings
@@ -1162,6 +1152,14 @@ class FaceAuthManager:
                         log_error(f"❌ Lỗi khi xử lý embedding của khách hàng {customer_name} (ID: {customer_id}): {str(e)}")
                         continue
 
+                if customer_count == 0:
+                    log_warning("❌ Không tìm thấy khách hàng nào có embedding trong cơ sở dữ liệu")
+                    self.embeddings_loaded = False
+                    return False
+
+                log_info(f"✅ Tìm thấy {customer_count} khách hàng có embedding")
+
+                self.all_customer_embeddings = loaded_embeddings
                 log_info(f"✅ Đã tải thành công embedding của {len(self.all_customer_embeddings)} khách hàng")
                 self.embeddings_loaded = True
                 self._last_embedding_load_time = datetime.now()
@@ -0,0 +1,208 @@
+"""
+Product community registry for GraphRAG agent
+
+Tải toàn bộ ProductCommunity cùng các sản phẩm của chúng trong một truy vấn (collect()),
+giải mã keywords/faq/embedding từ chuỗi JSON một lần, và giữ kết quả trong bộ nhớ với các
+chỉ mục theo id, sản phẩm và từ khóa. Registry chỉ được tải lại khi gọi refresh.
+"""
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
+import numpy as np
+from app.utils.logger import log_info, log_error
+from app.neo4j_client.connection import execute_query_with_semaphore
+
+_COMMUNITIES_QUERY = """
+MATCH (pc:ProductCommunity)
+WHERE pc.id IS NOT NULL
+OPTIONAL MATCH (pc)-[:CONTAINS_PRODUCT]->(p:Product)
+RETURN pc.id AS id,
+       pc.name AS name,
+       pc.common_features AS common_features,
+       pc.differences AS differences,
+       pc.variant_relationships AS variant_relationships,
+       pc.target_customers AS target_customers,
+       pc.marketing_suggestions AS marketing_suggestions,
+       pc.faq AS faq,
+       pc.keywords AS keywords,
+       pc.embedding AS embedding,
+       collect(p {.id, .name, description: p.descriptions}) AS products
+"""
+
+def _decode_json(value: Any, default: Any) -> Any:
+    """Giải mã thuộc tính lưu dưới dạng chuỗi JSON (giá trị khác giữ nguyên)"""
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return default
+
+def _decode_keywords(value: Any) -> List[str]:
+    keywords = _decode_json(value, None)
+    if keywords is None:
+        # Chuỗi không phải JSON là một từ khóa
+        return [value] if isinstance(value, str) else []
+    if isinstance(keywords, str):
+        return [keywords]
+    return [str(keyword) for keyword in keywords]
+
+def decode_embedding(value: Any) -> Optional[np.ndarray]:
+    """Embedding (list hoặc chuỗi JSON) thành mảng float32, None nếu không hợp lệ"""
+    embedding = _decode_json(value, None)
+    if not embedding:
+        return None
+    try:
+        return np.asarray(embedding, dtype=np.float32)
+    except (TypeError, ValueError):
+        return None
+
+@dataclass
+class CommunityProduct:
+    """Sản phẩm thuộc một ProductCommunity"""
+    id: Any
+    name: str = ""
+    description: str = ""
+
+@dataclass
+class ProductCommunity:
+    """Một ProductCommunity đã giải mã"""
+    id: Any
+    name: str = ""
+    common_features: str = ""
+    differences: str = ""
+    variant_relationships: str = ""
+    target_customers: str = ""
+    marketing_suggestions: str = ""
+    faq: List[Any] = field(default_factory=list)
+    keywords: List[str] = field(default_factory=list)
+    embedding: Optional[np.ndarray] = None
+    products: List[CommunityProduct] = field(default_factory=list)
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "ProductCommunity":
+        faq = _decode_json(record.get("faq"), [])
+        return cls(
+            id=record.get("id"),
+            name=record.get("name") or "",
+            common_features=record.get("common_features") or "",
+            differences=record.get("differences") or "",
+            variant_relationships=record.get("variant_relationships") or "",
+            target_customers=record.get("target_customers") or "",
+            marketing_suggestions=record.get("marketing_suggestions") or "",
+            faq=faq if isinstance(faq, list) else [],
+            keywords=_decode_keywords(record.get("keywords")),
+            embedding=decode_embedding(record.get("embedding")),
+            products=[
+                CommunityProduct(
+                    id=product.get("id"),
+                    name=product.get("name") or "",
+                    description=product.get("description") or ""
+                )
+                for product in record.get("products") or []
+            ]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng dict như kết quả của load_product_communities trước đây"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "common_features": self.common_features,
+            "differences": self.differences,
+            "variant_relationships": self.variant_relationships,
+            "target_customers": self.target_customers,
+            "marketing_suggestions": self.marketing_suggestions,
+            "faq": self.faq,
+            "keywords": self.keywords,
+            "embedding": self.embedding.tolist() if self.embedding is not None else None,
+            "products": [
+                {"id": product.id, "name": product.name, "description": product.description}
+                for product in self.products
+            ]
+        }
+
+class CommunityRegistry:
+    """
+    Các ProductCommunity đã tải, kèm chỉ mục theo id, sản phẩm và từ khóa
+
+    Tìm theo embedding dùng vector_store, được tạo từ embedding đã giải mã của registry.
+    """
+
+    def __init__(self, communities: List[ProductCommunity]):
+        self.communities: Dict[Any, ProductCommunity] = {community.id: community for community in communities}
+
+        self._by_product: Dict[Any, List[ProductCommunity]] = {}
+        self._by_keyword: Dict[str, List[ProductCommunity]] = {}
+        for community in self.communities.values():
+            for product in community.products:
+                self._by_product.setdefault(product.id, []).append(community)
+            for keyword in {keyword.lower().strip() for keyword in community.keywords if keyword}:
+                self._by_keyword.setdefault(keyword, []).append(community)
+
+    def __len__(self) -> int:
+        return len(self.communities)
+
+    def get(self, community_id: Any) -> Optional[ProductCommunity]:
+        return self.communities.get(community_id)
+
+    def for_product(self, product_id: Any) -> List[ProductCommunity]:
+        """Các community chứa sản phẩm product_id"""
+        return list(self._by_product.get(product_id, []))
+
+    def for_keyword(self, keyword: str) -> List[ProductCommunity]:
+        """Các community có từ khóa keyword (không phân biệt hoa thường)"""
+        return list(self._by_keyword.get(keyword.lower().strip(), []))
+
+    def to_dict(self) -> Dict[Any, Dict[str, Any]]:
+        return {community_id: community.to_dict() for community_id, community in self.communities.items()}
+
+_registry_lock = threading.Lock()
+_registry: Optional[CommunityRegistry] = None
+
+def _load_registry() -> CommunityRegistry:
+    communities = []
+    for record in execute_query_with_semaphore(_COMMUNITIES_QUERY, use_cache=False):
+        community_id = record.get("id")
+        if community_id is None or (isinstance(community_id, str) and not community_id.strip()):
+            continue
+        communities.append(ProductCommunity.from_record(record))
+    return CommunityRegistry(communities)
+
+def get_community_registry(refresh: bool = False) -> CommunityRegistry:
+    """
+    Registry ProductCommunity (tải ở lần gọi đầu tiên, một truy vấn cho mọi community)
+
+    Args:
+        refresh: Tải lại từ Neo4j
+
+    Returns:
+        CommunityRegistry (rỗng nếu tải lỗi và chưa có registry trước đó)
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is not None and not refresh:
+            return _registry
+
+        try:
+            registry = _load_registry()
+        except Exception as e:
+            log_error(f"Error loading product communities: {str(e)}")
+            registry = None
+
+        if not registry:
+            # Truy vấn lỗi trả về []: giữ registry cũ, không cache registry rỗng
+            if _registry is not None:
+                log_error("Product community refresh returned no communities, keeping the previous registry")
+                return _registry
+            return registry if registry is not None else CommunityRegistry([])
+
+        _registry = registry
+        log_info(f"✅ Loaded {len(registry)} product communities")
+        return _registry
+
+def refresh_product_communities() -> CommunityRegistry:
+    """Tải lại registry ProductCommunity từ Neo4j"""
+    return get_community_registry(refresh=True)
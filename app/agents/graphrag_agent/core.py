@@ -18,14 +18,21 @@ from dataclasses import dataclass
 from sklearn.metrics.pairwise import cosine_similarity
 
 from app.utils.logger import log_info, log_error
-from app.neo4j_client.connection import execute_query
+from app.neo4j_client.connection import execute_query, execute_query_async
+from app.neo4j_client.query_templates import CypherQuery, cypher_query
+from app.neo4j_client.cost_guard import guard_query
+from app.neo4j_client import catalog_mirror
 from app.config.phobert_config import PHOBERT_MODEL_PATH, PHOBERT_MODEL_NAME
 from ..core.constants import ERROR_MESSAGES, SUCCESS_MESSAGES
 from ..core.core_functions import compute_entity_semantic_similarity, get_phobert_manager
+from ..core.utils import intent_fingerprint
 
-from .statistical_queries import generate_statistical_cypher_query, is_statistical_query,aggregate_results_by_category_and_product, format_statistics_for_response
+from .statistical_queries import generate_statistical_cypher_query, is_statistical_query,aggregate_results_by_category_and_product, format_statistics_for_response, resolve_statistical_intent
+from .statistical_engine import answer_statistical_query
 from .semantic_entity_matching import SemanticEntityMatching
 from .cypher_generator import CypherGenerator
+from .community_registry import get_community_registry
+from .vector_store import get_vector_store, PRODUCT, VARIANT
 
 @dataclass
 class IntentData:
@@ -171,14 +178,42 @@ class GraphRAGCore:
         message_lower = message.lower()
         return any(keyword in message_lower for keyword in store_keywords | order_keywords)
         
-    def generate_query(self, intent_data: Dict[str, Any]) -> str:
+    def query_fingerprint(self, intent_data: Dict[str, Any]) -> Optional[str]:
+        """Build the result cache key of an intent.
+        
+        Besides the canonical intent fields, the key includes what the query
+        generators derive from the wording (latest-closing store, resolved
+        statistical question, projected product columns), so intents that
+        share a key also share the generated query.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            Fingerprint string, or None if the result must not be cached
+            (order queries read customer data)
+        """
+        if not intent_data or intent_data.get('is_order_query'):
+            return None
+
+        if intent_data.get('is_store_query'):
+            intent_text = intent_data.get("intent_text", "").lower()
+            shape = {'latest_closing': any(keyword in intent_text for keyword in ["mở cửa muộn nhất", "muộn nhất", "đóng cửa muộn nhất"])}
+        elif is_statistical_query(intent_data):
+            shape = {'statistical': resolve_statistical_intent(intent_data)}
+        else:
+            shape = {'columns': self._cypher_generator.get_product_result_columns(intent_data)}
+
+        return intent_fingerprint(intent_data, shape)
+
+    def generate_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
         """Generate appropriate query based on intent data.
         
         Args:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated Cypher query
+            CypherQuery containing the generated query text and parameters
             
         Raises:
             ValueError: If intent_data is invalid
@@ -193,14 +228,14 @@ class GraphRAGCore:
         else:
             return self.generate_product_query(intent_data)
         
-    def generate_store_query(self, intent_data: Dict[str, Any]) -> str:
+    def generate_store_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
         """Generate store query.
         
         Args:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated store query
+            CypherQuery containing the generated store query
         """
         intent_text = intent_data.get("intent_text", "").lower()
         keywords = intent_data.get("keywords", [])
@@ -213,18 +248,18 @@ class GraphRAGCore:
             return self._generate_latest_closing_store_query()
             
         # Default return all stores
-        return """
+        return cypher_query("""
         MATCH (s:store)
         RETURN s
-        """
+        """)
         
-    def _generate_latest_closing_store_query(self) -> str:
+    def _generate_latest_closing_store_query(self) -> CypherQuery:
         """Generate query for finding store with latest closing time.
         
         Returns:
-            str containing the generated query
+            CypherQuery containing the generated query
         """
-        return """
+        return cypher_query("""
         MATCH (s:store)
         WHERE s.open_close IS NOT NULL
         WITH s, split(s.open_close, ' - ')[1] as close_time
@@ -248,49 +283,196 @@ class GraphRAGCore:
              END as close_minutes
         WHERE close_minutes = max_close_minutes
         RETURN s
-        """
+        """)
         
-    def generate_order_query(self, intent_data: Dict[str, Any]) -> str:
+    def generate_order_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
         """Generate order query.
         
         Args:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated order query
+            CypherQuery containing the generated order query
         """
         return self._cypher_generator.generate_order_query(intent_data)
         
-    def generate_product_query(self, intent_data: Dict[str, Any]) -> str:
+    def generate_product_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
         """Generate product query.
         
         Args:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated product query
+            CypherQuery containing the generated product query
         """
         if is_statistical_query(intent_data):
-            return generate_statistical_cypher_query(intent_data)
+            statistical_query = generate_statistical_cypher_query(intent_data)
+            if statistical_query:
+                return statistical_query
         return self._cypher_generator.generate_product_query(intent_data)
         
-    def execute_query(self, query: str) -> List[Dict]:
+    def query_catalog(self, intent_data: Dict[str, Any]) -> Optional[List[Dict]]:
+        """Answer store and product intents from the in-process catalog mirror.
+        
+        Returns rows in the same shape as the Cypher query generate_query would
+        build for intent_data. Order and statistical intents are not answered
+        locally.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            List of result rows, or None if the intent needs Neo4j (or the
+            mirror is not loaded)
+        """
+        if not intent_data or intent_data.get('is_order_query'):
+            return None
+
+        if intent_data.get('is_store_query'):
+            intent_text = intent_data.get("intent_text", "").lower()
+            latest_closing = any(keyword in intent_text for keyword in ["mở cửa muộn nhất", "muộn nhất", "đóng cửa muộn nhất"])
+            return catalog_mirror.list_stores(latest_closing=latest_closing)
+
+        if is_statistical_query(intent_data):
+            return None
+
+        names, category_names = self._cypher_generator._get_product_filters(intent_data)
+        rows = catalog_mirror.search_variants(
+            names, category_names, limit=self._cypher_generator.get_product_result_limit()
+        )
+        if rows is None:
+            return None
+
+        columns = self._cypher_generator.get_product_result_columns(intent_data)
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    def answer_statistical_query(self, intent_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Answer a statistical product intent from the in-memory variant arrays.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            Result in the format of process_results for statistical intents, or
+            None if the intent is not statistical or needs a Cypher query
+        """
+        if not intent_data or intent_data.get('is_store_query') or intent_data.get('is_order_query'):
+            return None
+        if not is_statistical_query(intent_data):
+            return None
+        return answer_statistical_query(intent_data)
+
+    def hybrid_search(self, query_embedding: Any, intent_data: Optional[Dict[str, Any]] = None,
+                      k: int = 10, kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Hybrid search: keyword/graph filtering plus vector ranking.
+        
+        Product and category names in intent_data narrow the candidates to
+        the matching products (catalog mirror). The candidates are then ranked
+        by cosine similarity against the catalog vector store. If the keyword
+        filter matches nothing, the whole catalog is ranked.
+        
+        Args:
+            query_embedding: Embedding of the question (same model as the
+                catalog embeddings)
+            intent_data: Optional intent information used for keyword filtering
+            k: Number of results
+            kinds: Row kinds to search (community, product, variant); all by default
+            
+        Returns:
+            List of {'kind', 'id', 'name', 'product_id', 'score'} by score
+        """
+        store = get_vector_store()
+        if len(store) == 0:
+            return []
+
+        filter_mask = store.mask(kinds=kinds)
+        if intent_data:
+            names, category_names = self._cypher_generator._get_product_filters(intent_data)
+            if names or category_names:
+                rows = catalog_mirror.search_variants(names, category_names, limit=len(store))
+                if rows:
+                    keyword_mask = filter_mask & store.mask(product_ids={row.get('product_id') for row in rows})
+                    if keyword_mask.any():
+                        filter_mask = keyword_mask
+
+        return store.top_k(query_embedding, k, filter_mask)
+
+    def semantic_search(self, intent_data: Dict[str, Any]) -> Optional[List[Dict]]:
+        """Answer a product intent by hybrid search over the catalog embeddings.
+
+        Used when keyword matching finds no product: the intent text is
+        embedded with PhoBERT, ranked with hybrid_search, and the matching
+        products' variants are returned in the product query's row shape.
+
+        Args:
+            intent_data: Dictionary containing intent information
+
+        Returns:
+            List of result rows, or None if the intent is not a product
+            intent or no embedding model or catalog mirror is available
+        """
+        if not intent_data or intent_data.get('is_store_query') or intent_data.get('is_order_query'):
+            return None
+        if is_statistical_query(intent_data) or not catalog_mirror.is_ready():
+            return None
+
+        phobert_manager = get_phobert_manager()
+        if phobert_manager is None or not phobert_manager.is_loaded:
+            return None
+        query_embedding = phobert_manager.get_embedding(intent_data.get('intent_text', ''))
+        if query_embedding is None:
+            return None
+
+        limit = self._cypher_generator.get_product_result_limit()
+        hits = self.hybrid_search(query_embedding, intent_data, k=limit, kinds=[PRODUCT, VARIANT])
+        rows = catalog_mirror.variants_for_products(
+            [hit['product_id'] for hit in hits if hit.get('product_id') is not None], limit=limit
+        )
+        if not rows:
+            return None
+
+        log_info(f"Hybrid search matched {len(rows)} variants for: {intent_data.get('intent_text', '')}")
+        columns = self._cypher_generator.get_product_result_columns(intent_data)
+        return [{column: row.get(column) for column in columns} for row in rows]
+
+    def execute_query(self, query: CypherQuery) -> List[Dict]:
         """Execute Cypher query.
         
         Args:
-            query: The Cypher query to execute
+            query: The Cypher query (text and parameters) to execute
             
         Returns:
             List of dictionaries containing query results
             
         Raises:
+            QueryCostError: If the cost guard rejects the query
             Exception: If query execution fails
         """
         try:
-            return execute_query(query)
+            # Thêm LIMIT mặc định hoặc từ chối truy vấn quá tốn kém trước khi gửi tới Neo4j
+            return execute_query(guard_query(query.text, query.params), query.params)
         except Exception as e:
             self._logger.error(f"Error executing query: {str(e)}")
             raise
+
+    async def execute_query_async(self, query: CypherQuery) -> List[Dict]:
+        """Execute Cypher query without blocking the event loop.
+        
+        Args:
+            query: The Cypher query (text and parameters) to execute
+            
+        Returns:
+            List of dictionaries containing query results
+            
+        Raises:
+            QueryCostError: If the cost guard rejects the query
+            Exception: If query execution fails
+        """
+        try:
+            return await execute_query_async(guard_query(query.text, query.params), query.params)
+        except Exception as e:
+            self._logger.error(f"Error executing async query: {str(e)}")
+            raise
             
     def process_results(self, results: List[Dict], intent_data: Dict[str, Any]) -> List[Dict]:
         """Process query results.
@@ -315,88 +497,10 @@ class GraphRAGCore:
             self._logger.error(f"Error processing results: {str(e)}")
             raise 
 
-def load_product_communities() -> Dict[str, Any]:
-    """Load all product communities from Neo4j"""
+def load_product_communities(refresh: bool = False) -> Dict[str, Any]:
+    """Load all product communities (one Neo4j query, cached until refresh)"""
     log_info("📥 Loading product communities...")
-
-    query = """
-    MATCH (pc:ProductCommunity)
-    RETURN pc.id AS id,
-           pc.name AS name,
-           pc.common_features AS common_features,
-           pc.differences AS differences,
-           pc.variant_relationships AS variant_relationships,
-           pc.target_customers AS target_customers,
-           pc.marketing_suggestions AS marketing_suggestions,
-           pc.faq AS faq,
-           pc.keywords AS keywords,
-           pc.embedding AS embedding
-    """
-    result = execute_query(query)
-
-    product_communities = {}
-    for record in result:
-        community_id = record.get("id")
-        if community_id is None or (isinstance(community_id, str) and not community_id.strip()):
-            continue
-
-        # Process keywords
-        keywords = record.get("keywords", [])
-        if isinstance(keywords, str):
-            try:
-                keywords = json.loads(keywords)
-            except:
-                keywords = [keywords]
-
-        # Process FAQ
-        faq = record.get("faq", [])
-        if isinstance(faq, str):
-            try:
-                faq = json.loads(faq)
-            except:
-                faq = []
-
-        # Process embedding
-        embedding = record.get("embedding")
-        if isinstance(embedding, str):
-            try:
-                embedding = json.loads(embedding)
-            except:
-                embedding = None
-
-        product_communities[community_id] = {
-            "id": community_id,
-            "name": record.get("name", ""),
-            "common_features": record.get("common_features", ""),
-            "differences": record.get("differences", ""),
-            "variant_relationships": record.get("variant_relationships", ""),
-            "target_customers": record.get("target_customers", ""),
-            "marketing_suggestions": record.get("marketing_suggestions", ""),
-            "faq": faq,
-            "keywords": keywords,
-            "embedding": embedding
-        }
-
-        # Get products in community
-        products_query = """
-        MATCH (pc:ProductCommunity)-[:CONTAINS_PRODUCT]->(p:Product)
-        WHERE pc.id = $community_id
-        RETURN p.id AS id, p.name AS name, p.descriptions AS description
-        """
-        products_result = execute_query(products_query, {"community_id": community_id})
-
-        products = []
-        for product_record in products_result:
-            products.append({
-                "id": product_record.get("id"),
-                "name": product_record.get("name", ""),
-                "description": product_record.get("description", "")
-            })
-
-        product_communities[community_id]["products"] = products
-
-    log_info(f"✅ Loaded {len(product_communities)} product communities")
-    return product_communities
+    return get_community_registry(refresh=refresh).to_dict()
 
 def create_community_text(community_data: Dict[str, Any]) -> str:
     """Create text representation of community data"""
@@ -5,13 +5,49 @@ This module provides functionality to generate Cypher queries for different type
 - Product queries
 - Category queries
 - Store queries
+- Order queries
+
+Every generator returns a CypherQuery: fixed Cypher text plus a $params dict,
+so user values never change the query text.
 """
-from typing import Dict, Any, List, Optional, Union, Set
+from typing import Dict, Any, List, Optional, Union, Set, Tuple
 import json
 import logging
 from dataclasses import dataclass
 from ...utils.logger import log_info, log_error
-from ..core.constants import QUERY_TEMPLATES
+from ...neo4j_client.query_templates import CypherQuery, cypher_query, contains_any, fulltext_search_text
+from ...neo4j_client.index_bootstrap import has_index, PRODUCT_SEARCH_INDEX
+
+# Số biến thể trả về và số sản phẩm ứng viên lấy từ full-text index cho truy vấn sản phẩm
+_PRODUCT_RESULT_LIMIT = 10
+_PRODUCT_CANDIDATE_LIMIT = 50
+_VARIANT_SALES_RANK_INDEX = "variant_sales_rank"
+
+# Cột luôn trả về cho truy vấn sản phẩm: (biểu thức, alias theo tên result_processor dùng)
+_PRODUCT_BASE_COLUMNS = [
+    ("p.id", "product_id"),
+    ("p.name", "product_name"),
+    ("p.descriptions", "product_description"),
+    ("c.id", "category_id"),
+    ("c.name_cat", "category_name"),
+    ("c.description", "category_description"),
+    ("v.id", "variant_id"),
+    ("v.`Beverage Option`", "beverage_option"),
+    ("v.price", "price"),
+    ("v.sales_rank", "sales_rank"),
+    ("v.calories", "calories"),
+    ("v.protein_g", "protein_g"),
+    ("v.sugars_g", "sugars_g"),
+    ("v.caffeine_mg", "caffeine_mg"),
+]
+
+# Cột dinh dưỡng chỉ trả về khi intent nhắc tới: (biểu thức, alias, từ khóa)
+_PRODUCT_NUTRITION_COLUMNS = [
+    ("v.dietary_fibre_g", "dietary_fibre_g", ("chất xơ", "chat xo", "fiber", "fibre")),
+    ("v.vitamin_a", "vitamin_a", ("vitamin",)),
+    ("v.vitamin_c", "vitamin_c", ("vitamin",)),
+]
+_ALL_NUTRITION_KEYWORDS = ("dinh dưỡng", "dinh duong", "nutrition", "healthy", "sức khỏe", "lành mạnh")
 
 @dataclass
 class QueryConditions:
@@ -43,14 +79,14 @@ class CypherGenerator:
         """Initialize CypherGenerator with required components."""
         self._logger = logging.getLogger('agent.graphrag.cypher')
         
-    def generate_query(self, intent_data: Dict[str, Any]) -> str:
+    def generate_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
         """Generate Cypher query based on intent data.
         
         Args:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated Cypher query
+            CypherQuery containing the generated query text and parameters
             
         Raises:
             ValueError: If intent_data is invalid or query type is not supported
@@ -87,7 +123,7 @@ class CypherGenerator:
         """
         return intent_data.get("query_type")
         
-    def _generate_query_by_type(self, query_type: str, intent_data: Dict[str, Any]) -> str:
+    def _generate_query_by_type(self, query_type: str, intent_data: Dict[str, Any]) -> CypherQuery:
         """Generate query based on type.
         
         Args:
@@ -95,7 +131,7 @@ class CypherGenerator:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated query
+            CypherQuery containing the generated query
             
         Raises:
             ValueError: If query type is not supported
@@ -103,7 +139,8 @@ class CypherGenerator:
         query_generators = {
             "product": self._generate_product_query,
             "category": self._generate_category_query,
-            "store": self._generate_store_query
+            "store": self._generate_store_query,
+            "order": self._generate_order_query
         }
         
         generator = query_generators.get(query_type)
@@ -112,34 +149,240 @@ class CypherGenerator:
             
         return generator(intent_data)
             
-    def _generate_product_query(self, intent_data: Dict[str, Any]) -> str:
-        """Generate product query.
+    def generate_product_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
+        """Generate product query (public entry point used by GraphRAGCore)."""
+        return self._generate_product_query(intent_data)
+
+    def get_product_result_columns(self, intent_data: Dict[str, Any]) -> List[str]:
+        """Column aliases a product query returns for intent_data (used by the catalog mirror)."""
+        return [column.rsplit(" as ", 1)[1] for column in self._get_product_columns(intent_data)]
+
+    def get_product_result_limit(self) -> int:
+        """Row limit of a product query (used by the catalog mirror)."""
+        return _PRODUCT_RESULT_LIMIT
+
+    def generate_order_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
+        """Generate order query (public entry point used by GraphRAGCore)."""
+        return self._generate_order_query(intent_data)
+
+    def _get_product_filters(self, intent_data: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Get product names and category names to filter a product query by.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            Tuple of (product names, category names)
+        """
+        product_names = intent_data.get("product_names") or {}
+        if isinstance(product_names, dict):
+            names = product_names.get("vi", []) + product_names.get("en", [])
+        else:
+            names = list(product_names)
+        names = [name for name in names if name]
+
+        category_names = [name for name in intent_data.get("category_names") or [] if name]
+        return names, category_names
+
+    def _get_product_columns(self, intent_data: Dict[str, Any]) -> List[str]:
+        """Build the RETURN items of a product query.
+        
+        Always returns the columns result_processor groups and renders
+        (product, category, variant and the calories/protein/sugar/caffeine
+        line); dietary fibre and vitamins are only returned when the intent
+        mentions them.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            List of "expression as alias" strings
+        """
+        intent_terms = [
+            intent_data.get("intent_text") or "",
+            " ".join(str(keyword) for keyword in intent_data.get("keywords") or []),
+            " ".join(str(key) for key in (intent_data.get("filters") or {}).keys()),
+            intent_data.get("sort_by") or ""
+        ]
+        intent_text = " ".join(intent_terms).lower()
+        all_nutrition = any(keyword in intent_text for keyword in _ALL_NUTRITION_KEYWORDS)
+
+        columns = [f"{expression} as {alias}" for expression, alias in _PRODUCT_BASE_COLUMNS]
+        for expression, alias, keywords in _PRODUCT_NUTRITION_COLUMNS:
+            if all_nutrition or alias in intent_text or any(keyword in intent_text for keyword in keywords):
+                columns.append(f"{expression} as {alias}")
+        return columns
+
+    def _generate_product_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
+        """Generate a staged product query.
+        
+        Products are anchored first (full-text index on product names plus
+        Beverage Option matches, the selected categories, or all products),
+        ranked by their best matching variant and cut to the result LIMIT
+        before variants are expanded: the top variants by sales_rank can only
+        come from that many products. Without filters the sales_rank index is
+        walked directly. Only the columns the intent needs are projected.
         
         Args:
             intent_data: Dictionary containing intent information
             
         Returns:
-            str containing the generated product query
+            CypherQuery containing the generated product query
         """
-        conditions = self._get_product_conditions(intent_data)
-        
-        return f"""
-        MATCH (p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-        MATCH (v:Variant)-[:PRODUCT_ID]->(p)
-        WHERE {" AND ".join(conditions)}
-        RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
-               c.id as category_id, c.name_cat as category_name, c.description as category_description,
-               v.id as variant_id, v.name as variant_name, v.price as variant_price, v.sugar as variant_sugar,
-               v.caffeine as variant_caffeine, v.calories as variant_calories, v.protein as variant_protein,
-               v.image_url as variant_image_url, v.is_available as variant_is_available, v.is_new as variant_is_new,
-               v.is_promotion as variant_is_promotion, v.promotion_price as variant_promotion_price,
-               v.promotion_start_date as variant_promotion_start_date, v.promotion_end_date as variant_promotion_end_date,
-               v.promotion_description as variant_promotion_description, v.promotion_image_url as variant_promotion_image_url
+        names, category_names = self._get_product_filters(intent_data)
+        columns = ",\n               ".join(self._get_product_columns(intent_data))
+        params = {}
+        category_condition = None
+        if category_names:
+            category_condition = contains_any("c.name_cat", "category_names")
+            params["category_names"] = category_names
+
+        if category_names:
+            category_products = f"""MATCH (c:Category)
+        WHERE {category_condition}
+        MATCH (p:Product)-[:BELONGS_TO_CATEGORY]->(c)"""
+        else:
+            category_products = "MATCH (p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)"
+
+        # Tên có thể khớp với tên sản phẩm hoặc Beverage Option của biến thể
+        variant_filter = ""
+        search = fulltext_search_text(names) if names else ""
+        if search and has_index(PRODUCT_SEARCH_INDEX):
+            # Stage 1: các sản phẩm phù hợp nhất từ full-text index (lọc theo danh mục) và
+            # các sản phẩm có biến thể khớp Beverage Option
+            params["search"] = search
+            params["product_names"] = names
+            category_filter = ""
+            category_where = ""
+            if category_condition:
+                category_filter = f"""
+            MATCH (p)-[:BELONGS_TO_CATEGORY]->(c:Category)
+            WHERE {category_condition}"""
+                category_where = f"""
+        WHERE {category_condition}"""
+            products = f"""
+        CALL {{
+            CALL db.index.fulltext.queryNodes("{PRODUCT_SEARCH_INDEX}", $search) YIELD node AS p, score{category_filter}
+            WITH p, max(score) AS score
+            ORDER BY score DESC
+            LIMIT {_PRODUCT_CANDIDATE_LIMIT}
+            RETURN p, true AS name_match
+            UNION
+            MATCH (v:Variant)
+            WHERE {contains_any("v.`Beverage Option`", "product_names")}
+            MATCH (v)-[:PRODUCT_ID]->(p:Product)
+            RETURN DISTINCT p, false AS name_match
+        }}
+        WITH p, true IN collect(name_match) AS name_match
+        MATCH (p)-[:BELONGS_TO_CATEGORY]->(c:Category){category_where}"""
+            variant_filter = f"name_match OR {contains_any('v.`Beverage Option`', 'product_names')}"
+        elif names:
+            # Stage 1: lọc sản phẩm theo danh mục và tên
+            params["product_names"] = names
+            products = f"""
+        {category_products}
+        WITH p, c, {contains_any("p.name", "product_names")} as name_match"""
+            variant_filter = f"name_match OR {contains_any('v.`Beverage Option`', 'product_names')}"
+        elif category_names or not has_index(_VARIANT_SALES_RANK_INDEX):
+            # Stage 1: bắt đầu từ các danh mục được chọn (ít node) thay vì toàn bộ biến thể
+            products = f"""
+        {category_products}"""
+        else:
+            # Không có bộ lọc: duyệt biến thể theo thứ tự của index sales_rank, dừng sau LIMIT hàng
+            return CypherQuery(f"""
+        MATCH (v:Variant)
+        USING INDEX v:Variant(sales_rank)
+        WHERE v.sales_rank IS NOT NULL
+        MATCH (v)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
+        RETURN {columns}
+        ORDER BY v.sales_rank ASC
+        LIMIT {_PRODUCT_RESULT_LIMIT}
+        """, params)
+
+        # Stage 2: xếp sản phẩm theo biến thể phù hợp tốt nhất và chỉ giữ LIMIT sản phẩm,
+        # rồi mới mở rộng sang biến thể của các sản phẩm đó
+        carried = "p, c, name_match" if variant_filter else "p, c"
+        imported = "p, name_match" if variant_filter else "p"
+        ranked_where = f"\n            WHERE {variant_filter}" if variant_filter else ""
+        variant_where = f"\n        WHERE {variant_filter}" if variant_filter else ""
+        return CypherQuery(f"""{products}
+        CALL {{
+            WITH {imported}
+            MATCH (v:Variant)-[:PRODUCT_ID]->(p){ranked_where}
+            RETURN min(v.sales_rank) AS best_rank, count(v) AS matching_variants
+        }}
+        WITH {carried}, best_rank, matching_variants
+        WHERE matching_variants > 0
+        ORDER BY best_rank ASC
+        LIMIT {_PRODUCT_RESULT_LIMIT}
+        MATCH (v:Variant)-[:PRODUCT_ID]->(p){variant_where}
+        RETURN {columns}
         ORDER BY v.sales_rank ASC
-        LIMIT 10
+        LIMIT {_PRODUCT_RESULT_LIMIT}
+        """, params)
+
+    def _generate_category_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
+        """Generate category query.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            CypherQuery containing the generated category query
+        """
+        category_names = [name for name in intent_data.get("category_names") or [] if name]
+
+        return cypher_query(f"""
+        MATCH (c:Category)
+        WHERE size($category_names) = 0 OR {contains_any("c.name_cat", "category_names")}
+        RETURN c.id as category_id, c.name_cat as category_name, c.description as category_description
+        ORDER BY c.name_cat
+        """, category_names=category_names)
+
+    def _generate_store_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
+        """Generate store query.
+        
+        Args:
+            intent_data: Dictionary containing intent information
+            
+        Returns:
+            CypherQuery containing the generated store query
         """
+        return cypher_query("""
+        MATCH (s:store)
+        RETURN s
+        """)
+
+    def _generate_order_query(self, intent_data: Dict[str, Any]) -> CypherQuery:
+        """Generate order history query for the customer in intent_data.
+        
+        Args:
+            intent_data: Dictionary containing intent information (customer_id)
+            
+        Returns:
+            CypherQuery containing the generated order query
+        """
+        customer_id = intent_data.get("customer_id")
+        try:
+            customer_id = int(customer_id)
+        except (ValueError, TypeError):
+            pass
+
+        return cypher_query("""
+        MATCH (o:Order)
+        WHERE o.customer_id = $customer_id
+        OPTIONAL MATCH (od:Order_Detail)
+        WHERE od.order_id = o.id
+        OPTIONAL MATCH (od)-[:VARIANT_ID]->(v:Variant)
+        OPTIONAL MATCH (v)-[:PRODUCT_ID]->(p:Product)
+        RETURN o.id as order_id, o.order_date as order_date,
+               p.name as product_name, v.`Beverage Option` as beverage_option,
+               v.price as price, od.quantity as quantity
+        ORDER BY o.order_date DESC
+        LIMIT 20
+        """, customer_id=customer_id)
 
-def generate_cypher_query(intent_data: Dict[str, Any]) -> str:
+def generate_cypher_query(intent_data: Dict[str, Any]) -> CypherQuery:
     """Generate Cypher query based on intent data.
     
     This is a convenience function that wraps the CypherGenerator class.
@@ -148,7 +391,7 @@ def generate_cypher_query(intent_data: Dict[str, Any]) -> str:
         intent_data: Dictionary containing intent information
         
     Returns:
-        str containing the generated Cypher query
+        CypherQuery containing the generated query text and parameters
         
     Raises:
         ValueError: If intent_data is invalid or query type is not supported
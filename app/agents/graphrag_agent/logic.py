@@ -11,6 +11,8 @@ from typing import Dict, Any, List, Optional
 import json
 import asyncio
 import logging
+import threading
+import concurrent.futures
 from datetime import datetime
 
 from ..core.base_agent import BaseAgent
@@ -18,9 +20,20 @@ from ..core.message_bus import MessageBus
 from ..core.context import AgentContext
 from ..core.utils import AsyncCache, async_retry, async_timeout
 from ..core.config import config
+from ...neo4j_client import catalog_mirror
 
 from .core import GraphRAGCore
 
+# Intent result cache and in-flight executions are shared by every GraphRAGAgent instance
+# (routes create a new agent per request, each request on its own event loop)
+_result_cache = AsyncCache(
+    ttl=config.get('agents.graphrag.cache_ttl', 300),
+    max_size=config.get('agents.graphrag.cache_max_size', 1000)
+)
+_in_flight: Dict[str, concurrent.futures.Future] = {}
+_in_flight_lock = threading.Lock()
+_shared_executions = 0
+
 class GraphRAGAgent(BaseAgent):
     """GraphRAG Agent for handling Neo4j database queries"""
     
@@ -28,7 +41,7 @@ class GraphRAGAgent(BaseAgent):
         """Initialize GraphRAG agent"""
         super().__init__(agent_id)
         self._logger = logging.getLogger('agent.graphrag')
-        self._cache = AsyncCache(ttl=config.get('agents.graphrag.cache_ttl', 300))
+        self._cache = _result_cache
         self._core = GraphRAGCore()
         self._timeout = config.get('agents.graphrag.timeout', 30)
         
@@ -41,12 +54,9 @@ class GraphRAGAgent(BaseAgent):
     @async_timeout(seconds=30)
     async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Process incoming message"""
+        global _shared_executions
+
         try:
-            # Check cache first
-            message_id = message.get('id')
-            if message_id and (cached_result := await self._cache.get(message_id)):
-                return cached_result
-                
             # Extract query info
             intent_text = message.get('intent_text', '')
             original_query = message.get('original_query', '')
@@ -54,23 +64,40 @@ class GraphRAGAgent(BaseAgent):
             # Extract intent data
             intent_data = self._core.extract_intent_data(intent_text, original_query)
             
-            # Generate and execute query
-            query = self._core.generate_query(intent_data)
-            results = self._core.execute_query(query)
-            processed_results = self._core.process_results(results, intent_data)
-            
-            # Prepare response
-            response = {
-                'status': 'success',
-                'data': processed_results,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            # Cache result
-            if message_id:
-                await self._cache.set(message_id, response)
-                
-            return response
+            # Check cache first (keyed on the intent, so rephrased questions share one execution)
+            cache_key = self._core.query_fingerprint(intent_data)
+            if not cache_key:
+                return await self._execute_intent(intent_data)
+
+            if cached_result := await self._cache.get(cache_key):
+                return cached_result
+
+            # Join an identical intent that is already being executed (possibly on another loop)
+            with _in_flight_lock:
+                in_flight = _in_flight.get(cache_key)
+                if in_flight is None:
+                    future = concurrent.futures.Future()
+                    _in_flight[cache_key] = future
+                else:
+                    _shared_executions += 1
+            if in_flight is not None:
+                return await asyncio.shield(asyncio.wrap_future(in_flight))
+
+            try:
+                response = await self._execute_intent(intent_data)
+                await self._cache.set(cache_key, response)
+                future.set_result(response)
+                return response
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with _in_flight_lock:
+                    if _in_flight.get(cache_key) is future:
+                        del _in_flight[cache_key]
             
         except Exception as e:
             self._logger.error(f"Error processing message: {str(e)}")
@@ -79,6 +106,36 @@ class GraphRAGAgent(BaseAgent):
                 'error': str(e),
                 'timestamp': datetime.now().isoformat()
             }
+
+    async def _execute_intent(self, intent_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer an intent (variant arrays, catalog mirror or Cypher query)"""
+        # Statistical intents are answered from the in-memory variant arrays
+        processed_results = await asyncio.to_thread(self._core.answer_statistical_query, intent_data)
+        if processed_results is None:
+            # Answer catalog intents from the in-process mirror; Neo4j only when needed
+            results = self._core.query_catalog(intent_data) if catalog_mirror.is_ready() else None
+            if results is None:
+                # Generate and execute query
+                query = self._core.generate_query(intent_data)
+                results = await self._core.execute_query_async(query)
+            if not results:
+                # No keyword match: rank the catalog by embedding similarity (hybrid search)
+                results = await asyncio.to_thread(self._core.semantic_search, intent_data) or results
+            processed_results = self._core.process_results(results, intent_data)
+        
+        # Prepare response
+        return {
+            'status': 'success',
+            'data': processed_results,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Intent result cache statistics"""
+        stats = self._cache.stats()
+        stats['shared_executions'] = _shared_executions
+        stats['in_flight'] = len(_in_flight)
+        return stats
             
     async def cleanup(self):
         """Cleanup resources"""
@@ -5,7 +5,10 @@ from typing import Dict, Any, List, Optional, Union
 import json
 import logging
 from ...utils.logger import log_info, log_error
-from ...neo4j_client.connection import execute_query
+from ...neo4j_client.connection import (
+    execute_query_with_semaphore, execute_queries_parallel, execute_transaction
+)
+from ...neo4j_client.cost_guard import guard_query, analyze_query, QueryCostError
 from ..core.constants import TIMEOUT_SETTINGS
 
 class QueryExecutor:
@@ -22,27 +25,34 @@ class QueryExecutor:
             if params:
                 log_info(f"📝 Params: {json.dumps(params, ensure_ascii=False)}")
                 
+            # Thêm LIMIT mặc định hoặc từ chối truy vấn quá tốn kém
+            cypher_query = guard_query(cypher_query, params)
+                
             # Execute query with timeout
-            result = execute_query(
+            result = execute_query_with_semaphore(
                 cypher_query,
                 params=params,
-                timeout=TIMEOUT_SETTINGS["query"]
+                semaphore_timeout=TIMEOUT_SETTINGS["query"]
             )
             
             log_info(f"✅ Đã thực thi query thành công, kết quả: {len(result)} bản ghi")
             return result
             
+        except QueryCostError as e:
+            log_error(f"❌ {str(e)}")
+            return []
         except Exception as e:
             log_error(f"❌ Lỗi khi thực thi query: {str(e)}")
             return []
             
     def execute_batch_query(self, queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
-        """Execute multiple Cypher queries in batch"""
+        """Execute multiple independent read queries concurrently (one session per query)"""
         try:
             log_info("🔍 Thực thi batch queries")
             log_info(f"📝 Số lượng queries: {len(queries)}")
             
-            results = []
+            statements = []
+            rejected = set()  # Vị trí (trong kết quả) của các query bị cost guard từ chối
             for query_info in queries:
                 cypher_query = query_info.get("query")
                 params = query_info.get("params")
@@ -51,8 +61,18 @@ class QueryExecutor:
                     log_error("❌ Query không hợp lệ")
                     continue
                     
-                result = self.execute_query(cypher_query, params)
-                results.append(result)
+                try:
+                    statements.append((guard_query(cypher_query, params), params))
+                except QueryCostError as e:
+                    log_error(f"❌ {str(e)}")
+                    rejected.add(len(statements) + len(rejected))
+                
+            # Chạy song song - tổng thời gian xấp xỉ query chậm nhất thay vì tổng các query
+            executed = iter(execute_queries_parallel(statements, semaphore_timeout=TIMEOUT_SETTINGS["query"]))
+
+            # Query bị từ chối vẫn có một kết quả rỗng để kết quả giữ đúng vị trí như khi query lỗi
+            results = [[] if position in rejected else next(executed, [])
+                       for position in range(len(statements) + len(rejected))]
                 
             log_info(f"✅ Đã thực thi batch queries thành công, kết quả: {len(results)} queries")
             return results
@@ -62,15 +82,12 @@ class QueryExecutor:
             return []
             
     def execute_transaction(self, queries: List[Dict[str, Any]]) -> bool:
-        """Execute multiple Cypher queries in a transaction"""
+        """Execute multiple Cypher queries in a single write transaction (all or nothing)"""
         try:
             log_info("🔍 Thực thi transaction")
             log_info(f"📝 Số lượng queries: {len(queries)}")
             
-            # Start transaction
-            self._logger.info("Bắt đầu transaction")
-            
-            # Execute queries
+            statements = []
             for query_info in queries:
                 cypher_query = query_info.get("query")
                 params = query_info.get("params")
@@ -79,12 +96,15 @@ class QueryExecutor:
                     log_error("❌ Query không hợp lệ")
                     return False
                     
-                result = self.execute_query(cypher_query, params)
-                if not result:
-                    log_error("❌ Query thất bại")
-                    return False
-                    
-            # Commit transaction
+                statements.append((cypher_query, params))
+                
+            # Tất cả query chạy trong cùng một session.execute_write - commit hoặc rollback cùng nhau
+            self._logger.info("Bắt đầu transaction")
+            results = execute_transaction(statements)
+            if results is None:
+                log_error("❌ Transaction thất bại, đã rollback")
+                return False
+                
             self._logger.info("Commit transaction")
             
             log_info("✅ Đã thực thi transaction thành công")
@@ -94,8 +114,8 @@ class QueryExecutor:
             log_error(f"❌ Lỗi khi thực thi transaction: {str(e)}")
             return False
             
-    def validate_query(self, cypher_query: str) -> bool:
-        """Validate Cypher query"""
+    def validate_query(self, cypher_query: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        """Validate Cypher query (cú pháp cơ bản và chi phí)"""
         try:
             log_info("🔍 Kiểm tra tính hợp lệ của query")
             
@@ -114,6 +134,17 @@ class QueryExecutor:
                 log_error("❌ Query phải có mệnh đề RETURN")
                 return False
                 
+            # Check query cost: tích Descartes và regex không neo
+            analysis = analyze_query(cypher_query, params)
+            if analysis["cartesianProducts"]:
+                log_error(f"❌ Query có tích Descartes giữa các pattern không liên kết: {analysis['cartesianProducts']}")
+                return False
+            if analysis["unanchoredRegex"]:
+                log_error(f"❌ Query có regex không neo: {analysis['unanchoredRegex']}")
+                return False
+            if analysis["unboundedReturns"]:
+                log_info("⚠️ Query không có LIMIT, LIMIT mặc định sẽ được thêm khi thực thi")
+                
             log_info("✅ Query hợp lệ")
             return True
             
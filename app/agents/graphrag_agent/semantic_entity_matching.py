@@ -9,6 +9,10 @@ import logging
 from app.utils.logger import log_info, log_error
 from ..core.core_functions import compute_entity_semantic_similarity, get_phobert_manager
 from ...neo4j_client.connection import execute_query
+from ...neo4j_client.query_templates import CypherQuery, cypher_query, contains_any, fulltext_search_text
+from ...neo4j_client.index_bootstrap import (
+    has_index, PRODUCT_SEARCH_INDEX, CATEGORY_SEARCH_INDEX, STORE_SEARCH_INDEX
+)
 from ..core.constants import QUERY_TEMPLATES
 
 # Ngưỡng tương đồng ngữ nghĩa
@@ -201,7 +205,7 @@ class SemanticEntityMatching:
                 return []
                 
             # Execute query
-            results = execute_query(query)
+            results = execute_query(query.text, query.params)
             
             log_info(f"✅ Tìm thấy {len(results)} thực thể {entity_type}")
             return results
@@ -222,7 +226,7 @@ class SemanticEntityMatching:
         """Match store entities in text"""
         return self.match_entities(text, "store")
         
-    def _generate_entity_query(self, entity_type: str, text: str) -> Optional[str]:
+    def _generate_entity_query(self, entity_type: str, text: str) -> Optional[CypherQuery]:
         """Generate query based on entity type"""
         if entity_type == "product":
             return self._generate_product_query(text)
@@ -233,34 +237,69 @@ class SemanticEntityMatching:
         else:
             return None
             
-    def _generate_product_query(self, text: str) -> str:
+    def _generate_product_query(self, text: str) -> CypherQuery:
         """Generate product query"""
-        return f"""
+        search = fulltext_search_text([text])
+        if search and has_index(PRODUCT_SEARCH_INDEX):
+            return cypher_query(f"""
+            CALL db.index.fulltext.queryNodes("{PRODUCT_SEARCH_INDEX}", $search) YIELD node AS p, score
+            MATCH (p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
+            RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
+                   c.id as category_id, c.name_cat as category_name, c.description as category_description,
+                   score
+            ORDER BY score DESC
+            LIMIT 10
+            """, search=search)
+
+        # Fallback khi full-text index chưa sẵn sàng
+        return cypher_query(f"""
         MATCH (p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-        WHERE p.name =~ "(?i).*{text}.*" OR p.descriptions =~ "(?i).*{text}.*"
+        WHERE {contains_any("p.name", "terms")} OR {contains_any("p.descriptions", "terms")}
         RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
                c.id as category_id, c.name_cat as category_name, c.description as category_description
         ORDER BY p.name
         LIMIT 10
-        """
+        """, terms=[text])
         
-    def _generate_category_query(self, text: str) -> str:
+    def _generate_category_query(self, text: str) -> CypherQuery:
         """Generate category query"""
-        return f"""
+        search = fulltext_search_text([text])
+        if search and has_index(CATEGORY_SEARCH_INDEX):
+            return cypher_query(f"""
+            CALL db.index.fulltext.queryNodes("{CATEGORY_SEARCH_INDEX}", $search) YIELD node AS c, score
+            RETURN c.id as category_id, c.name_cat as category_name, c.description as category_description,
+                   score
+            ORDER BY score DESC
+            LIMIT 10
+            """, search=search)
+
+        # Fallback khi full-text index chưa sẵn sàng
+        return cypher_query(f"""
         MATCH (c:Category)
-        WHERE c.name_cat =~ "(?i).*{text}.*" OR c.description =~ "(?i).*{text}.*"
+        WHERE {contains_any("c.name_cat", "terms")} OR {contains_any("c.description", "terms")}
         RETURN c.id as category_id, c.name_cat as category_name, c.description as category_description
         ORDER BY c.name_cat
         LIMIT 10
-        """
+        """, terms=[text])
         
-    def _generate_store_query(self, text: str) -> str:
+    def _generate_store_query(self, text: str) -> CypherQuery:
         """Generate store query"""
-        return f"""
+        search = fulltext_search_text([text])
+        if search and has_index(STORE_SEARCH_INDEX):
+            return cypher_query(f"""
+            CALL db.index.fulltext.queryNodes("{STORE_SEARCH_INDEX}", $search) YIELD node AS s, score
+            RETURN s.id as store_id, coalesce(s.name, s.name_store) as store_name, s.address as store_address,
+                   s.latitude as latitude, s.longitude as longitude, score
+            ORDER BY score DESC
+            LIMIT 10
+            """, search=search)
+
+        # Fallback khi full-text index chưa sẵn sàng
+        return cypher_query(f"""
         MATCH (s:Store)
-        WHERE s.name =~ "(?i).*{text}.*" OR s.address =~ "(?i).*{text}.*"
+        WHERE {contains_any("s.name", "terms")} OR {contains_any("s.address", "terms")}
         RETURN s.id as store_id, s.name as store_name, s.address as store_address,
                s.latitude as latitude, s.longitude as longitude
         ORDER BY s.name
         LIMIT 10
-        """
+        """, terms=[text])
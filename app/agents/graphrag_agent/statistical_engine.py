@@ -0,0 +1,273 @@
+"""
+Vectorized statistical engine for GraphRAG agent
+
+Giữ các thuộc tính của biến thể (price, sugars_g, caffeine_mg, calories, protein_g,
+dietary_fibre_g, vitamin_a, vitamin_c, sales_rank) dưới dạng mảng NumPy theo cột, kèm mã
+danh mục/sản phẩm, để trả lời các câu hỏi max/min/equal/greater_than/less_than/range bằng
+mask và argsort thay vì một truy vấn Cypher riêng cho mỗi câu hỏi.
+"""
+import threading
+from typing import Dict, List, Any, Optional
+import numpy as np
+from app.utils.logger import log_info, log_error
+from ...neo4j_client.connection import execute_query_columnar
+from .statistical_queries import STATISTICAL_COLUMNS, resolve_statistical_intent
+
+# Toàn bộ biến thể của catalog; kết quả dạng cột được cache (TTL, stale-while-revalidate và
+# invalidate theo label) bởi connection như các truy vấn catalog khác
+_VARIANT_COLUMNS_QUERY = f"""
+    MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
+    RETURN {STATISTICAL_COLUMNS}
+    """
+
+ATTRIBUTES = ("price", "sugars_g", "caffeine_mg", "calories", "protein_g",
+              "dietary_fibre_g", "vitamin_a", "vitamin_c", "sales_rank")
+
+# Số hàng tối đa theo loại thống kê (giống LIMIT của các truy vấn trong statistical_queries)
+_RESULT_LIMITS = {"max": 10, "min": 10, "equal": 20, "greater_than": 20, "less_than": 20, "range": 20}
+
+def _to_float(value) -> float:
+    """Giống toFloat() của Cypher: NaN nếu không chuyển được"""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _float_column(array: np.ndarray) -> np.ndarray:
+    if array.dtype != object:
+        return array.astype(np.float64)
+    return np.array([_to_float(value) for value in array], dtype=np.float64)
+
+def _codes(array: np.ndarray) -> np.ndarray:
+    """Mã số nguyên cho mỗi giá trị (id danh mục/sản phẩm) theo thứ tự xuất hiện đầu tiên"""
+    codes = np.empty(len(array), dtype=np.int64)
+    mapping = {}
+    for index, value in enumerate(array.tolist()):
+        codes[index] = mapping.setdefault(value, len(mapping))
+    return codes
+
+def _python_value(value):
+    """Giá trị NumPy thành kiểu Python như kết quả của driver (NaN thành None)"""
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+def _group_counts(codes: np.ndarray):
+    """
+    Đếm số hàng theo mã bằng np.add.reduceat trên các mã đã sắp xếp
+
+    Returns:
+        (order, starts, group_codes, counts): order là hoán vị ổn định sắp các hàng theo mã,
+        starts là vị trí bắt đầu của mỗi nhóm trong order
+    """
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    counts = np.add.reduceat(np.ones(len(sorted_codes), dtype=np.int64), starts)
+    return order, starts, sorted_codes[starts], counts
+
+class VariantArrays:
+    """Các cột của biến thể trong catalog, không đổi sau khi tạo"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.size = len(columns["variant_id"])
+        self.values = {attribute: _float_column(columns[attribute]) for attribute in ATTRIBUTES if attribute in columns}
+        self.category_codes = _codes(columns["category_id"])
+        self.product_codes = _codes(columns["product_id"])
+
+        # ORDER BY v.sales_rank ASC: null xếp cuối
+        sales_rank = self.values.get("sales_rank", np.full(self.size, np.nan))
+        self.rank_key = np.where(np.isnan(sales_rank), np.inf, sales_rank)
+
+    def select(self, statistical_type: str, attribute: str, comparison_value: Any = None) -> Optional[np.ndarray]:
+        """
+        Chỉ số các biến thể trả lời câu hỏi thống kê, theo đúng thứ tự và giới hạn của truy vấn Cypher
+
+        Returns:
+            Mảng chỉ số hàng, hoặc None nếu không trả lời được (thuộc tính/giá trị không hợp lệ)
+        """
+        values = self.values.get(attribute)
+        if values is None:
+            return None
+
+        present = ~np.isnan(values)
+        descending = False
+        by_value = True
+
+        if statistical_type in ("max", "min"):
+            if not present.any():
+                return np.empty(0, dtype=np.int64)
+            index = np.nanargmax(values) if statistical_type == "max" else np.nanargmin(values)
+            mask = values == values[index]
+            by_value = False
+        elif statistical_type == "equal":
+            if comparison_value is None:
+                return None
+            try:
+                value = float(str(comparison_value).replace(",", ""))
+            except ValueError:
+                return None
+            mask = values == value
+            by_value = False
+        elif statistical_type in ("greater_than", "less_than"):
+            if comparison_value is None:
+                return None
+            value = float(comparison_value)
+            mask = values > value if statistical_type == "greater_than" else values < value
+            descending = statistical_type == "greater_than"
+        elif statistical_type == "range":
+            if not isinstance(comparison_value, (list, tuple)) or len(comparison_value) != 2:
+                return None
+            min_value, max_value = float(comparison_value[0]), float(comparison_value[1])
+            mask = (values >= min_value) & (values <= max_value)
+        else:
+            return None
+
+        indices = np.flatnonzero(mask & present)
+        if by_value:
+            # ORDER BY toFloat(v[$attribute]) [DESC], v.sales_rank ASC
+            primary = -values[indices] if descending else values[indices]
+            order = np.lexsort((self.rank_key[indices], primary))
+        else:
+            order = np.argsort(self.rank_key[indices], kind="stable")
+        return indices[order][:_RESULT_LIMITS[statistical_type]]
+
+    def rows(self, indices: np.ndarray, attribute: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Các hàng kết quả giống kết quả Cypher của statistical_queries (kèm target_value)"""
+        rows = []
+        for index in indices.tolist():
+            row = {name: _python_value(array[index]) for name, array in self.columns.items()}
+            if attribute is not None:
+                row["target_value"] = row.get(attribute)
+            rows.append(row)
+        return rows
+
+    def summarize(self, indices: np.ndarray, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Gom nhóm các hàng đã chọn theo danh mục và sản phẩm
+
+        Cùng kết quả với format_statistics_for_response(aggregate_results_by_category_and_product(rows)),
+        nhưng số biến thể được đếm bằng np.add.reduceat trên mã danh mục/sản phẩm.
+        """
+        if len(indices) == 0:
+            return {"categories": [], "top_products": []}
+
+        category_codes = self.category_codes[indices]
+        product_codes = self.product_codes[indices]
+
+        # Số biến thể theo sản phẩm và danh mục
+        product_order, product_starts, product_group_codes, product_counts = _group_counts(product_codes)
+        _, _, category_group_codes, category_counts = _group_counts(category_codes)
+        category_variant_counts = dict(zip(category_group_codes.tolist(), category_counts.tolist()))
+
+        # Sản phẩm theo thứ tự xuất hiện đầu tiên (vị trí đầu của mỗi nhóm trong hoán vị ổn định)
+        first_positions = product_order[product_starts]
+        appearance = np.argsort(first_positions, kind="stable")
+
+        products = {}
+        category_products = {}
+        for group in appearance.tolist():
+            start = product_starts[group]
+            end = product_starts[group + 1] if group + 1 < len(product_starts) else len(product_order)
+            positions = product_order[start:end]
+            first = rows[positions[0]]
+            product_id = first.get("product_id")
+            products[product_id] = {
+                "id": product_id,
+                "name": first.get("product_name"),
+                "category_id": first.get("category_id"),
+                "category_name": first.get("category_name"),
+                "variant_count": int(product_counts[group]),
+                "variants": [rows[position] for position in positions.tolist()]
+            }
+            category_code = int(category_codes[positions[0]])
+            category_products.setdefault(category_code, []).append(product_id)
+
+        # Danh mục theo thứ tự xuất hiện đầu tiên
+        category_first = {}
+        for position, code in enumerate(category_codes.tolist()):
+            category_first.setdefault(code, position)
+
+        formatted_results = []
+        for code, position in category_first.items():
+            product_ids = category_products.get(code, [])
+            formatted_results.append({
+                "category_id": rows[position].get("category_id"),
+                "category_name": rows[position].get("category_name"),
+                "product_count": len(product_ids),
+                "variant_count": category_variant_counts[code],
+                "products": [
+                    {
+                        "product_id": product_id,
+                        "product_name": products[product_id]["name"],
+                        "variant_count": products[product_id]["variant_count"]
+                    }
+                    for product_id in product_ids
+                ]
+            })
+
+        top_products = sorted(products.values(), key=lambda product: product["variant_count"], reverse=True)[:3]
+        return {
+            "categories": formatted_results,
+            "top_products": top_products
+        }
+
+_engine_lock = threading.Lock()
+_arrays = None
+_source_columns = None  # Kết quả dạng cột đã dùng để tạo _arrays (cache trả về cùng object khi còn hiệu lực)
+
+def get_variant_arrays() -> Optional[VariantArrays]:
+    """Các cột biến thể hiện tại; tạo lại khi cache của connection trả về kết quả mới"""
+    global _arrays, _source_columns
+
+    columns = execute_query_columnar(_VARIANT_COLUMNS_QUERY)
+    if not columns or "variant_id" not in columns:
+        return None
+
+    with _engine_lock:
+        if columns is _source_columns and _arrays is not None:
+            return _arrays
+
+    arrays = VariantArrays(columns)
+    with _engine_lock:
+        _arrays = arrays
+        _source_columns = columns
+    log_info(f"Built statistical variant arrays: {arrays.size} variants")
+    return arrays
+
+def answer_statistical_query(intent_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Trả lời câu hỏi thống kê từ các mảng biến thể trong bộ nhớ
+
+    Args:
+        intent_data: Dữ liệu ý định từ LLM
+
+    Returns:
+        Kết quả theo định dạng của format_statistics_for_response, hoặc None nếu câu hỏi
+        không xác định được hoặc không tải được dữ liệu (dùng truy vấn Cypher thay thế)
+    """
+    try:
+        resolved = resolve_statistical_intent(intent_data)
+        if not resolved:
+            return None
+
+        statistical_type, attribute, comparison_value = resolved
+        arrays = get_variant_arrays()
+        if arrays is None:
+            return None
+
+        indices = arrays.select(statistical_type, attribute, comparison_value)
+        if indices is None:
+            return None
+
+        rows = arrays.rows(indices, attribute)
+        log_info(f"Answered {statistical_type} {attribute} from variant arrays: {len(rows)} variants")
+        return arrays.summarize(indices, rows)
+    except Exception as e:
+        log_error(f"Lỗi khi trả lời câu hỏi thống kê từ variant arrays: {str(e)}")
+        return None
@@ -2,20 +2,23 @@
 Module for statistical queries and aggregation functions for GraphRAG agent
 """
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from app.utils.logger import log_info, log_error
 from ..core.constants import STATISTICAL_PATTERNS, QUERY_TEMPLATES
 from ..core.core_functions import extract_comparison_value_from_text
+from ...neo4j_client.query_templates import CypherQuery, cypher_query
 
-def generate_statistical_cypher_query(intent_data: Dict[str, Any]) -> Optional[str]:
+STATISTICAL_TYPES = ("max", "min", "equal", "greater_than", "less_than", "range")
+
+def resolve_statistical_intent(intent_data: Dict[str, Any]) -> Optional[Tuple[str, str, Any]]:
     """
-    Tạo truy vấn Cypher cho các câu hỏi thống kê
+    Xác định loại thống kê, thuộc tính (tên trường trong database) và giá trị so sánh của câu hỏi
 
     Args:
         intent_data: Dữ liệu ý định từ LLM
 
     Returns:
-        Câu truy vấn Cypher hoặc None nếu không thể tạo
+        (statistical_type, attribute, comparison_value) hoặc None nếu không xác định được
     """
     try:
         statistical_type = intent_data.get("statistical_type")
@@ -310,19 +313,45 @@ def generate_statistical_cypher_query(intent_data: Dict[str, Any]) -> Optional[s
             log_error("Không có thuộc tính hợp lệ")
             return None
 
+        if statistical_type not in STATISTICAL_TYPES:
+            log_error(f"Không hỗ trợ loại thống kê: {statistical_type}")
+            return None
+
+        return statistical_type, db_attributes[0], comparison_value
+
+    except Exception as e:
+        log_error(f"Lỗi khi xác định câu hỏi thống kê: {str(e)}")
+        return None
+
+def generate_statistical_cypher_query(intent_data: Dict[str, Any]) -> Optional[CypherQuery]:
+    """
+    Tạo truy vấn Cypher cho các câu hỏi thống kê
+
+    Args:
+        intent_data: Dữ liệu ý định từ LLM
+
+    Returns:
+        CypherQuery (câu truy vấn cố định + tham số) hoặc None nếu không thể tạo
+    """
+    resolved = resolve_statistical_intent(intent_data)
+    if not resolved:
+        return None
+
+    statistical_type, attribute, comparison_value = resolved
+    try:
         # Tạo truy vấn dựa trên loại thống kê
         if statistical_type == "max":
-            return _generate_max_query(db_attributes[0])
+            return _generate_max_query(attribute)
         elif statistical_type == "min":
-            return _generate_min_query(db_attributes[0])
+            return _generate_min_query(attribute)
         elif statistical_type == "equal":
-            return _generate_equal_query(db_attributes[0], comparison_value)
+            return _generate_equal_query(attribute, comparison_value)
         elif statistical_type == "greater_than":
-            return _generate_greater_than_query(db_attributes[0], comparison_value)
+            return _generate_greater_than_query(attribute, comparison_value)
         elif statistical_type == "less_than":
-            return _generate_less_than_query(db_attributes[0], comparison_value)
+            return _generate_less_than_query(attribute, comparison_value)
         elif statistical_type == "range":
-            return _generate_range_query(db_attributes[0], comparison_value)
+            return _generate_range_query(attribute, comparison_value)
         else:
             log_error(f"Không hỗ trợ loại thống kê: {statistical_type}")
             return None
@@ -331,47 +360,48 @@ def generate_statistical_cypher_query(intent_data: Dict[str, Any]) -> Optional[s
         log_error(f"Lỗi khi tạo truy vấn thống kê: {str(e)}")
         return None
 
-def _generate_max_query(attribute: str) -> str:
-    """Tạo truy vấn tìm giá trị cao nhất"""
-    return f"""
-    MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE v.{attribute} IS NOT NULL
-    WITH MAX(toFloat(v.{attribute})) as max_value
-    MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE toFloat(v.{attribute}) = max_value
-    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
+# Phần RETURN dùng chung cho các truy vấn thống kê; thuộc tính được truy cập động qua v[$attribute]
+# nên nội dung câu truy vấn không đổi giữa các thuộc tính và các giá trị so sánh
+STATISTICAL_COLUMNS = """p.id as product_id, p.name as product_name, p.descriptions as product_description,
            c.id as category_id, c.name_cat as category_name, c.description as category_description,
            v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
            v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
            v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
            v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank,
-           v.product_id as variant_product_id, v.product_name as variant_product_name,
-           v.{attribute} as target_value
+           v.product_id as variant_product_id, v.product_name as variant_product_name"""
+
+_STATISTICAL_RETURN = f"""
+    RETURN {STATISTICAL_COLUMNS},
+           v[$attribute] as target_value
+"""
+
+def _generate_max_query(attribute: str) -> CypherQuery:
+    """Tạo truy vấn tìm giá trị cao nhất"""
+    return cypher_query(f"""
+    MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
+    WHERE v[$attribute] IS NOT NULL
+    WITH MAX(toFloat(v[$attribute])) as max_value
+    MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
+    WHERE toFloat(v[$attribute]) = max_value
+    {_STATISTICAL_RETURN}
     ORDER BY v.sales_rank ASC
     LIMIT 10
-    """
+    """, attribute=attribute)
 
-def _generate_min_query(attribute: str) -> str:
+def _generate_min_query(attribute: str) -> CypherQuery:
     """Tạo truy vấn tìm giá trị thấp nhất"""
-    return f"""
+    return cypher_query(f"""
     MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE v.{attribute} IS NOT NULL
-    WITH MIN(toFloat(v.{attribute})) as min_value
+    WHERE v[$attribute] IS NOT NULL
+    WITH MIN(toFloat(v[$attribute])) as min_value
     MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE toFloat(v.{attribute}) = min_value
-    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
-           c.id as category_id, c.name_cat as category_name, c.description as category_description,
-           v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
-           v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
-           v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
-           v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank,
-           v.product_id as variant_product_id, v.product_name as variant_product_name,
-           v.{attribute} as target_value
+    WHERE toFloat(v[$attribute]) = min_value
+    {_STATISTICAL_RETURN}
     ORDER BY v.sales_rank ASC
     LIMIT 10
-    """
+    """, attribute=attribute)
 
-def _generate_equal_query(attribute: str, value: Any) -> str:
+def _generate_equal_query(attribute: str, value: Any) -> Optional[CypherQuery]:
     """Tạo truy vấn tìm giá trị bằng"""
     if value is None:
         return None
@@ -386,81 +416,53 @@ def _generate_equal_query(attribute: str, value: Any) -> str:
         log_error(f"Không thể chuyển đổi giá trị '{value}' thành số")
         return None
 
-    return f"""
+    return cypher_query(f"""
     MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE v.{attribute} IS NOT NULL AND toFloat(v.{attribute}) = {numeric_value}
-    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
-           c.id as category_id, c.name_cat as category_name, c.description as category_description,
-           v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
-           v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
-           v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
-           v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank,
-           v.product_id as variant_product_id, v.product_name as variant_product_name,
-           v.{attribute} as target_value
+    WHERE v[$attribute] IS NOT NULL AND toFloat(v[$attribute]) = $value
+    {_STATISTICAL_RETURN}
     ORDER BY v.sales_rank ASC
     LIMIT 20
-    """
+    """, attribute=attribute, value=numeric_value)
 
-def _generate_greater_than_query(attribute: str, value: Any) -> str:
+def _generate_greater_than_query(attribute: str, value: Any) -> Optional[CypherQuery]:
     """Tạo truy vấn tìm giá trị lớn hơn"""
     if value is None:
         return None
 
-    return f"""
+    return cypher_query(f"""
     MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE toFloat(v.{attribute}) > {float(value)}
-    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
-           c.id as category_id, c.name_cat as category_name, c.description as category_description,
-           v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
-           v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
-           v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
-           v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank,
-           v.product_id as variant_product_id, v.product_name as variant_product_name,
-           v.{attribute} as target_value
-    ORDER BY toFloat(v.{attribute}) DESC, v.sales_rank ASC
+    WHERE toFloat(v[$attribute]) > $value
+    {_STATISTICAL_RETURN}
+    ORDER BY toFloat(v[$attribute]) DESC, v.sales_rank ASC
     LIMIT 20
-    """
+    """, attribute=attribute, value=float(value))
 
-def _generate_less_than_query(attribute: str, value: Any) -> str:
+def _generate_less_than_query(attribute: str, value: Any) -> Optional[CypherQuery]:
     """Tạo truy vấn tìm giá trị nhỏ hơn"""
     if value is None:
         return None
 
-    return f"""
+    return cypher_query(f"""
     MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE toFloat(v.{attribute}) < {float(value)}
-    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
-           c.id as category_id, c.name_cat as category_name, c.description as category_description,
-           v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
-           v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
-           v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
-           v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank,
-           v.product_id as variant_product_id, v.product_name as variant_product_name,
-           v.{attribute} as target_value
-    ORDER BY toFloat(v.{attribute}) ASC, v.sales_rank ASC
+    WHERE toFloat(v[$attribute]) < $value
+    {_STATISTICAL_RETURN}
+    ORDER BY toFloat(v[$attribute]) ASC, v.sales_rank ASC
     LIMIT 20
-    """
+    """, attribute=attribute, value=float(value))
 
-def _generate_range_query(attribute: str, value_range: Any) -> str:
+def _generate_range_query(attribute: str, value_range: Any) -> Optional[CypherQuery]:
     """Tạo truy vấn tìm giá trị trong khoảng"""
     if not value_range or not isinstance(value_range, (list, tuple)) or len(value_range) != 2:
         return None
 
     min_val, max_val = value_range
-    return f"""
+    return cypher_query(f"""
     MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
-    WHERE toFloat(v.{attribute}) >= {float(min_val)} AND toFloat(v.{attribute}) <= {float(max_val)}
-    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
-           c.id as category_id, c.name_cat as category_name, c.description as category_description,
-           v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
-           v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
-           v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
-           v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank,
-           v.product_id as variant_product_id, v.product_name as variant_product_name,
-           v.{attribute} as target_value
-    ORDER BY toFloat(v.{attribute}) ASC, v.sales_rank ASC
+    WHERE toFloat(v[$attribute]) >= $min_value AND toFloat(v[$attribute]) <= $max_value
+    {_STATISTICAL_RETURN}
+    ORDER BY toFloat(v[$attribute]) ASC, v.sales_rank ASC
     LIMIT 20
-    """
+    """, attribute=attribute, min_value=float(min_val), max_value=float(max_val))
 
 def is_statistical_query(intent_data: Dict[str, Any]) -> bool:
     """
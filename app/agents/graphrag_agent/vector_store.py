@@ -0,0 +1,240 @@
+"""
+Catalog vector store for GraphRAG hybrid search
+
+Giữ embedding của ProductCommunity, Product và Variant trong một ma trận float32 liền khối
+đã chuẩn hóa L2, để tìm top-k bằng một phép nhân ma trận và argpartition thay vì tính lại
+độ tương đồng cho từng cặp. Ma trận có thể được lưu thành snapshot .npy (kèm file .json chứa
+metadata) và memory-map lại ở lần khởi động sau (GRAPHRAG_VECTOR_SNAPSHOT=<đường dẫn .npy>).
+"""
+import os
+import json
+import threading
+from typing import Dict, List, Any, Optional, Iterable
+import numpy as np
+from app.utils.logger import log_info, log_error, log_warning
+from app.neo4j_client.connection import execute_query_with_semaphore
+from .community_registry import get_community_registry, decode_embedding
+
+COMMUNITY = "community"
+PRODUCT = "product"
+VARIANT = "variant"
+KINDS = (COMMUNITY, PRODUCT, VARIANT)
+
+_snapshot_path = os.environ.get('GRAPHRAG_VECTOR_SNAPSHOT')
+
+_PRODUCT_EMBEDDINGS_QUERY = """
+MATCH (p:Product)
+WHERE p.embedding IS NOT NULL
+RETURN p.id AS id, p.name AS name, p.id AS product_id, p.embedding AS embedding
+"""
+
+_VARIANT_EMBEDDINGS_QUERY = """
+MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)
+WHERE v.embedding IS NOT NULL
+RETURN v.id AS id, coalesce(v.name, p.name) AS name, p.id AS product_id, v.embedding AS embedding
+"""
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Chuẩn hóa L2 từng hàng (hàng toàn 0 giữ nguyên)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms), dtype=np.float32)
+
+class VectorStore:
+    """
+    Ma trận embedding (N x D, float32, đã chuẩn hóa L2) kèm metadata của từng hàng
+
+    Mỗi hàng là một community, sản phẩm hoặc biến thể: kinds[i], ids[i], names[i] và
+    product_ids[i] (None với community).
+    """
+
+    def __init__(self, matrix: np.ndarray, kinds: List[str], ids: List[Any],
+                 names: List[str], product_ids: List[Any], normalized: bool = False):
+        self.matrix = matrix if normalized else _normalize_rows(np.asarray(matrix, dtype=np.float32))
+        self.kinds = np.asarray(kinds, dtype=object)
+        self.ids = list(ids)
+        self.names = list(names)
+        self.product_ids = np.asarray(product_ids, dtype=object)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def mask(self, kinds: Optional[Iterable[str]] = None, product_ids: Optional[Iterable[Any]] = None) -> np.ndarray:
+        """
+        Mask lọc các hàng theo loại và/hoặc id sản phẩm (cho top_k)
+
+        Args:
+            kinds: Các loại được giữ (community, product, variant), None = tất cả
+            product_ids: Chỉ giữ sản phẩm/biến thể thuộc các sản phẩm này (community bị loại)
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if kinds is not None:
+            mask &= np.isin(self.kinds, list(kinds))
+        if product_ids is not None:
+            allowed = set(product_ids)
+            mask &= np.fromiter((product_id in allowed for product_id in self.product_ids), dtype=bool, count=len(self))
+        return mask
+
+    def top_k(self, query_vec: Any, k: int = 10, filter_mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        k hàng có cosine similarity cao nhất với query_vec
+
+        Args:
+            query_vec: Embedding truy vấn (cùng mô hình, cùng số chiều với catalog)
+            k: Số kết quả
+            filter_mask: Mảng bool độ dài N, chỉ xét các hàng True
+
+        Returns:
+            Danh sách {'kind', 'id', 'name', 'product_id', 'score'} theo score giảm dần
+        """
+        query = np.asarray(query_vec, dtype=np.float32).reshape(-1)
+        if len(self) == 0 or query.shape[0] != self.dimension:
+            return []
+
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (query / norm)
+        candidates = len(self)
+        if filter_mask is not None:
+            scores = np.where(filter_mask, scores, -np.inf)
+            candidates = int(np.count_nonzero(filter_mask))
+
+        k = min(k, candidates)
+        if k <= 0:
+            return []
+
+        # argpartition chọn k hàng tốt nhất (O(N)), chỉ sắp xếp k hàng đó
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            {
+                "kind": self.kinds[index],
+                "id": self.ids[index],
+                "name": self.names[index],
+                "product_id": self.product_ids[index],
+                "score": float(scores[index])
+            }
+            for index in top.tolist()
+        ]
+
+    def save(self, path: str):
+        """Lưu ma trận thành path (.npy) và metadata thành path + '.json' (ghi tạm rồi đổi tên)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{path}.tmp", "wb") as file:
+            np.save(file, self.matrix)
+        with open(f"{path}.json.tmp", "w", encoding="utf-8") as file:
+            json.dump({
+                "kinds": self.kinds.tolist(),
+                "ids": self.ids,
+                "names": self.names,
+                "product_ids": self.product_ids.tolist()
+            }, file, ensure_ascii=False, default=str)
+
+        os.replace(f"{path}.tmp", path)
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorStore":
+        """Đọc snapshot do save() tạo; mmap=True memory-map ma trận thay vì đọc vào bộ nhớ"""
+        matrix = np.load(path, mmap_mode="r" if mmap else None)
+        with open(f"{path}.json", encoding="utf-8") as file:
+            metadata = json.load(file)
+        if len(metadata["ids"]) != matrix.shape[0]:
+            raise ValueError(f"Vector snapshot metadata does not match matrix ({len(metadata['ids'])} != {matrix.shape[0]})")
+        return cls(matrix, metadata["kinds"], metadata["ids"], metadata["names"], metadata["product_ids"], normalized=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": len(self),
+            "dimension": self.dimension,
+            "byKind": {kind: int(np.count_nonzero(self.kinds == kind)) for kind in KINDS},
+            "memoryMapped": isinstance(self.matrix, np.memmap)
+        }
+
+def build_vector_store(refresh_communities: bool = False) -> VectorStore:
+    """Tạo vector store từ embedding của community (registry), sản phẩm và biến thể trên Neo4j"""
+    rows = []  # (kind, id, name, product_id, embedding)
+    for community in get_community_registry(refresh=refresh_communities).communities.values():
+        if community.embedding is not None:
+            rows.append((COMMUNITY, community.id, community.name, None, community.embedding))
+
+    for kind, query in ((PRODUCT, _PRODUCT_EMBEDDINGS_QUERY), (VARIANT, _VARIANT_EMBEDDINGS_QUERY)):
+        for record in execute_query_with_semaphore(query, use_cache=False):
+            embedding = decode_embedding(record.get("embedding"))
+            if embedding is not None:
+                rows.append((kind, record.get("id"), record.get("name") or "", record.get("product_id"), embedding))
+
+    if not rows:
+        return VectorStore(np.empty((0, 0), dtype=np.float32), [], [], [], [])
+
+    # Chỉ giữ các embedding có số chiều phổ biến nhất (cùng một mô hình)
+    dimensions = [row[4].shape[0] for row in rows]
+    dimension = max(set(dimensions), key=dimensions.count)
+    skipped = sum(1 for value in dimensions if value != dimension)
+    if skipped:
+        log_warning(f"Skipped {skipped} embeddings whose dimension is not {dimension}")
+    rows = [row for row in rows if row[4].shape == (dimension,)]
+
+    matrix = np.vstack([row[4] for row in rows]).astype(np.float32, copy=False)
+    return VectorStore(
+        matrix,
+        kinds=[row[0] for row in rows],
+        ids=[row[1] for row in rows],
+        names=[row[2] for row in rows],
+        product_ids=[row[3] for row in rows]
+    )
+
+_store_lock = threading.Lock()
+_store: Optional[VectorStore] = None
+
+def get_vector_store(refresh: bool = False) -> VectorStore:
+    """
+    Vector store của catalog (tạo ở lần gọi đầu tiên)
+
+    Nếu GRAPHRAG_VECTOR_SNAPSHOT được đặt, snapshot có sẵn được memory-map thay vì đọc
+    embedding từ Neo4j; refresh=True tạo lại từ Neo4j và ghi đè snapshot.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is not None and not refresh:
+            return _store
+
+        if not refresh and _snapshot_path and os.path.exists(_snapshot_path):
+            try:
+                _store = VectorStore.load(_snapshot_path)
+                log_info(f"Loaded vector snapshot {_snapshot_path}: {_store.stats()}")
+                return _store
+            except Exception as e:
+                log_error(f"Error loading vector snapshot {_snapshot_path}: {str(e)}")
+
+        try:
+            store = build_vector_store(refresh_communities=refresh)
+        except Exception as e:
+            log_error(f"Error building vector store: {str(e)}")
+            store = None
+
+        if store is None or len(store) == 0:
+            # Không cache store rỗng (truy vấn lỗi trả về []), giữ store cũ nếu có
+            if _store is not None:
+                log_warning("Vector store rebuild found no embeddings, keeping the previous store")
+                return _store
+            return store if store is not None else VectorStore(np.empty((0, 0), dtype=np.float32), [], [], [], [])
+
+        _store = store
+        log_info(f"Built vector store: {store.stats()}")
+
+        if _snapshot_path:
+            try:
+                store.save(_snapshot_path)
+            except Exception as e:
+                log_error(f"Error saving vector snapshot {_snapshot_path}: {str(e)}")
+        return _store
@@ -4,7 +4,10 @@ Sử dụng để xác thực tên sản phẩm và danh mục từ database
 """
 import re
 from typing import Dict, List, Any, Optional, Tuple
-from ...neo4j_client.connection import execute_query
+from ...neo4j_client.connection import execute_query, execute_query_async
+from ...neo4j_client.query_templates import CypherQuery, contains_any, fulltext_search_text
+from ...neo4j_client.index_bootstrap import has_index, PRODUCT_SEARCH_INDEX, CATEGORY_SEARCH_INDEX
+from ...neo4j_client import catalog_mirror
 from ...utils.logger import log_info, log_error
 
 class DatabaseValidator:
@@ -12,6 +15,62 @@ class DatabaseValidator:
     Lớp xác thực thông tin từ Neo4j
     """
     
+    @staticmethod
+    def _collect_product_names(product_names: Dict[str, List[str]]) -> List[str]:
+        """Gộp tên sản phẩm của tất cả ngôn ngữ thành một danh sách"""
+        all_names = []
+        if "vi" in product_names:
+            all_names.extend(product_names["vi"])
+        if "en" in product_names:
+            all_names.extend(product_names["en"])
+        return all_names
+
+    @staticmethod
+    def _build_product_names_query(all_names: List[str]) -> Optional[CypherQuery]:
+        """Tạo truy vấn Cypher xác thực tên sản phẩm"""
+        names = [name for name in all_names if name]
+        if not names:
+            return None
+
+        # Tìm qua full-text index, xếp hạng theo score
+        search = fulltext_search_text(names)
+        if search and has_index(PRODUCT_SEARCH_INDEX):
+            return CypherQuery(f"""
+            CALL db.index.fulltext.queryNodes("{PRODUCT_SEARCH_INDEX}", $search) YIELD node AS p, score
+            RETURN p.id as id, p.name as name
+            ORDER BY score DESC
+            LIMIT 10
+            """, {"search": search})
+
+        # Câu truy vấn cố định, danh sách tên được truyền qua $names
+        return CypherQuery(f"""
+            MATCH (p:Product)
+            WHERE {contains_any("p.name", "names")}
+            RETURN p.id as id, p.name as name
+            LIMIT 10
+            """, {"names": names})
+
+    @staticmethod
+    def _classify_product_names(results: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Phân loại tên sản phẩm trả về từ Neo4j theo ngôn ngữ"""
+        validated_names = {
+            "vi": [],
+            "en": []
+        }
+
+        for record in results:
+            product_name = record.get("name", "")
+            if product_name:
+                # Phân loại tên sản phẩm theo ngôn ngữ
+                if any(char in "àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ" for char in product_name.lower()):
+                    if product_name not in validated_names["vi"]:
+                        validated_names["vi"].append(product_name)
+                else:
+                    if product_name not in validated_names["en"]:
+                        validated_names["en"].append(product_name)
+
+        return validated_names
+
     @staticmethod
     def validate_product_names(product_names: Dict[str, List[str]]) -> Dict[str, List[str]]:
         """
@@ -23,62 +82,97 @@ class DatabaseValidator:
         Returns:
             Dict chứa tên sản phẩm đã được xác thực
         """
-        validated_names = {
-            "vi": [],
-            "en": []
-        }
-        
-        # Tạo danh sách tất cả tên sản phẩm
-        all_names = []
-        if "vi" in product_names:
-            all_names.extend(product_names["vi"])
-        if "en" in product_names:
-            all_names.extend(product_names["en"])
-            
+        all_names = DatabaseValidator._collect_product_names(product_names)
         if not all_names:
-            return validated_names
+            return {"vi": [], "en": []}
             
         try:
-            # Tạo điều kiện tìm kiếm
-            conditions = []
-            for name in all_names:
-                if name:
-                    # Sử dụng regex matching thay vì CONTAINS
-                    conditions.append(f'p.name =~ "(?i).*{name}.*"')
-                    
-            if not conditions:
-                return validated_names
-                
-            # Tạo truy vấn Cypher
-            cypher_query = f"""
-            MATCH (p:Product)
-            WHERE {" OR ".join(conditions)}
-            RETURN p.id as id, p.name as name
-            LIMIT 10
-            """
+            # Tra trong catalog mirror trước, chỉ hỏi Neo4j khi mirror chưa sẵn sàng
+            results = catalog_mirror.search_products(all_names)
+            if results is None:
+                cypher_query = DatabaseValidator._build_product_names_query(all_names)
+                if not cypher_query:
+                    return {"vi": [], "en": []}
+
+                # Thực thi truy vấn
+                results = execute_query(cypher_query.text, cypher_query.params)
             
-            # Thực thi truy vấn
-            results = execute_query(cypher_query)
+            validated_names = DatabaseValidator._classify_product_names(results)
+            log_info(f"Validated product names: {validated_names}")
+            return validated_names
             
-            # Xử lý kết quả
-            for record in results:
-                product_name = record.get("name", "")
-                if product_name:
-                    # Phân loại tên sản phẩm theo ngôn ngữ
-                    if any(char in "àáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđ" for char in product_name.lower()):
-                        if product_name not in validated_names["vi"]:
-                            validated_names["vi"].append(product_name)
-                    else:
-                        if product_name not in validated_names["en"]:
-                            validated_names["en"].append(product_name)
+        except Exception as e:
+            log_error(f"Error validating product names: {str(e)}")
+            return product_names
+
+    @staticmethod
+    async def validate_product_names_async(product_names: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """
+        Xác thực tên sản phẩm từ Neo4j mà không block event loop
+        
+        Args:
+            product_names: Dict chứa tên sản phẩm theo ngôn ngữ
             
+        Returns:
+            Dict chứa tên sản phẩm đã được xác thực
+        """
+        all_names = DatabaseValidator._collect_product_names(product_names)
+        if not all_names:
+            return {"vi": [], "en": []}
+
+        try:
+            # Chỉ dùng mirror đã tải sẵn để không tải catalog trên event loop
+            results = catalog_mirror.search_products(all_names) if catalog_mirror.is_ready() else None
+            if results is None:
+                cypher_query = DatabaseValidator._build_product_names_query(all_names)
+                if not cypher_query:
+                    return {"vi": [], "en": []}
+
+                results = await execute_query_async(cypher_query.text, cypher_query.params)
+
+            validated_names = DatabaseValidator._classify_product_names(results)
             log_info(f"Validated product names: {validated_names}")
             return validated_names
-            
+
         except Exception as e:
             log_error(f"Error validating product names: {str(e)}")
             return product_names
     
+    @staticmethod
+    def _build_category_names_query(category_names: List[str]) -> Optional[CypherQuery]:
+        """Tạo truy vấn Cypher xác thực tên danh mục"""
+        names = [name for name in category_names if name]
+        if not names:
+            return None
+
+        # Tìm qua full-text index, xếp hạng theo score
+        search = fulltext_search_text(names)
+        if search and has_index(CATEGORY_SEARCH_INDEX):
+            return CypherQuery(f"""
+            CALL db.index.fulltext.queryNodes("{CATEGORY_SEARCH_INDEX}", $search) YIELD node AS c, score
+            RETURN c.id as id, c.name_cat as name
+            ORDER BY score DESC
+            LIMIT 10
+            """, {"search": search})
+
+        # Câu truy vấn cố định, danh sách tên được truyền qua $names
+        return CypherQuery(f"""
+            MATCH (c:Category)
+            WHERE {contains_any("c.name_cat", "names")}
+            RETURN c.id as id, c.name_cat as name
+            LIMIT 10
+            """, {"names": names})
+
+    @staticmethod
+    def _collect_category_names(results: List[Dict[str, Any]]) -> List[str]:
+        """Lấy danh sách tên danh mục không trùng lặp từ kết quả truy vấn"""
+        validated_names = []
+        for record in results:
+            category_name = record.get("name", "")
+            if category_name and category_name not in validated_names:
+                validated_names.append(category_name)
+        return validated_names
+
     @staticmethod
     def validate_category_names(category_names: List[str]) -> List[str]:
         """
@@ -94,40 +188,81 @@ class DatabaseValidator:
             return []
             
         try:
-            # Tạo điều kiện tìm kiếm
-            conditions = []
-            for name in category_names:
-                if name:
-                    # Sử dụng regex matching thay vì CONTAINS
-                    conditions.append(f'c.name_cat =~ "(?i).*{name}.*"')
-                    
-            if not conditions:
-                return []
-                
-            # Tạo truy vấn Cypher
-            cypher_query = f"""
-            MATCH (c:Category)
-            WHERE {" OR ".join(conditions)}
-            RETURN c.id as id, c.name_cat as name
-            LIMIT 10
-            """
+            # Tra trong catalog mirror trước, chỉ hỏi Neo4j khi mirror chưa sẵn sàng
+            results = catalog_mirror.search_categories(category_names)
+            if results is None:
+                cypher_query = DatabaseValidator._build_category_names_query(category_names)
+                if not cypher_query:
+                    return []
+
+                # Thực thi truy vấn
+                results = execute_query(cypher_query.text, cypher_query.params)
             
-            # Thực thi truy vấn
-            results = execute_query(cypher_query)
+            validated_names = DatabaseValidator._collect_category_names(results)
+            log_info(f"Validated category names: {validated_names}")
+            return validated_names
             
-            # Xử lý kết quả
-            validated_names = []
-            for record in results:
-                category_name = record.get("name", "")
-                if category_name and category_name not in validated_names:
-                    validated_names.append(category_name)
+        except Exception as e:
+            log_error(f"Error validating category names: {str(e)}")
+            return category_names
+
+    @staticmethod
+    async def validate_category_names_async(category_names: List[str]) -> List[str]:
+        """
+        Xác thực tên danh mục từ Neo4j mà không block event loop
+        
+        Args:
+            category_names: Danh sách tên danh mục
             
+        Returns:
+            Danh sách tên danh mục đã được xác thực
+        """
+        if not category_names:
+            return []
+
+        try:
+            # Chỉ dùng mirror đã tải sẵn để không tải catalog trên event loop
+            results = catalog_mirror.search_categories(category_names) if catalog_mirror.is_ready() else None
+            if results is None:
+                cypher_query = DatabaseValidator._build_category_names_query(category_names)
+                if not cypher_query:
+                    return []
+
+                results = await execute_query_async(cypher_query.text, cypher_query.params)
+
+            validated_names = DatabaseValidator._collect_category_names(results)
             log_info(f"Validated category names: {validated_names}")
             return validated_names
-            
+
         except Exception as e:
             log_error(f"Error validating category names: {str(e)}")
             return category_names
+
+    async def validate(self, intent: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Xác thực tên sản phẩm và danh mục trong intent với Neo4j (async)
+        
+        Args:
+            intent: Intent đã suy luận, dữ liệu nằm trong intent['data']
+            
+        Returns:
+            Intent với tên sản phẩm và danh mục đã được xác thực
+        """
+        intent_data = intent.get("data") or {}
+
+        product_names = intent_data.get("product_names")
+        if product_names:
+            validated_products = await self.validate_product_names_async(product_names)
+            if validated_products.get("vi") or validated_products.get("en"):
+                intent_data["product_names"] = validated_products
+
+        category_names = intent_data.get("category_names")
+        if category_names:
+            validated_categories = await self.validate_category_names_async(category_names)
+            if validated_categories:
+                intent_data["category_names"] = validated_categories
+
+        return intent
     
     @staticmethod
     def get_all_categories() -> List[str]:
@@ -138,14 +273,17 @@ class DatabaseValidator:
             List[str]: Danh sách tên danh mục
         """
         try:
-            # Tạo truy vấn Cypher
-            cypher_query = """
-            MATCH (c:Category)
-            RETURN c.name_cat as name
-            """
-            
-            # Thực thi truy vấn
-            results = execute_query(cypher_query)
+            # Tra trong catalog mirror trước
+            results = catalog_mirror.all_categories()
+            if results is None:
+                # Tạo truy vấn Cypher
+                cypher_query = """
+                MATCH (c:Category)
+                RETURN c.name_cat as name
+                """
+
+                # Thực thi truy vấn
+                results = execute_query(cypher_query)
             
             # Xử lý kết quả
             category_names = []
@@ -17,7 +17,7 @@ from .result_processor import process_results
 from ..core.base_agent import BaseAgent
 from ..core.message_bus import MessageBus
 from ..core.config import agent_config
-from ..core.utils import AsyncCache, async_retry, async_timeout
+from ..core.utils import AsyncCache, async_retry, async_timeout, intent_fingerprint
 from .result_processor import ResultProcessor
 from .prompt_templates_updated import PromptTemplates
 from .entity_extraction import EntityExtraction
@@ -25,6 +25,12 @@ from .enhanced_intent_inference import EnhancedIntentInference
 from .database_validator import DatabaseValidator
 from .product_name_translator import ProductNameTranslator
 
+# Recommendation cache shared by every RecommendAgent instance (routes create one per request)
+_recommendation_cache = AsyncCache(
+    ttl=agent_config.get('agents.recommend.cache_ttl', 1800),
+    max_size=agent_config.get('agents.recommend.cache_max_size', 1000)
+)
+
 class RecommendAgent(BaseAgent):
     """Recommend Agent for handling user recommendations"""
 
@@ -32,7 +38,7 @@ class RecommendAgent(BaseAgent):
         """Initialize Recommend agent"""
         super().__init__(agent_id)
         self._logger = logging.getLogger('agent.recommend')
-        self._cache = AsyncCache(ttl=agent_config.get('agents.recommend.cache_ttl', 1800))
+        self._cache = _recommendation_cache
         self._timeout = agent_config.get('agents.recommend.timeout', 15)
         
         # Initialize components
@@ -57,13 +63,6 @@ class RecommendAgent(BaseAgent):
     async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Process incoming message"""
         try:
-            # Check cache first
-            message_id = message.get('id')
-            if message_id:
-                cached_result = await self._cache.get(message_id)
-                if cached_result:
-                    return cached_result
-            
             # Extract message content
             content = message.get('content', '')
             user_id = message.get('user_id')
@@ -83,6 +82,17 @@ class RecommendAgent(BaseAgent):
             # Translate product names if needed
             intent = await self._product_translator.translate(intent)
             
+            # Check cache (keyed on the intent and the user's preferences, so rephrased
+            # questions share one GraphRAG round trip; order intents read customer data)
+            intent_data = intent.get('data') or {}
+            cache_key = None
+            if not intent_data.get('is_order_query'):
+                cache_key = intent_fingerprint(intent_data, {'type': intent.get('type'), 'preferences': preferences})
+                cached_result = await self._cache.get(cache_key)
+                if cached_result:
+                    await self._update_preferences(user_id, content, cached_result.get('recommendations', []))
+                    return cached_result
+            
             # Send to GraphRAG for data retrieval
             graphrag_response = await self.send_message(
                 'graphrag',
@@ -105,8 +115,8 @@ class RecommendAgent(BaseAgent):
             }
             
             # Cache results
-            if message_id:
-                await self._cache.set(message_id, response)
+            if cache_key:
+                await self._cache.set(cache_key, response)
                 
             return response
             
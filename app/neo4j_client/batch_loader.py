@@ -0,0 +1,149 @@
+"""
+Batch loader - gom các truy vấn tra cứu theo khóa từ nhiều request đồng thời
+Các khóa được gom trong một cửa sổ thời gian ngắn (hoặc tới khi đủ max_batch_size)
+rồi tra cứu bằng một câu `UNWIND $ids` duy nhất thay vì N round trip
+"""
+import time
+import threading
+import concurrent.futures
+from ..utils.logger import log_info, log_error
+from . import routing
+
+# Các loader đã tạo {tên: BatchLoader}, dùng cho metrics
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+class BatchLoader:
+    """
+    Gom khóa từ các thread gọi load() đồng thời và tra cứu chúng trong một lần
+
+    batch_fn(keys) nhận danh sách khóa không trùng lặp và trả về dict {khóa: giá trị};
+    khóa không có trong dict được trả về là None. Lô đầu tiên được gửi đi sau max_wait
+    giây kể từ khóa đầu tiên, hoặc ngay khi có đủ max_batch_size khóa.
+
+    Lô được gửi từ thread Timer, không mang contextvars (phiên chat) của caller. Caller có
+    bookmark (phiên vừa ghi) được tra cứu riêng trên thread của mình để đọc kèm bookmark.
+    """
+
+    def __init__(self, batch_fn, name="batch", max_batch_size=100, max_wait=0.005, timeout=30):
+        self._batch_fn = batch_fn
+        self._name = name
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pending = {}  # {khóa: Future} của lô đang gom
+        self._timer = None
+
+        # Thống kê
+        self._batches = 0
+        self._keys_loaded = 0
+        self._loads = 0
+        self._errors = 0
+        self._bookmarked_loads = 0
+
+        with _loaders_lock:
+            _loaders[name] = self
+
+    def load(self, key):
+        """
+        Lấy giá trị của một khóa (blocking tới khi lô chứa khóa được tra cứu xong)
+
+        Returns:
+            Giá trị do batch_fn trả về cho khóa, None nếu không tìm thấy hoặc lỗi
+        """
+        future = self.load_future(key)
+        try:
+            return future.result(timeout=self._timeout)
+        except Exception as e:
+            log_error(f"Error loading key {key!r} from {self._name} loader: {str(e)}")
+            return None
+
+    def load_future(self, key):
+        """Đăng ký khóa vào lô hiện tại và trả về concurrent.futures.Future của nó"""
+        if routing.get_bookmarks() is not None:
+            # Phiên có bookmark: không gom vào lô (thread Timer sẽ đọc không kèm bookmark)
+            future = concurrent.futures.Future()
+            with self._lock:
+                self._loads += 1
+                self._bookmarked_loads += 1
+            self._dispatch({key: future})
+            return future
+
+        batch = None
+        with self._lock:
+            self._loads += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = concurrent.futures.Future()
+                self._pending[key] = future
+
+            if len(self._pending) >= self._max_batch_size:
+                # Đủ khóa - gửi lô ngay trên thread hiện tại
+                batch = self._take_batch()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._max_wait, self._dispatch_pending)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if batch:
+            self._dispatch(batch)
+        return future
+
+    def _take_batch(self):
+        """Lấy lô đang gom và bắt đầu lô mới (gọi khi đã giữ _lock)"""
+        batch = self._pending
+        self._pending = {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _dispatch_pending(self):
+        with self._lock:
+            batch = self._take_batch()
+        if batch:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        """Tra cứu một lô và trả kết quả cho từng Future"""
+        keys = list(batch.keys())
+        start_time = time.time()
+        try:
+            values = self._batch_fn(keys) or {}
+        except Exception as e:
+            log_error(f"Error in {self._name} batch of {len(keys)} keys: {str(e)}")
+            with self._lock:
+                self._errors += 1
+            for future in batch.values():
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._batches += 1
+            self._keys_loaded += len(keys)
+
+        for key, future in batch.items():
+            future.set_result(values.get(key))
+
+        if len(keys) > 1:
+            log_info(f"Loaded {len(keys)} keys in one {self._name} batch in {time.time() - start_time:.3f}s")
+
+    def stats(self):
+        """Lấy thống kê của loader"""
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'keysLoaded': self._keys_loaded,
+                'loads': self._loads,
+                'errors': self._errors,
+                'bookmarkedLoads': self._bookmarked_loads,
+                'avgBatchSize': self._keys_loaded / self._batches if self._batches > 0 else 0
+            }
+
+def loader_stats():
+    """Lấy thống kê của tất cả loader {tên: stats}"""
+    with _loaders_lock:
+        loaders = dict(_loaders)
+    return {name: loader.stats() for name, loader in loaders.items()}
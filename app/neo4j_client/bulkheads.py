@@ -0,0 +1,171 @@
+"""
+Bulkheads - circuit breaker và giới hạn truy vấn đồng thời riêng cho từng loại truy vấn
+Truy vấn được chia thành các loại (catalog, customer, write, analytics); lỗi hoặc quá tải
+ở một loại (vd. truy vấn thống kê nặng) không chặn các loại khác (vd. đăng nhập khuôn mặt)
+"""
+import os
+import threading
+from datetime import datetime
+from .concurrency_limiter import AdaptiveConcurrencyLimiter
+from ..utils.logger import log_info, log_warning
+
+CATALOG = "catalog"
+CUSTOMER = "customer"
+WRITE = "write"
+ANALYTICS = "analytics"
+
+# Cấu hình mặc định cho từng loại truy vấn
+BULKHEAD_CONFIG = {
+    CATALOG: {
+        'failure_threshold': 3, 'open_timeout': 30,
+        'initial_limit': 20, 'min_limit': 2, 'max_limit': 50
+    },
+    CUSTOMER: {
+        'failure_threshold': 3, 'open_timeout': 15,
+        'initial_limit': 10, 'min_limit': 2, 'max_limit': 20
+    },
+    WRITE: {
+        'failure_threshold': 2, 'open_timeout': 30,
+        'initial_limit': 5, 'min_limit': 1, 'max_limit': 10
+    },
+    ANALYTICS: {
+        'failure_threshold': 2, 'open_timeout': 60,
+        'initial_limit': 4, 'min_limit': 1, 'max_limit': 8
+    },
+}
+
+def _config_value(query_class, key, default):
+    """Giá trị cấu hình, ghi đè được bằng biến môi trường NEO4J_BULKHEAD_<CLASS>_<KEY>"""
+    env_name = f"NEO4J_BULKHEAD_{query_class.upper()}_{key.upper()}"
+    return int(os.environ.get(env_name, default))
+
+class CircuitBreaker:
+    """
+    Circuit breaker CLOSED -> OPEN -> HALF_OPEN cho một loại truy vấn
+
+    Mở sau failure_threshold lỗi liên tiếp; sau open_timeout giây chuyển sang HALF_OPEN
+    để thử lại. Lỗi ở HALF_OPEN mở lại circuit với thời gian chờ gấp đôi (tối đa max_timeout).
+    """
+
+    def __init__(self, name, failure_threshold=3, open_timeout=30, max_timeout=300, reset_timeout=120):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._initial_timeout = open_timeout
+        self._open_timeout = open_timeout
+        self._max_timeout = max_timeout
+        self._reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = "CLOSED"
+        self._failure_count = 0
+        self._last_failure_time = None
+
+        # Thống kê
+        self._opened_count = 0
+        self._rejected_count = 0
+        self._total_failures = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    def is_degraded(self):
+        """Circuit đang OPEN hoặc HALF_OPEN"""
+        return self._state != "CLOSED"
+
+    def allow(self):
+        """Có cho phép thực hiện truy vấn không"""
+        with self._lock:
+            if self._state == "CLOSED":
+                return True
+
+            if self._state == "OPEN":
+                now = datetime.now()
+                elapsed = (now - self._last_failure_time).total_seconds() if self._last_failure_time else None
+                if elapsed is None or elapsed > self._open_timeout:
+                    self._state = "HALF_OPEN"
+                    log_warning(f"Circuit breaker '{self.name}' transitioning to HALF_OPEN")
+                    return True
+
+                self._rejected_count += 1
+                return False
+
+            # HALF_OPEN: cho phép truy vấn để kiểm tra
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state == "HALF_OPEN":
+                log_info(f"Circuit breaker '{self.name}' reset to CLOSED after successful operation in HALF_OPEN state")
+                self._open_timeout = self._initial_timeout
+            elif (self._state == "OPEN" and self._last_failure_time is not None and
+                  (datetime.now() - self._last_failure_time).total_seconds() > self._reset_timeout):
+                self._open_timeout = self._initial_timeout
+            elif self._state == "OPEN":
+                # Kết quả của truy vấn bắt đầu trước khi circuit mở
+                return
+
+            self._state = "CLOSED"
+            self._failure_count = 0
+            self._last_failure_time = None
+
+    def record_failure(self):
+        with self._lock:
+            self._last_failure_time = datetime.now()
+            self._failure_count += 1
+            self._total_failures += 1
+
+            if self._state == "HALF_OPEN":
+                self._state = "OPEN"
+                self._opened_count += 1
+                self._open_timeout = min(self._open_timeout * 2, self._max_timeout)
+                log_warning(f"Circuit breaker '{self.name}' opened again after failure in HALF_OPEN state "
+                            f"(timeout {self._open_timeout}s)")
+            elif self._state == "CLOSED" and self._failure_count >= self._failure_threshold:
+                self._state = "OPEN"
+                self._opened_count += 1
+                log_warning(f"Circuit breaker '{self.name}' opened after {self._failure_count} consecutive failures")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'failureCount': self._failure_count,
+                'failureThreshold': self._failure_threshold,
+                'openTimeout': self._open_timeout,
+                'openedCount': self._opened_count,
+                'rejectedCount': self._rejected_count,
+                'totalFailures': self._total_failures
+            }
+
+class Bulkhead:
+    """Circuit breaker và limiter truy vấn đồng thời của một loại truy vấn"""
+
+    def __init__(self, query_class):
+        config = BULKHEAD_CONFIG[query_class]
+        self.name = query_class
+        self.breaker = CircuitBreaker(
+            query_class,
+            failure_threshold=_config_value(query_class, 'failure_threshold', config['failure_threshold']),
+            open_timeout=_config_value(query_class, 'open_timeout', config['open_timeout'])
+        )
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=_config_value(query_class, 'initial_limit', config['initial_limit']),
+            min_limit=_config_value(query_class, 'min_limit', config['min_limit']),
+            max_limit=_config_value(query_class, 'max_limit', config['max_limit'])
+        )
+
+    def stats(self):
+        stats = {'circuitBreaker': self.breaker.stats()}
+        stats.update(self.limiter.stats())
+        return stats
+
+_bulkheads = {query_class: Bulkhead(query_class) for query_class in BULKHEAD_CONFIG}
+
+def get_bulkhead(query_class):
+    """Lấy bulkhead của một loại truy vấn (mặc định catalog)"""
+    return _bulkheads.get(query_class) or _bulkheads[CATALOG]
+
+def bulkhead_stats():
+    """Thống kê của tất cả bulkhead {loại truy vấn: stats}"""
+    return {query_class: bulkhead.stats() for query_class, bulkhead in _bulkheads.items()}
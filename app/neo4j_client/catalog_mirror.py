@@ -0,0 +1,547 @@
+"""
+Catalog mirror - bản sao trong bộ nhớ của catalog (Product, Category, Variant, ProductCommunity, store)
+Catalog nhỏ và ít thay đổi nên được tải một lần vào các cấu trúc gọn trong process; các truy vấn
+sản phẩm/biến thể/cửa hàng thường gặp được trả lời tại chỗ thay vì gửi tới Neo4j.
+Mirror tự làm mới khi probe phiên bản (một truy vấn tổng hợp: số lượng, id, quan hệ và thời điểm
+cập nhật) thay đổi và hash của chính các thuộc tính được mirror khác bản chụp hiện tại,
+hoặc ngay khi process này ghi vào các label của catalog.
+"""
+import os
+import re
+import time
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+from ..utils.logger import log_info, log_error, log_warning
+
+# Cấu hình
+_mirror_enabled = os.environ.get('NEO4J_CATALOG_MIRROR', '1').lower() in ('1', 'true', 'yes')
+_version_check_interval = int(os.environ.get('NEO4J_CATALOG_CHECK_INTERVAL', 60))  # giây
+_load_retry_interval = 30  # Thời gian chờ trước khi thử tải lại sau lỗi (giây)
+
+# Label của catalog (chữ thường, như tag của cache) - ghi vào các label này làm mirror cũ
+CATALOG_LABELS = frozenset(['product', 'variant', 'category', 'store', 'productcommunity',
+                            'belongs_to_category', 'product_id', 'contains_product'])
+
+# Thuộc tính lớn không giữ trong mirror
+_skipped_properties = frozenset(['embedding', 'embeddings', 'face_embedding'])
+
+_VARIANTS_QUERY = """
+    MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product)-[:BELONGS_TO_CATEGORY]->(c:Category)
+    RETURN p.id as product_id, p.name as product_name, p.descriptions as product_description,
+           c.id as category_id, c.name_cat as category_name, c.description as category_description,
+           v.id as variant_id, v.name as variant_name, v.`Beverage Option` as beverage_option,
+           v.price as price, v.sugars_g as sugars_g, v.caffeine_mg as caffeine_mg,
+           v.calories as calories, v.protein_g as protein_g, v.dietary_fibre_g as dietary_fibre_g,
+           v.vitamin_a as vitamin_a, v.vitamin_c as vitamin_c, v.sales_rank as sales_rank
+    """
+
+_PRODUCTS_QUERY = """
+    MATCH (p:Product)
+    OPTIONAL MATCH (p)-[:BELONGS_TO_CATEGORY]->(c:Category)
+    RETURN p {.*, embedding: null} as product, c.id as category_id
+    """
+
+_CATEGORIES_QUERY = """
+    MATCH (c:Category)
+    RETURN c.id as id, c.name_cat as name, c.description as description
+    """
+
+_STORES_QUERY = """
+    MATCH (s:store)
+    RETURN s {.*} as store
+    """
+
+_COMMUNITIES_QUERY = """
+    MATCH (pc:ProductCommunity)
+    OPTIONAL MATCH (pc)-[:CONTAINS_PRODUCT]->(p:Product)
+    WITH pc, p ORDER BY p.id
+    RETURN pc {.*, embedding: null} as community, collect(p.id) as product_ids
+    """
+
+# Probe phiên bản: một truy vấn tổng hợp rẻ, chạy mỗi chu kỳ kiểm tra thay cho toàn bộ catalog
+_VERSION_PROBE_QUERY = """
+    CALL {
+        MATCH (v:Variant)
+        OPTIONAL MATCH (v)-[:PRODUCT_ID]->(p:Product)
+        RETURN collect([v.id, p.id]) as variants,
+               sum(size(coalesce(v.name, '')) + size(coalesce(v.`Beverage Option`, ''))) as variant_text,
+               sum(toFloat(v.price)) as variant_prices, sum(toFloat(v.sales_rank)) as variant_ranks,
+               max(v.updated_at) as variant_updated
+    }
+    CALL {
+        MATCH (p:Product)
+        OPTIONAL MATCH (p)-[:BELONGS_TO_CATEGORY]->(c:Category)
+        RETURN collect([p.id, c.id]) as products,
+               sum(size(coalesce(p.name, '')) + size(coalesce(p.descriptions, ''))) as product_text,
+               max(p.updated_at) as product_updated
+    }
+    CALL {
+        MATCH (c:Category)
+        RETURN collect(c.id) as categories,
+               sum(size(coalesce(c.name_cat, '')) + size(coalesce(c.description, ''))) as category_text,
+               max(c.updated_at) as category_updated
+    }
+    CALL {
+        MATCH (s:store)
+        RETURN collect(s {.*}) as stores
+    }
+    CALL {
+        MATCH (pc:ProductCommunity)
+        OPTIONAL MATCH (pc)-[:CONTAINS_PRODUCT]->(p:Product)
+        RETURN collect([pc.id, p.id]) as communities, max(pc.updated_at) as community_updated
+    }
+    RETURN variants, variant_text, variant_prices, variant_ranks, variant_updated,
+           products, product_text, product_updated, categories, category_text, category_updated,
+           stores, communities, community_updated
+    """
+
+# Các truy vấn tạo nên mirror; phiên bản là hash kết quả của chúng (không kèm embedding)
+_CATALOG_QUERIES = (
+    ('variants', _VARIANTS_QUERY),
+    ('products', _PRODUCTS_QUERY),
+    ('categories', _CATEGORIES_QUERY),
+    ('stores', _STORES_QUERY),
+    ('communities', _COMMUNITIES_QUERY),
+)
+
+_close_time_pattern = re.compile(r'(\d{1,2}):(\d{2})')
+
+def _lower(value):
+    return str(value).lower() if value is not None else ''
+
+def _contains_any(text, terms):
+    """Giống contains_any phía Cypher: text chứa ít nhất một term (không phân biệt hoa thường)"""
+    return any(term in text for term in terms)
+
+def _compact(properties):
+    """Bỏ các thuộc tính lớn (embedding) khỏi map thuộc tính của node"""
+    return {key: value for key, value in (properties or {}).items() if key not in _skipped_properties}
+
+def _sales_rank_key(row):
+    # ORDER BY v.sales_rank ASC: null xếp cuối
+    rank = row.get('sales_rank')
+    return (rank is None, rank if rank is not None else 0)
+
+class _CatalogSnapshot:
+    """Một bản chụp catalog không đổi sau khi tạo, trừ probe (thay thế toàn bộ khi làm mới)"""
+
+    def __init__(self, variant_rows, products, categories, stores, communities, version, probe=None):
+        self.version = version
+        self.probe = probe
+        self.loaded_at = time.time()
+
+        # Mỗi biến thể là một hàng đã nối sẵn thông tin sản phẩm/danh mục, sắp theo sales_rank
+        self.variant_rows = sorted(variant_rows, key=_sales_rank_key)
+        self.products = {product.get('id'): product for product in products if product.get('id') is not None}
+        self.categories = {category['id']: category for category in categories if category.get('id') is not None}
+        self.stores = stores
+        self.communities = communities
+
+        # Chuỗi chữ thường dùng cho so khớp CONTAINS, song song với variant_rows
+        self.variant_search = [
+            (_lower(row.get('product_name')), _lower(row.get('beverage_option')), _lower(row.get('category_name')))
+            for row in self.variant_rows
+        ]
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'loadedAt': self.loaded_at,
+            'variants': len(self.variant_rows),
+            'products': len(self.products),
+            'categories': len(self.categories),
+            'stores': len(self.stores),
+            'communities': len(self.communities)
+        }
+
+_mirror_lock = threading.Lock()
+_snapshot = None
+_stale = False  # Process này đã ghi vào catalog, cần tải lại
+_generation = 0  # Tăng mỗi lần invalidate; lần tải chỉ xóa _stale nếu không có invalidate trong khi tải
+_loading = False
+_checking = False
+_last_version_check = 0.0
+_last_load_attempt = 0.0
+
+# Thống kê
+_local_answers = 0
+_fallbacks = 0
+_reload_count = 0
+_load_failures = 0
+
+def _run_query(query):
+    from .connection import execute_query_with_semaphore
+    return execute_query_with_semaphore(query, use_cache=False)
+
+def _fetch_catalog():
+    """Kết quả của các truy vấn catalog {tên: records} (None nếu lỗi hoặc không có biến thể)"""
+    catalog = {name: _run_query(query) for name, query in _CATALOG_QUERIES}
+    return catalog if catalog['variants'] else None
+
+def _catalog_version(catalog):
+    """
+    Phiên bản của catalog: hash các record được mirror
+
+    Mọi thay đổi trên dữ liệu được mirror (đổi tên, mô tả, chuyển danh mục, giờ mở cửa, ...)
+    đều đổi phiên bản. Record được sắp xếp trước khi hash vì Neo4j không đảm bảo thứ tự.
+    """
+    digest = hashlib.md5()
+    for name, _ in _CATALOG_QUERIES:
+        digest.update(name.encode())
+        for row in sorted(json.dumps(record, sort_keys=True, default=str) for record in catalog[name]):
+            digest.update(row.encode())
+            digest.update(b'\n')
+    return digest.hexdigest()[:16]
+
+def _fetch_probe():
+    """
+    Probe phiên bản catalog: hash kết quả của _VERSION_PROBE_QUERY (None nếu lỗi)
+
+    Các danh sách được sắp xếp trước khi hash vì collect() không đảm bảo thứ tự.
+    """
+    records = _run_query(_VERSION_PROBE_QUERY)
+    if not records:
+        return None
+    digest = hashlib.md5()
+    for name, value in sorted(records[0].items()):
+        if isinstance(value, list):
+            value = sorted(json.dumps(item, sort_keys=True, default=str) for item in value)
+        digest.update(name.encode())
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+        digest.update(b'\n')
+    return digest.hexdigest()[:16]
+
+def load(catalog=None, generation=None, probe=None):
+    """
+    Tải toàn bộ catalog từ Neo4j và thay thế bản chụp hiện tại
+
+    Nếu mirror bị invalidate trong khi tải, bản chụp vừa tải có thể thiếu lần ghi đó:
+    mirror vẫn được đánh dấu cũ và được tải lại ngay.
+
+    Args:
+        catalog: Kết quả của _fetch_catalog() đã có sẵn (None để truy vấn lại)
+        generation: _generation tại thời điểm catalog được truy vấn (mặc định: lúc bắt đầu tải)
+        probe: Kết quả của _fetch_probe() lấy trước catalog (None để truy vấn lại)
+
+    Returns:
+        bool: True nếu tải thành công
+    """
+    global _snapshot, _stale, _loading, _last_load_attempt, _reload_count, _load_failures
+
+    with _mirror_lock:
+        if _loading:
+            return False
+        _loading = True
+        _last_load_attempt = time.time()
+        if generation is None:
+            generation = _generation
+
+    reload = False
+    try:
+        start_time = time.time()
+        if catalog is None:
+            probe = _fetch_probe()
+            catalog = _fetch_catalog()
+        if catalog is None:
+            raise Exception("Catalog queries returned no data")
+        version = _catalog_version(catalog)
+
+        products = []
+        for record in catalog['products']:
+            product = _compact(record.get('product'))
+            product['category_id'] = record.get('category_id')
+            products.append(product)
+
+        categories = catalog['categories']
+        stores = [_compact(record.get('store')) for record in catalog['stores']]
+
+        communities = {}
+        for record in catalog['communities']:
+            community = _compact(record.get('community'))
+            if community.get('id') is None:
+                continue
+            community['product_ids'] = record.get('product_ids') or []
+            communities[community['id']] = community
+
+        snapshot = _CatalogSnapshot(catalog['variants'], products, categories, stores, communities, version, probe)
+
+        with _mirror_lock:
+            _snapshot = snapshot
+            _reload_count += 1
+            reload = _generation != generation
+            if not reload:
+                _stale = False
+
+        log_info(f"Catalog mirror loaded in {time.time() - start_time:.2f}s: {snapshot.stats()}")
+    except Exception as e:
+        with _mirror_lock:
+            _load_failures += 1
+        log_error(f"Error loading catalog mirror: {str(e)}")
+        return False
+    finally:
+        with _mirror_lock:
+            _loading = False
+
+    if reload:
+        log_info("Catalog mirror was invalidated while loading, reloading")
+        return load()
+    return True
+
+def _check_version():
+    """
+    Tải lại nếu phiên bản catalog trên Neo4j khác bản chụp hiện tại
+
+    Mỗi chu kỳ chỉ chạy probe; toàn bộ catalog chỉ được truy vấn khi probe thay đổi.
+    """
+    global _checking
+
+    try:
+        generation = _generation
+        probe = _fetch_probe()
+        current = _snapshot
+        if probe is None or (current is not None and probe == current.probe):
+            return
+        catalog = _fetch_catalog()
+        if catalog is None:
+            return
+        if current is not None and _catalog_version(catalog) == current.version:
+            # Probe đổi nhưng dữ liệu được mirror không đổi (vd. chỉ updated_at): ghi nhận probe mới
+            current.probe = probe
+            return
+        log_info("Catalog version changed, reloading catalog mirror")
+        load(catalog, generation, probe)
+    except Exception as e:
+        log_error(f"Error checking catalog version: {str(e)}")
+    finally:
+        with _mirror_lock:
+            _checking = False
+
+def _schedule(target):
+    threading.Thread(target=target, name="catalog-mirror", daemon=True).start()
+
+def schedule_refresh():
+    """Tải (lại) mirror ở background, vd. khi khởi động"""
+    if _mirror_enabled:
+        _schedule(load)
+
+def invalidate(labels: Iterable[str]):
+    """Đánh dấu mirror cũ khi process này ghi vào label của catalog, tải lại ở background"""
+    global _stale, _generation
+
+    if not _mirror_enabled:
+        return
+
+    tags = {str(label).lower() for label in labels}
+    if '*' not in tags and not tags & CATALOG_LABELS:
+        return
+
+    with _mirror_lock:
+        if _snapshot is None:
+            return
+        _stale = True
+        _generation += 1
+    _schedule(load)
+
+def is_ready() -> bool:
+    """Mirror đã tải xong và không cũ (dùng trong code async để tránh tải đồng bộ trên event loop)"""
+    return _mirror_enabled and _snapshot is not None and not _stale
+
+def get_snapshot() -> Optional[_CatalogSnapshot]:
+    """
+    Bản chụp catalog hiện tại (None nếu mirror tắt, chưa tải được hoặc đang cũ sau khi ghi)
+
+    Lần gọi đầu tiên tải mirror đồng bộ; sau đó phiên bản được kiểm tra ở background
+    mỗi NEO4J_CATALOG_CHECK_INTERVAL giây trong khi bản chụp hiện tại vẫn được dùng.
+    """
+    global _last_version_check, _checking
+
+    if not _mirror_enabled:
+        return None
+
+    snapshot = _snapshot
+    if snapshot is None:
+        if time.time() - _last_load_attempt < _load_retry_interval or not load():
+            return None
+        snapshot = _snapshot
+
+    now = time.time()
+    with _mirror_lock:
+        stale = _stale
+        check_due = not _checking and not _loading and now - _last_version_check > _version_check_interval
+        if check_due:
+            _checking = True
+            _last_version_check = now
+
+    if check_due:
+        _schedule(_check_version)
+
+    # Sau khi ghi vào catalog, trả lời từ Neo4j cho tới khi tải lại xong
+    return None if stale else snapshot
+
+def _record_answer(answered):
+    global _local_answers, _fallbacks
+
+    with _mirror_lock:
+        if answered:
+            _local_answers += 1
+        else:
+            _fallbacks += 1
+
+def _terms(values) -> List[str]:
+    return [_lower(value) for value in values or [] if value]
+
+def search_variants(product_names=None, category_names=None, limit=10) -> Optional[List[Dict[str, Any]]]:
+    """
+    Biến thể khớp tên sản phẩm/Beverage Option và danh mục, sắp theo sales_rank
+
+    Cùng ngữ nghĩa với truy vấn sản phẩm của CypherGenerator (so khớp CONTAINS không phân biệt
+    hoa thường). Trả về None nếu mirror chưa sẵn sàng (caller dùng Neo4j).
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    names = _terms(product_names)
+    categories = _terms(category_names)
+
+    rows = []
+    for row, (product_name, beverage_option, category_name) in zip(snapshot.variant_rows, snapshot.variant_search):
+        if categories and not _contains_any(category_name, categories):
+            continue
+        if names and not (_contains_any(product_name, names) or _contains_any(beverage_option, names)):
+            continue
+        rows.append(dict(row))
+        if len(rows) >= limit:
+            break
+
+    _record_answer(True)
+    return rows
+
+def variants_for_products(product_ids, limit=10) -> Optional[List[Dict[str, Any]]]:
+    """
+    Biến thể của các sản phẩm đã cho, theo thứ tự product_ids rồi theo sales_rank
+
+    Trả về None nếu mirror chưa sẵn sàng.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    order = {}
+    for product_id in product_ids:
+        order.setdefault(product_id, len(order))
+
+    # variant_rows đã sắp theo sales_rank, sort ổn định giữ thứ tự đó trong từng sản phẩm
+    rows = sorted(
+        (row for row in snapshot.variant_rows if row.get('product_id') in order),
+        key=lambda row: order[row.get('product_id')]
+    )
+    _record_answer(True)
+    return [dict(row) for row in rows[:limit]]
+
+def search_products(names, limit=10) -> Optional[List[Dict[str, Any]]]:
+    """Sản phẩm có tên chứa một trong các tên đã cho: [{'id', 'name'}] (None nếu mirror chưa sẵn sàng)"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    terms = _terms(names)
+    matches = [
+        {'id': product_id, 'name': product.get('name')}
+        for product_id, product in snapshot.products.items()
+        if terms and _contains_any(_lower(product.get('name')), terms)
+    ]
+    _record_answer(True)
+    return matches[:limit]
+
+def search_categories(names, limit=10) -> Optional[List[Dict[str, Any]]]:
+    """Danh mục có tên chứa một trong các tên đã cho: [{'id', 'name'}] (None nếu mirror chưa sẵn sàng)"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    terms = _terms(names)
+    matches = [
+        {'id': category_id, 'name': category.get('name')}
+        for category_id, category in snapshot.categories.items()
+        if terms and _contains_any(_lower(category.get('name')), terms)
+    ]
+    _record_answer(True)
+    return matches[:limit]
+
+def all_categories() -> Optional[List[Dict[str, Any]]]:
+    """Tất cả danh mục [{'id', 'name', 'description'}] (None nếu mirror chưa sẵn sàng)"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    _record_answer(True)
+    return [dict(category) for category in snapshot.categories.values()]
+
+def _close_minutes(store):
+    """Giờ đóng cửa (phút trong ngày) từ open_close dạng 'HH:MM - HH:MM'"""
+    open_close = store.get('open_close')
+    if not open_close or ' - ' not in str(open_close):
+        return None
+    close_time = str(open_close).split(' - ')[1]
+    match = _close_time_pattern.match(close_time.strip())
+    if not match:
+        return 999999
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+def list_stores(latest_closing=False) -> Optional[List[Dict[str, Any]]]:
+    """
+    Các cửa hàng theo dạng kết quả của `MATCH (s:store) RETURN s` ([{'s': thuộc tính}])
+
+    latest_closing=True chỉ trả về các cửa hàng đóng cửa muộn nhất. None nếu mirror chưa sẵn sàng.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    stores = snapshot.stores
+    if latest_closing:
+        closing = [(store, _close_minutes(store)) for store in stores]
+        closing = [(store, minutes) for store, minutes in closing if minutes is not None]
+        latest = max((minutes for _, minutes in closing), default=None)
+        stores = [store for store, minutes in closing if minutes == latest]
+
+    _record_answer(True)
+    return [{'s': dict(store)} for store in stores]
+
+def product_communities() -> Optional[Dict[Any, Dict[str, Any]]]:
+    """ProductCommunity theo id, kèm product_ids (None nếu mirror chưa sẵn sàng)"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        _record_answer(False)
+        return None
+
+    _record_answer(True)
+    return {community_id: dict(community) for community_id, community in snapshot.communities.items()}
+
+def mirror_stats() -> Dict[str, Any]:
+    """Thống kê của catalog mirror"""
+    with _mirror_lock:
+        stats = {
+            'enabled': _mirror_enabled,
+            'loaded': _snapshot is not None,
+            'stale': _stale,
+            'localAnswers': _local_answers,
+            'fallbacks': _fallbacks,
+            'reloads': _reload_count,
+            'loadFailures': _load_failures,
+            'versionCheckInterval': _version_check_interval
+        }
+        snapshot = _snapshot
+
+    if snapshot is not None:
+        stats.update(snapshot.stats())
+    return stats
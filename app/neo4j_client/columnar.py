@@ -0,0 +1,82 @@
+"""
+Columnar results - chuyển kết quả Cypher thành mảng theo cột
+Mỗi cột số (price, sugars_g, caffeine_mg, calories, ...) thành một mảng NumPy float/int,
+các cột khác (id, tên, ...) thành mảng object, để lọc và gom nhóm bằng phép toán vector
+"""
+import json
+from numbers import Number
+from typing import Dict, List, Sequence
+import numpy as np
+
+def _column_array(values: Sequence) -> np.ndarray:
+    """Tạo mảng cho một cột: int64/float64 nếu toàn bộ giá trị là số, ngược lại object"""
+    is_numeric = True
+    has_value = False
+    has_missing = False
+    has_float = False
+
+    for value in values:
+        if value is None:
+            has_missing = True
+        elif isinstance(value, bool) or not isinstance(value, Number):
+            is_numeric = False
+            break
+        else:
+            has_value = True
+            if not isinstance(value, int):
+                has_float = True
+
+    if is_numeric and has_value:
+        if has_missing or has_float:
+            # Giá trị thiếu thành NaN
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            return np.array(values, dtype=np.float64)
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+def to_columns(keys: List[str], rows: List[Sequence]) -> Dict[str, np.ndarray]:
+    """
+    Chuyển các hàng (theo thứ tự keys) thành dict {tên cột: mảng}
+
+    Args:
+        keys: Tên các cột của kết quả (result.keys())
+        rows: Danh sách hàng, mỗi hàng là dãy giá trị theo thứ tự keys
+
+    Returns:
+        Dict[str, np.ndarray]: Các mảng có cùng độ dài
+    """
+    if not rows:
+        return {key: np.empty(0, dtype=object) for key in keys}
+
+    columns = list(zip(*rows))
+    return {key: _column_array(column) for key, column in zip(keys, columns)}
+
+def column_count(columns: Dict[str, np.ndarray]) -> int:
+    """Số hàng của kết quả dạng cột"""
+    for array in columns.values():
+        return len(array)
+    return 0
+
+def columns_nbytes(columns: Dict[str, np.ndarray]) -> int:
+    """Ước tính dung lượng (byte) của kết quả dạng cột"""
+    total = 0
+    for array in columns.values():
+        if array.dtype == object:
+            total += len(json.dumps(array.tolist(), default=str))
+        else:
+            total += array.nbytes
+    return total
+
+def is_columnar(data) -> bool:
+    """Dữ liệu có phải kết quả dạng cột (dict các mảng NumPy) không"""
+    return isinstance(data, dict) and bool(data) and all(isinstance(value, np.ndarray) for value in data.values())
+
+def to_dataframe(columns: Dict[str, np.ndarray]):
+    """Chuyển kết quả dạng cột thành pandas.DataFrame (không sao chép các cột số)"""
+    import pandas as pd
+    return pd.DataFrame(columns, copy=False)
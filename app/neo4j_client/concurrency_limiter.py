@@ -0,0 +1,224 @@
+"""
+Adaptive concurrency limiter cho truy vấn Neo4j
+Điều chỉnh số truy vấn đồng thời theo AIMD dựa trên độ trễ và tỷ lệ lỗi quan sát được:
+tăng dần khi Neo4j khỏe, giảm nhanh khi độ trễ tăng vọt hoặc có lỗi
+"""
+import time
+import asyncio
+import threading
+from collections import deque, OrderedDict
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Giới hạn số truy vấn đồng thời với limit tự điều chỉnh (AIMD)
+
+    - Độ trễ được so với độ trễ nền của chính loại truy vấn đó (fingerprint, mặc định là
+      câu truy vấn): một truy vấn 400ms bình thường không bị coi là quá tải chỉ vì
+      các truy vấn khác chạy 5ms.
+    - Additive increase: mỗi truy vấn thành công làm limit tăng 1/limit (khoảng +1 sau
+      mỗi "vòng" limit truy vấn) khi limit đang được dùng gần hết hoặc có truy vấn đang
+      chờ, hoặc khi limit còn thấp hơn initial_limit (hồi phục sau khi đã giảm).
+    - Multiplicative decrease: khi có lỗi hoặc tỷ lệ độ trễ / độ trễ nền trung bình vượt
+      quá latency_tolerance (và độ trễ trung bình vượt min_latency_threshold), limit
+      nhân với decrease_factor, tối đa một lần mỗi decrease_cooldown giây.
+
+    Dùng chung được cho cả thread (acquire) và coroutine (acquire_async).
+    """
+
+    def __init__(self, initial_limit=20, min_limit=2, max_limit=200,
+                 latency_tolerance=2.0, min_latency_threshold=0.1,
+                 decrease_factor=0.7, decrease_cooldown=1.0, ewma_alpha=0.2,
+                 max_fingerprints=512):
+        self._limit = float(initial_limit)
+        self._initial_limit = float(initial_limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._latency_tolerance = latency_tolerance
+        self._min_latency_threshold = min_latency_threshold
+        self._decrease_factor = decrease_factor
+        self._decrease_cooldown = decrease_cooldown
+        self._ewma_alpha = ewma_alpha
+        self._max_fingerprints = max_fingerprints
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters = deque()  # (loop, future) của các coroutine đang chờ
+
+        self._inflight = 0
+        self._waiting = 0
+        self._latency_ewma = None
+        self._gradient_ewma = None  # Trung bình của độ trễ / độ trễ nền của fingerprint
+        self._baselines = OrderedDict()  # fingerprint -> độ trễ nền (LRU, tối đa max_fingerprints)
+        self._last_decrease = 0.0
+
+        # Thống kê
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._decreases = 0
+
+    @property
+    def limit(self):
+        return max(self._min_limit, int(self._limit))
+
+    def _try_acquire(self):
+        """Lấy một slot nếu còn (gọi khi đã giữ _lock)"""
+        if self._inflight < self.limit:
+            self._inflight += 1
+            return True
+        return False
+
+    def acquire(self, timeout=None):
+        """
+        Chờ lấy một slot (blocking)
+
+        Returns:
+            bool: True nếu lấy được, False nếu hết thời gian chờ (bị từ chối)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            if self._try_acquire():
+                return True
+
+            self._waiting += 1
+            try:
+                while True:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._rejected += 1
+                        return False
+                    self._condition.wait(remaining)
+                    if self._try_acquire():
+                        return True
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self, timeout=None):
+        """
+        Chờ lấy một slot mà không block event loop
+
+        Returns:
+            bool: True nếu lấy được, False nếu hết thời gian chờ (bị từ chối)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return True
+                future = loop.create_future()
+                waiter = (loop, future)
+                self._async_waiters.append(waiter)
+                self._waiting += 1
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._rejected += 1
+                return False
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+                    try:
+                        self._async_waiters.remove(waiter)
+                    except ValueError:
+                        pass
+
+    def release(self, latency=None, failed=False, fingerprint=None):
+        """
+        Trả slot và cập nhật limit theo kết quả của truy vấn
+
+        Args:
+            latency: Thời gian thực thi truy vấn (giây), None nếu không đo
+            failed: Truy vấn lỗi (lỗi kết nối, timeout, ...)
+            fingerprint: Khóa của loại truy vấn (thường là câu truy vấn) để so độ trễ
+                với độ trễ nền của đúng loại đó
+        """
+        with self._condition:
+            saturated = self._inflight >= self.limit * 0.8 or self._waiting > 0
+            self._inflight = max(0, self._inflight - 1)
+            self._completed += 1
+
+            if failed:
+                self._failed += 1
+                self._decrease()
+            elif latency is not None:
+                self._observe_latency(latency, saturated, fingerprint)
+
+            self._wake_waiters()
+
+    def _observe_latency(self, latency, saturated, fingerprint=None):
+        """Cập nhật độ trễ và điều chỉnh limit (gọi khi đã giữ _lock)"""
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma += self._ewma_alpha * (latency - self._latency_ewma)
+
+        # Độ trễ nền của fingerprint: giá trị nhỏ nhất gần đây, tăng chậm để theo kịp khi dữ liệu lớn dần
+        baseline = self._baselines.get(fingerprint)
+        if baseline is None or latency < baseline:
+            baseline = latency
+        else:
+            baseline *= 1.001
+        self._baselines[fingerprint] = baseline
+        self._baselines.move_to_end(fingerprint)
+        if len(self._baselines) > self._max_fingerprints:
+            self._baselines.popitem(last=False)
+
+        gradient = latency / baseline if baseline > 0 else 1.0
+        if self._gradient_ewma is None:
+            self._gradient_ewma = gradient
+        else:
+            self._gradient_ewma += self._ewma_alpha * (gradient - self._gradient_ewma)
+
+        overloaded = (self._gradient_ewma > self._latency_tolerance and
+                      self._latency_ewma > self._min_latency_threshold)
+        if overloaded:
+            self._decrease()
+        elif (saturated or self._limit < self._initial_limit) and self._limit < self._max_limit:
+            self._limit = min(self._max_limit, self._limit + 1.0 / max(self._limit, 1.0))
+
+    def _decrease(self):
+        """Giảm limit theo cấp số nhân (gọi khi đã giữ _lock)"""
+        now = time.monotonic()
+        if now - self._last_decrease < self._decrease_cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self._min_limit), self._limit * self._decrease_factor)
+        self._decreases += 1
+
+    def _wake_waiters(self):
+        """Đánh thức các thread/coroutine đang chờ nếu còn slot (gọi khi đã giữ _lock)"""
+        available = self.limit - self._inflight
+        if available <= 0:
+            return
+
+        self._condition.notify(available)
+        for loop, future in list(self._async_waiters)[:available]:
+            loop.call_soon_threadsafe(_resolve_waiter, future)
+
+    def stats(self):
+        """Lấy thống kê của limiter"""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'inflight': self._inflight,
+                'queueDepth': self._waiting,
+                'rejected': self._rejected,
+                'completed': self._completed,
+                'failed': self._failed,
+                'limitDecreases': self._decreases,
+                'latencyEwmaMs': round(self._latency_ewma * 1000, 2) if self._latency_ewma is not None else None,
+                'latencyGradient': round(self._gradient_ewma, 3) if self._gradient_ewma is not None else None,
+                'trackedFingerprints': len(self._baselines)
+            }
+
+def _resolve_waiter(future):
+    if not future.done():
+        future.set_result(True)
@@ -5,17 +5,31 @@ Thêm cơ chế semaphore, caching và tối ưu hóa connection pool
 Tối ưu để tránh trường hợp nhiều yêu cầu kết nối đồng thời gây lỗi
 """
 import os
+import re
 import time
 import random
 import threading
 import functools
 import hashlib
 import json
+import asyncio
+import contextvars
+import concurrent.futures
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple, Callable
-from neo4j import GraphDatabase, exceptions
+from typing import Dict, List, Optional, Any, Tuple, Callable, Iterator
+from neo4j import GraphDatabase, AsyncGraphDatabase, exceptions
 from flask import current_app
 from ..utils.logger import log_info, log_error, log_warning
+from . import disk_cache
+from .bulkheads import get_bulkhead, bulkhead_stats, CATALOG, CUSTOMER, WRITE, ANALYTICS
+from .batch_loader import BatchLoader, loader_stats
+from .columnar import to_columns, columns_nbytes, column_count, is_columnar
+from .query_stats import record_query
+from . import profiler
+from .cost_guard import cost_guard_stats
+from . import routing
+from . import catalog_mirror
 
 # Global driver instance with lock for thread safety
 _driver = None
@@ -27,6 +41,15 @@ _initialization_in_progress = False  # Biến theo dõi quá trình khởi tạo
 _initialization_time = None  # Thời điểm khởi tạo kết nối
 _initialization_lock = threading.Lock()  # Lock cho quá trình khởi tạo
 
+# Async driver cho các agent chạy trên event loop (không block event loop khi truy vấn).
+# Driver gắn với event loop tạo ra nó; route gọi asyncio.run() mỗi request nên driver sống trên một
+# event loop riêng ở thread nền, các event loop khác gửi truy vấn sang đó (một connection pool chung)
+_async_driver = None
+_async_driver_loop = None  # Event loop mà async driver đang gắn vào
+_async_driver_lock = threading.Lock()
+_async_io_loop = None  # Event loop nền chạy mọi truy vấn async
+_driver_override = False  # Driver được cung cấp qua use_driver (vd. stand-in ghi nhận định tuyến)
+
 # Connection pool configuration
 _max_connection_pool_size = 50  # Tăng số lượng kết nối tối đa để xử lý nhiều request đồng thời
 _connection_acquisition_timeout = 60  # Tăng thời gian chờ để tránh timeout
@@ -38,14 +61,12 @@ _connection_max_lifetime = 3600  # Thời gian sống tối đa của kết nố
 _connection_warmup_count = 5  # Tăng số lượng kết nối khởi tạo sẵn khi startup
 _max_initialization_wait_time = 60  # Tăng thời gian tối đa chờ khởi tạo (giây)
 
-# Semaphore để giới hạn số lượng truy vấn đồng thời
-_max_concurrent_queries = 20  # Tăng số lượng truy vấn đồng thời
-_query_semaphore = threading.Semaphore(_max_concurrent_queries)
+# Số truy vấn đồng thời được giới hạn bởi limiter AIMD của từng bulkhead (xem bulkheads.py)
 _query_timeout = 30  # Tăng thời gian chờ tối đa để lấy semaphore (giây)
 
 # Circuit breaker configuration - tăng cường
 _circuit_breaker_enabled = True
-_circuit_breaker_threshold = 1  # Giảm ngưỡng để phát hiện lỗi sớm hơn
+_circuit_breaker_threshold = 3  # Số lỗi kết nối liên tiếp trước khi mở circuit (lỗi truy vấn tính theo bulkhead)
 _circuit_breaker_timeout = 60  # Tăng thời gian chờ để tránh mở lại circuit quá sớm
 _circuit_breaker_state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
 _circuit_breaker_failure_count = 0
@@ -60,15 +81,91 @@ _last_health_check = None
 _health_check_interval = 15  # Kiểm tra sức khỏe kết nối thường xuyên hơn
 _health_check_timeout = 5  # Thời gian timeout cho health check (giây)
 
-# Simple cache configuration
-_cache = {}  # {cache_key: (timestamp, data)}
+# Danh sách lỗi kết nối cần xử lý đặc biệt
+_connection_error_patterns = [
+    "defunct connection",
+    "connection reset",
+    "connection refused",
+    "connection timed out",
+    "connection has been closed",
+    "socket closed",
+    "failed to read",
+    "broken pipe",
+    "existing exports of data",
+    "address already in use",
+    "too many open files",
+    "database unavailable",
+    "service unavailable",
+    "timeout during discovery",
+    "connection acquisition timed out"
+]
+
+# LRU cache configuration - giới hạn theo dung lượng (byte) thay vì số lượng mục
+_cache = OrderedDict()  # {cache_key: _CacheEntry}, cuối = mới được dùng nhất
 _cache_lock = threading.Lock()
 _cache_stats_lock = threading.Lock()  # Lock riêng cho việc cập nhật thống kê cache
 _cache_ttl = 300  # Tăng thời gian sống của cache (giây)
 _cache_enabled = True
-_cache_size_limit = 500  # Tăng giới hạn số lượng mục trong cache
-_cache_hit_count = 0  # Số lần cache hit
-_cache_miss_count = 0  # Số lần cache miss
+_cache_size_limit = 5000  # Giới hạn phụ số lượng mục (tránh quá nhiều mục rất nhỏ)
+_cache_max_bytes = int(os.environ.get('NEO4J_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # Ngân sách bộ nhớ cho cache
+_cache_bytes = 0  # Tổng dung lượng ước tính của các mục trong cache
+_cache_evictions = 0  # Số mục bị loại khỏi cache do vượt ngân sách
+_cache_hits = 0  # Số lần cache hit
+_cache_misses = 0  # Số lần cache miss
+
+# Stale-while-revalidate cho dữ liệu catalog (Product/Variant/Category/Store ít thay đổi)
+_cache_stale_ttl = int(os.environ.get('NEO4J_CACHE_STALE_TTL', 3600))  # Thời gian tối đa phục vụ dữ liệu cũ sau TTL (giây)
+_catalog_label_pattern = re.compile(r':\s*`?(product|variant|category|store)\b', re.IGNORECASE)
+_write_clause_pattern = re.compile(r'\b(CREATE|MERGE|SET|DELETE|REMOVE|DETACH)\b', re.IGNORECASE)
+_auto_commit_pattern = re.compile(r'\bIN\s+TRANSACTIONS\b|\bPERIODIC\s+COMMIT\b', re.IGNORECASE)  # Không chạy được trong managed transaction
+# Phân loại truy vấn cho bulkhead: gom nhóm/thống kê, thuộc tính động, lệnh quản trị
+_analytics_pattern = re.compile(
+    r'\b(count|avg|sum|stdev|stdevp|percentileCont|percentileDisc)\s*\(|\w\[\$\w+\]|^\s*(SHOW|CALL\s+dbms\.)',
+    re.IGNORECASE | re.MULTILINE
+)
+_customer_tags = frozenset(['customer', 'order', 'order_detail'])
+_refresh_executor = None  # ThreadPoolExecutor làm mới cache ở background, tạo lazy
+_refresh_max_workers = 2
+_refresh_lock = threading.Lock()
+_refreshing_keys = set()  # Các cache key đang được làm mới (tránh làm mới trùng lặp)
+_fanout_executor = None  # ThreadPoolExecutor chạy song song các truy vấn đọc độc lập, tạo lazy
+_fanout_max_workers = _max_session_pool_size  # Không vượt quá số session trong pool
+_stale_served_count = 0  # Số lần trả về dữ liệu cũ
+_background_refresh_count = 0  # Số lần làm mới cache ở background
+
+# Gắn tag (label/relationship type) cho mục cache để invalidate có chọn lọc sau khi ghi
+_tag_index = {}  # {tag (chữ thường): set(cache_key)}
+_wildcard_tag = '*'  # Tag cho truy vấn không xác định được label (bị invalidate bởi mọi lần ghi)
+_string_literal_pattern = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_node_pattern = re.compile(r'\(\s*(\w*)\s*((?::\s*`?\w+`?\s*)+)')
+_relationship_pattern = re.compile(r'\[\s*(\w*)\s*:\s*((?:`?\w+`?\s*\|?\s*:?\s*)+)')
+_clause_split_pattern = re.compile(
+    r'\b(OPTIONAL\s+MATCH|MATCH|CREATE|MERGE|DETACH\s+DELETE|DELETE|SET|REMOVE|WITH|RETURN|UNWIND|WHERE|CALL|FOREACH)\b',
+    re.IGNORECASE
+)
+_invalidation_count = 0  # Số mục cache bị invalidate do ghi dữ liệu
+
+# Single-flight: gộp các truy vấn giống hệt nhau (cùng cache key) đang chạy đồng thời
+_inflight_queries = {}  # {cache_key: concurrent.futures.Future}
+_inflight_lock = threading.Lock()
+_coalesced_query_count = 0  # Số lần caller dùng chung kết quả của truy vấn đang chạy
+
+# Thống kê tái sử dụng plan cache phía server: câu truy vấn giống hệt nhau dùng lại plan đã biên dịch
+_plan_cache_lock = threading.Lock()
+_plan_cache_texts = OrderedDict()  # LRU hash của các câu truy vấn đã gửi tới Neo4j, cuối = mới dùng nhất
+_plan_cache_max_texts = 10000  # Giới hạn số câu truy vấn được theo dõi (loại câu ít dùng nhất)
+_plan_cache_executions = 0
+_plan_cache_distinct = 0
+
+# Ghi hàng loạt bằng UNWIND: kích thước lô mặc định và thống kê theo lô
+_write_batch_size = int(os.environ.get('NEO4J_WRITE_BATCH_SIZE', 1000))
+_write_batch_lock = threading.Lock()
+_write_batch_count = 0
+_write_batch_rows = 0
+_write_batch_failures = 0
+_write_batch_retries = 0
+_write_batch_total_time = 0.0
+_write_batch_max_time = 0.0
 
 # Connection reuse configuration
 _reuse_connection = True  # Tái sử dụng kết nối thay vì đóng và mở lại
@@ -120,8 +217,8 @@ def get_neo4j_connection_params():
         # Không chỉ định database để sử dụng database mặc định
     }
 
-def check_circuit_breaker():
-    """Kiểm tra trạng thái circuit breaker"""
+def _check_connection_breaker():
+    """Kiểm tra trạng thái circuit breaker kết nối (dùng chung cho mọi loại truy vấn)"""
     global _circuit_breaker_state, _circuit_breaker_last_failure_time, _circuit_breaker_last_reset_time
 
     if not _circuit_breaker_enabled:
@@ -172,8 +269,8 @@ def check_circuit_breaker():
         # Nếu circuit đang ở trạng thái half-open, cho phép thực hiện truy vấn để kiểm tra
         return True
 
-def record_success():
-    """Ghi nhận thành công và reset circuit breaker nếu cần"""
+def _record_connection_success():
+    """Ghi nhận thành công và reset circuit breaker kết nối nếu cần"""
     global _circuit_breaker_state, _circuit_breaker_failure_count, _circuit_breaker_last_failure_time, _circuit_breaker_last_reset_time, _circuit_breaker_timeout
 
     if not _circuit_breaker_enabled:
@@ -214,8 +311,8 @@ def record_success():
             # Reset thời gian timeout về giá trị ban đầu
             _circuit_breaker_timeout = 60
 
-def record_failure():
-    """Ghi nhận lỗi và cập nhật circuit breaker nếu cần"""
+def _record_connection_failure():
+    """Ghi nhận lỗi kết nối và cập nhật circuit breaker kết nối nếu cần"""
     global _circuit_breaker_state, _circuit_breaker_failure_count, _circuit_breaker_last_failure_time, _circuit_breaker_last_reset_time
 
     if not _circuit_breaker_enabled:
@@ -241,9 +338,8 @@ def record_failure():
             _circuit_breaker_timeout = min(_circuit_breaker_timeout * 2, 300)  # Tối đa 5 phút
             log_warning(f"Circuit breaker timeout increased to {_circuit_breaker_timeout} seconds")
 
-            # Xóa cache khi circuit breaker mở
-            clear_cache()
-            log_warning("Cache cleared due to circuit breaker opening")
+            # Giữ nguyên cache để phục vụ dữ liệu cũ trong khi circuit mở
+            log_warning("Serving stale cache data while circuit breaker is open")
 
         elif _circuit_breaker_state == "CLOSED":
             # Nếu vượt quá ngưỡng, mở circuit
@@ -251,14 +347,94 @@ def record_failure():
                 _circuit_breaker_state = "OPEN"
                 log_warning(f"Circuit breaker opened after {_circuit_breaker_failure_count} consecutive failures")
 
-                # Xóa cache khi circuit breaker mở
-                clear_cache()
-                log_warning("Cache cleared due to circuit breaker opening")
+                # Giữ nguyên cache để phục vụ dữ liệu cũ trong khi circuit mở
+                log_warning("Serving stale cache data while circuit breaker is open")
+
+def check_circuit_breaker(query_class=None):
+    """
+    Kiểm tra circuit breaker kết nối và (nếu có query_class) circuit breaker của loại truy vấn
+
+    Lỗi của một loại truy vấn chỉ mở circuit của loại đó; circuit kết nối chỉ mở khi
+    có lỗi kết nối thực sự (không lấy được driver/session, connection reset, ...).
+    """
+    if not _check_connection_breaker():
+        return False
+
+    if query_class is None or not _circuit_breaker_enabled:
+        return True
+
+    if not get_bulkhead(query_class).breaker.allow():
+        log_warning(f"Circuit breaker for '{query_class}' queries is OPEN")
+        return False
+    return True
+
+def record_success(query_class=None):
+    """Ghi nhận thành công cho circuit breaker kết nối và của loại truy vấn"""
+    if not _circuit_breaker_enabled:
+        return
+
+    _record_connection_success()
+    if query_class is not None:
+        get_bulkhead(query_class).breaker.record_success()
+
+def record_failure(query_class=None, connection_error=True):
+    """
+    Ghi nhận lỗi cho circuit breaker
+
+    Args:
+        query_class: Loại truy vấn bị lỗi (None nếu lỗi không gắn với truy vấn nào)
+        connection_error: Lỗi kết nối - ghi nhận cả cho circuit breaker kết nối
+    """
+    if not _circuit_breaker_enabled:
+        return
+
+    if connection_error or query_class is None:
+        _record_connection_failure()
+    if query_class is not None:
+        get_bulkhead(query_class).breaker.record_failure()
+
+def is_circuit_degraded(query_class=None):
+    """Circuit breaker (kết nối hoặc của loại truy vấn) đang OPEN/HALF_OPEN - ưu tiên phục vụ dữ liệu cũ"""
+    if not _circuit_breaker_enabled:
+        return False
+    if _circuit_breaker_state != "CLOSED":
+        return True
+    return query_class is not None and get_bulkhead(query_class).breaker.is_degraded()
+
+def _is_connection_error(error_message):
+    """Lỗi có phải lỗi kết nối (ảnh hưởng mọi loại truy vấn) không"""
+    error_message = error_message.lower()
+    return any(err in error_message for err in _connection_error_patterns)
+
+def classify_query(query):
+    """
+    Phân loại truy vấn để chọn bulkhead
+
+    - write: có mệnh đề ghi
+    - analytics: gom nhóm/thống kê, thuộc tính động (v[$attribute]), lệnh quản trị
+    - customer: đọc dữ liệu khách hàng/đơn hàng
+    - catalog: còn lại (sản phẩm, biến thể, danh mục, cửa hàng)
+    """
+    if is_write_query(query):
+        return WRITE
+
+    text = _strip_string_literals(query)
+    if _analytics_pattern.search(text):
+        return ANALYTICS
+
+    if extract_query_tags(query) & _customer_tags:
+        return CUSTOMER
+
+    return CATALOG
 
 def health_check():
     """Kiểm tra sức khỏe kết nối Neo4j"""
     global _last_health_check, _driver
 
+    # Driver do use_driver cung cấp không được kiểm tra/khởi tạo lại
+    if _driver_override:
+        return True
+
     # Chỉ kiểm tra theo định kỳ
     current_time = datetime.now()
     if (_last_health_check is not None and
@@ -378,6 +554,16 @@ def init_neo4j_connection():
                 # Đánh dấu đã khởi tạo thành công
                 _driver_initialized = True
 
+                # Tạo các index cần thiết nếu chưa có (chỉ một lần mỗi process)
+                try:
+                    from .index_bootstrap import ensure_indexes
+                    ensure_indexes(_driver)
+                except Exception as e:
+                    log_error(f"Error bootstrapping Neo4j indexes: {str(e)}")
+
+                # Tải catalog mirror ở background để các truy vấn catalog được trả lời tại chỗ
+                catalog_mirror.schedule_refresh()
+
                 log_info(f"Connected to Neo4j at {uri} with optimized connection pooling (max pool size: {_max_connection_pool_size})")
                 return True
             except Exception as e:
@@ -455,6 +641,27 @@ def get_neo4j_driver():
 
     return _driver
 
+def use_driver(driver=None, async_driver=None):
+    """
+    Dùng driver được cung cấp thay cho driver tạo từ cấu hình (None để quay lại bình thường)
+
+    Driver chỉ cần có session(**kwargs) như neo4j.Driver, vd. một stand-in cục bộ ghi nhận
+    access mode và bookmark của từng session để kiểm tra định tuyến đọc/ghi.
+    Driver được cung cấp không bị health check, khởi tạo lại hay đóng bởi module này.
+    """
+    global _driver, _async_driver, _async_driver_loop, _driver_override, _driver_initialized
+
+    with _driver_lock:
+        _driver_override = driver is not None or async_driver is not None
+        _driver = driver
+        _driver_initialized = driver is not None
+    with _async_driver_lock:
+        _async_driver = async_driver
+        _async_driver_loop = None
+
+    if _driver_override:
+        log_info("Using externally provided Neo4j driver")
+
 def close_neo4j_connection():
     """Close Neo4j connection safely with session pool cleanup"""
     global _driver, _session_pool
@@ -471,7 +678,7 @@ def close_neo4j_connection():
 
     # Đóng driver
     with _driver_lock:
-        if _driver is not None:
+        if _driver is not None and not _driver_override:
             try:
                 _driver.close()
                 log_info("Neo4j connection closed")
@@ -480,6 +687,10 @@ def close_neo4j_connection():
             finally:
                 _driver = None
 
+    _shutdown_refresh_executor()
+    _shutdown_fanout_executor()
+    disk_cache.close()
+
 def get_session_from_pool():
     """Lấy session từ pool hoặc tạo mới nếu cần"""
     global _session_pool
@@ -530,10 +741,57 @@ def generate_cache_key(query, params=None):
     key = hashlib.md5((query + normalized_params).encode()).hexdigest()
     return key
 
-# Thêm biến để theo dõi cache hits/misses
-_cache_hits = 0
-_cache_misses = 0
-_cache_stats_lock = threading.Lock()
+class _CacheEntry:
+    """Một mục trong LRU cache kèm dung lượng ước tính và TTL riêng"""
+    __slots__ = ('timestamp', 'data', 'size', 'ttl', 'stale_ttl', 'tags')
+
+    def __init__(self, data, size, ttl, stale_ttl=0, tags=None, created=None):
+        self.timestamp = created if created is not None else time.time()
+        self.data = data
+        self.size = size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl  # > 0: được phục vụ cũ (stale-while-revalidate) sau khi hết TTL
+        self.tags = tags or frozenset([_wildcard_tag])  # Label/relationship type mà truy vấn đọc
+
+    def age(self):
+        return time.time() - self.timestamp
+
+    def max_stale_age(self):
+        """Tuổi tối đa còn được phục vụ dữ liệu cũ (khi quá tải/lỗi hoặc stale-while-revalidate)"""
+        return max(self.ttl * 2, self.ttl + self.stale_ttl)
+
+    def is_expired(self):
+        """Đã hết TTL và hết cả thời gian được phục vụ dữ liệu cũ"""
+        return self.age() > self.max_stale_age()
+
+def _estimate_result_size(data):
+    """Ước tính dung lượng (byte) của kết quả truy vấn khi lưu vào cache"""
+    if is_columnar(data):
+        return columns_nbytes(data)
+    try:
+        return len(json.dumps(data, default=str))
+    except Exception:
+        # Kích thước thô nếu không serialize được
+        return 1024 * max(1, len(data) if hasattr(data, '__len__') else 1)
+
+def _remove_cache_entry(key):
+    """Xóa một mục khỏi cache và cập nhật dung lượng (gọi khi đã giữ _cache_lock)"""
+    global _cache_bytes
+
+    entry = _cache.pop(key, None)
+    if entry is not None:
+        _cache_bytes -= entry.size
+        _unindex_cache_entry(key, entry)
+    return entry
+
+def _unindex_cache_entry(key, entry):
+    """Gỡ cache key khỏi tag index (gọi khi đã giữ _cache_lock)"""
+    for tag in entry.tags:
+        keys = _tag_index.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _tag_index[tag]
 
 def get_from_cache(key):
     """Lấy dữ liệu từ cache nếu còn hiệu lực"""
@@ -545,90 +803,508 @@ def get_from_cache(key):
         return None
 
     with _cache_lock:
-        if key not in _cache:
+        entry = _cache.get(key)
+        if entry is None:
             with _cache_stats_lock:
                 _cache_misses += 1
             return None
 
-        timestamp, data = _cache[key]
-        # Kiểm tra xem cache có còn hiệu lực không
-        if (datetime.now() - timestamp).total_seconds() > _cache_ttl:
-            # Cache đã hết hạn, xóa khỏi cache
-            del _cache[key]
+        # Kiểm tra xem cache có còn hiệu lực không (theo TTL riêng của mục)
+        if entry.age() > entry.ttl:
+            # Mục hết TTL vẫn được giữ lại một thời gian để phục vụ dữ liệu cũ khi lỗi
+            if entry.is_expired():
+                _remove_cache_entry(key)
             with _cache_stats_lock:
                 _cache_misses += 1
             return None
 
-        # Cache hit
+        # Cache hit - đánh dấu mới được dùng (O(1))
+        _cache.move_to_end(key)
         with _cache_stats_lock:
             _cache_hits += 1
-        return data
+        return entry.data
+
+def get_from_cache_swr(key):
+    """
+    Lấy dữ liệu từ cache theo chính sách stale-while-revalidate
+
+    Returns:
+        Tuple (data, is_stale): data là None nếu không có trong cache; is_stale = True
+        khi mục đã hết TTL nhưng vẫn trong thời gian được phục vụ dữ liệu cũ
+    """
+    global _cache_hits, _cache_misses
 
-def store_in_cache(key, data):
-    """Lưu dữ liệu vào cache"""
     if not _cache_enabled or key is None:
+        return None, False
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry.is_expired():
+            _remove_cache_entry(key)
+            entry = None
+
+        if entry is None:
+            with _cache_stats_lock:
+                _cache_misses += 1
+            return None, False
+
+        # Mục không hỗ trợ stale-while-revalidate và đã hết TTL
+        is_stale = entry.age() > entry.ttl
+        if is_stale and entry.stale_ttl <= 0:
+            with _cache_stats_lock:
+                _cache_misses += 1
+            return None, False
+
+        _cache.move_to_end(key)
+        with _cache_stats_lock:
+            _cache_hits += 1
+        return entry.data, is_stale
+
+def store_in_cache(key, data, ttl=None, stale_ttl=0, tags=None, created=None, persist=True):
+    """
+    Lưu dữ liệu vào cache
+
+    Args:
+        key: Cache key
+        data: Kết quả truy vấn
+        ttl: TTL riêng cho mục này (giây), mặc định dùng _cache_ttl
+        stale_ttl: Thời gian được phục vụ dữ liệu cũ sau khi hết TTL (giây), 0 = không dùng
+        tags: Label/relationship type (chữ thường) mà truy vấn đọc, dùng cho invalidate_labels
+        created: Thời điểm tạo kết quả (mặc định là hiện tại), dùng khi nạp lại từ cache đĩa
+        persist: Ghi xuống cache đĩa (nếu được bật)
+    """
+    global _cache_bytes, _cache_evictions
+
+    if not _cache_enabled or key is None:
+        return
+
+    size = _estimate_result_size(data)
+    if size > _cache_max_bytes:
+        log_warning(f"Result too large to cache ({size} bytes > {_cache_max_bytes} bytes)")
         return
 
+    entry = _CacheEntry(data, size, ttl if ttl is not None else _cache_ttl, stale_ttl, tags, created)
+
+    with _cache_lock:
+        _remove_cache_entry(key)
+        _cache[key] = entry
+        _cache_bytes += size
+        for tag in entry.tags:
+            _tag_index.setdefault(tag, set()).add(key)
+
+        # Loại các mục ít được dùng nhất cho đến khi nằm trong ngân sách
+        evicted = 0
+        while _cache and (_cache_bytes > _cache_max_bytes or len(_cache) > _cache_size_limit):
+            oldest_key, oldest = _cache.popitem(last=False)
+            _cache_bytes -= oldest.size
+            _unindex_cache_entry(oldest_key, oldest)
+            evicted += 1
+
+    if evicted:
+        with _cache_stats_lock:
+            _cache_evictions += evicted
+
+    # Ghi xuống tầng cache đĩa để giữ lại qua các lần khởi động lại
+    if persist and disk_cache.is_enabled():
+        disk_cache.put(key, data, entry.ttl, entry.stale_ttl, entry.tags)
+
+def _load_from_disk_cache(key):
+    """Nạp một mục từ cache đĩa vào cache bộ nhớ (giữ nguyên thời điểm tạo và TTL)"""
+    entry = disk_cache.get(key)
+    if entry is None:
+        return False
+
+    store_in_cache(key, entry['data'], ttl=entry['ttl'], stale_ttl=entry['stale_ttl'],
+                   tags=entry['tags'], created=entry['created'], persist=False)
+    return True
+
+def get_stale_from_cache(key):
+    """Lấy dữ liệu cũ từ cache khi quá tải hoặc lỗi (tối đa gấp đôi TTL, hoặc hết thời gian stale của mục catalog)"""
+    if not _cache_enabled or key is None:
+        return None
+
     with _cache_lock:
-        # Nếu cache đã đầy, xóa mục cũ nhất
-        if len(_cache) >= _cache_size_limit:
-            oldest_key = min(_cache.keys(), key=lambda k: _cache[k][0])
-            del _cache[oldest_key]
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+
+        cache_age = entry.age()
+        # Cho phép sử dụng cache cũ hơn trong trường hợp quá tải hoặc lỗi
+        extended_ttl = entry.max_stale_age()
+        if cache_age <= extended_ttl:
+            log_warning(f"Returning stale cache data (age: {cache_age:.1f}s)")
+            _record_stale_served()
+            return entry.data
 
-        # Lưu dữ liệu mới vào cache
-        _cache[key] = (datetime.now(), data)
+        log_warning(f"Cache data too old ({cache_age:.1f}s > {extended_ttl}s), cannot use")
+        return None
 
 def clear_cache():
     """Xóa toàn bộ cache"""
+    global _cache_bytes
+
     with _cache_lock:
         _cache.clear()
+        _tag_index.clear()
+        _cache_bytes = 0
+
+    disk_cache.clear()
+
+def _strip_string_literals(query):
+    """Bỏ các chuỗi literal để không nhận nhầm từ khóa/label nằm trong chuỗi"""
+    return _string_literal_pattern.sub("''", query)
+
+def _pattern_labels(text):
+    """
+    Phân tích nhẹ các pattern node/relationship trong Cypher
+
+    Returns:
+        Tuple (tags, variable_tags): tập label/relationship type (chữ thường) và
+        map biến -> tập label/type của biến đó
+    """
+    tags = set()
+    variable_tags = {}
+    for pattern in (_node_pattern, _relationship_pattern):
+        for variable, chain in pattern.findall(text):
+            names = {name.lower() for name in re.findall(r'\w+', chain)}
+            tags |= names
+            if variable:
+                variable_tags.setdefault(variable, set()).update(names)
+    return tags, variable_tags
+
+def extract_query_tags(query):
+    """Lấy tập label/relationship type (chữ thường) mà truy vấn chạm tới, dùng làm tag cache"""
+    tags, _ = _pattern_labels(_strip_string_literals(query))
+    return frozenset(tags) if tags else frozenset([_wildcard_tag])
+
+def is_write_query(query):
+    """Truy vấn có mệnh đề ghi (CREATE/MERGE/SET/DELETE/REMOVE)"""
+    return bool(_write_clause_pattern.search(_strip_string_literals(query)))
+
+def _extract_write_tags(query):
+    """
+    Lấy tập label/relationship type bị thay đổi bởi truy vấn ghi
+
+    Gồm các label/type xuất hiện trong mệnh đề CREATE/MERGE và label của các biến
+    bị SET/REMOVE/DELETE. Trả về wildcard nếu không xác định được (invalidate toàn bộ).
+    """
+    text = _strip_string_literals(query)
+    _, variable_tags = _pattern_labels(text)
+
+    parts = _clause_split_pattern.split(text)
+    written = set()
+    # parts = [trước mệnh đề đầu, từ khóa, nội dung, từ khóa, nội dung, ...]
+    for i in range(1, len(parts) - 1, 2):
+        keyword = ' '.join(parts[i].upper().split())
+        body = parts[i + 1]
+
+        if keyword in ('CREATE', 'MERGE'):
+            body_tags, _ = _pattern_labels(body)
+            written |= body_tags
+        elif keyword == 'DETACH DELETE':
+            # Xóa cả các relationship không xác định được loại
+            return frozenset([_wildcard_tag])
+        elif keyword in ('SET', 'REMOVE', 'DELETE'):
+            for variable in re.findall(r'\b([A-Za-z_]\w*)\b', body):
+                written |= variable_tags.get(variable, set())
+
+    return frozenset(written) if written else frozenset([_wildcard_tag])
+
+def invalidate_labels(labels):
+    """
+    Invalidate các mục cache có truy vấn chạm tới label/relationship type đã cho
+
+    Các mục không xác định được label (wildcard) cũng bị invalidate. Truyền '*'
+    để xóa toàn bộ cache.
+
+    Args:
+        labels: Tập label/relationship type, ví dụ {"Order", "Order_Detail"}
+
+    Returns:
+        int: Số mục cache bị xóa
+    """
+    global _invalidation_count
+
+    tags = {str(label).lower() for label in labels}
+    if not tags:
+        return 0
+
+    with _cache_lock:
+        if _wildcard_tag in tags:
+            keys = list(_cache.keys())
+        else:
+            keys = set(_tag_index.get(_wildcard_tag, ()))
+            for tag in tags:
+                keys |= _tag_index.get(tag, set())
+
+        for key in keys:
+            _remove_cache_entry(key)
+
+    removed = len(keys)
+    with _cache_stats_lock:
+        _invalidation_count += removed
+
+    disk_cache.invalidate_tags(tags, _wildcard_tag)
+    catalog_mirror.invalidate(tags)
+
+    log_info(f"Invalidated {removed} cache entries for labels: {', '.join(sorted(tags))}")
+    return removed
+
+def _record_stale_served():
+    global _stale_served_count
+    with _cache_stats_lock:
+        _stale_served_count += 1
+
+def is_catalog_query(query):
+    """Truy vấn chỉ đọc trên dữ liệu catalog (Product/Variant/Category/Store)"""
+    return bool(_catalog_label_pattern.search(query)) and not is_write_query(query)
+
+def _stale_ttl_for(query):
+    """Thời gian phục vụ dữ liệu cũ cho kết quả của truy vấn (chỉ áp dụng cho catalog)"""
+    return _cache_stale_ttl if is_catalog_query(query) else 0
+
+def _get_refresh_executor():
+    """Lấy (tạo lazy) thread pool làm mới cache ở background"""
+    global _refresh_executor
+
+    with _refresh_lock:
+        if _refresh_executor is None:
+            _refresh_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_refresh_max_workers,
+                thread_name_prefix="neo4j-cache-refresh"
+            )
+        return _refresh_executor
+
+def _shutdown_refresh_executor():
+    """Dừng thread pool làm mới cache (không chờ các tác vụ đang chạy)"""
+    global _refresh_executor
+
+    with _refresh_lock:
+        executor = _refresh_executor
+        _refresh_executor = None
+        _refreshing_keys.clear()
+
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+def _get_fanout_executor():
+    """Lấy (tạo lazy) thread pool chạy song song các truy vấn đọc độc lập"""
+    global _fanout_executor
+
+    with _refresh_lock:
+        if _fanout_executor is None:
+            _fanout_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_fanout_max_workers,
+                thread_name_prefix="neo4j-fanout"
+            )
+        return _fanout_executor
+
+def _shutdown_fanout_executor():
+    """Dừng thread pool chạy song song truy vấn (không chờ các tác vụ đang chạy)"""
+    global _fanout_executor
+
+    with _refresh_lock:
+        executor = _fanout_executor
+        _fanout_executor = None
+
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+def _schedule_background_refresh(cache_key, query, params, database, cache_ttl):
+    """Lên lịch làm mới một mục cache ở background, bỏ qua nếu mục đó đang được làm mới"""
+    with _refresh_lock:
+        if cache_key in _refreshing_keys:
+            return
+        _refreshing_keys.add(cache_key)
+
+    try:
+        _get_refresh_executor().submit(_refresh_cache_entry, cache_key, query, params, database, cache_ttl)
+    except RuntimeError as e:
+        # Executor đã bị shutdown
+        log_warning(f"Could not schedule background cache refresh: {str(e)}")
+        with _refresh_lock:
+            _refreshing_keys.discard(cache_key)
+
+def _refresh_cache_entry(cache_key, query, params, database, cache_ttl):
+    """Thực thi lại truy vấn và cập nhật cache (chạy trên thread background)"""
+    global _background_refresh_count
+
+    try:
+        # Không làm mới khi circuit đang mở - tiếp tục phục vụ dữ liệu cũ
+        if not check_circuit_breaker(classify_query(query)):
+            return
 
-def execute_query_with_semaphore(query, params=None, database=None, max_retries=3, retry_delay=1, use_cache=True, semaphore_timeout=None):
-    """Execute a Cypher query with semaphore to limit concurrent queries"""
+        future, is_leader = _join_inflight_query(cache_key)
+        if not is_leader:
+            # Truy vấn giống hệt đang chạy sẽ cập nhật cache
+            return
+
+        result = []
+        try:
+            result = _execute_with_semaphore(query, params, database, 2, 1,
+                                             True, cache_key, _query_timeout, cache_ttl)
+        finally:
+            _complete_inflight_query(cache_key, future, result)
+
+        with _cache_stats_lock:
+            _background_refresh_count += 1
+        log_info(f"Background cache refresh completed for query: {query[:50]}...")
+    except Exception as e:
+        log_error(f"Error refreshing cache entry in background: {str(e)}")
+    finally:
+        with _refresh_lock:
+            _refreshing_keys.discard(cache_key)
+
+def _get_cached_or_stale(cache_key, query, params, database, cache_ttl):
+    """
+    Tra cache trước khi thực thi truy vấn
+
+    Trả về dữ liệu còn hạn; với mục catalog đã hết TTL thì trả về ngay dữ liệu cũ
+    và làm mới ở background; khi circuit breaker OPEN/HALF_OPEN thì phục vụ dữ liệu
+    cũ (nếu có) thay vì gọi Neo4j. Trả về None nếu cần thực thi truy vấn.
+    """
+    cached_result, is_stale = get_from_cache_swr(cache_key)
+    if cached_result is None and disk_cache.is_enabled() and _load_from_disk_cache(cache_key):
+        # Cache bộ nhớ trống (vd. sau khi khởi động lại) nhưng cache đĩa còn kết quả
+        cached_result, is_stale = get_from_cache_swr(cache_key)
+
+    if cached_result is not None:
+        if is_stale:
+            log_info(f"Serving stale cache data while revalidating: {query[:50]}...")
+            _record_stale_served()
+            _schedule_background_refresh(cache_key, query, params, database, cache_ttl)
+        return cached_result
+
+    if is_circuit_degraded(classify_query(query)):
+        stale_data = get_stale_from_cache(cache_key)
+        if stale_data is not None:
+            # Làm mới ở background để thăm dò khi circuit chuyển sang HALF_OPEN
+            _schedule_background_refresh(cache_key, query, params, database, cache_ttl)
+            return stale_data
+
+    return None
+
+def execute_query_with_semaphore(query, params=None, database=None, max_retries=3, retry_delay=1, use_cache=True, semaphore_timeout=None, cache_ttl=None):
+    """Execute a Cypher query with semaphore to limit concurrent queries
+
+    cache_ttl cho phép ghi đè TTL của kết quả trong cache (giây).
+    """
     # Sử dụng timeout mặc định nếu không được chỉ định
     if semaphore_timeout is None:
         semaphore_timeout = _query_timeout
 
+    # Không cache kết quả của truy vấn ghi
+    if is_write_query(query):
+        use_cache = False
+
     # Kiểm tra cache trước - ưu tiên cache để giảm tải cho database
     if use_cache:
         cache_key = generate_cache_key(query, params)
-        cached_result = get_from_cache(cache_key)
+        cached_result = _get_cached_or_stale(cache_key, query, params, database, cache_ttl)
         if cached_result is not None:
-            global _cache_hit_count
-            with _cache_stats_lock:
-                _cache_hit_count += 1
             log_info(f"Cache hit for query: {query[:50]}...")
             return cached_result
 
-    # Sử dụng semaphore để giới hạn số lượng truy vấn đồng thời
+        # Nếu truy vấn giống hệt đang chạy, chờ kết quả của nó thay vì gửi thêm tới Neo4j.
+        # Caller đồng bộ trên thread của event loop không được chờ: leader có thể là một
+        # coroutine trên chính loop đó, future.result() sẽ block loop và không bao giờ xong.
+        # Caller đó vẫn dùng cache_key (lưu cache, dữ liệu cũ khi quá tải), chỉ bỏ single-flight
+        if cache_key is not None and _in_event_loop():
+            return _execute_with_semaphore(query, params, database, max_retries, retry_delay,
+                                           use_cache, cache_key, semaphore_timeout, cache_ttl)
+
+        if cache_key is not None:
+            future, is_leader = _join_inflight_query(cache_key)
+            if not is_leader:
+                return _wait_for_inflight_query(future, cache_key, semaphore_timeout)
+
+            result = []
+            try:
+                result = _execute_with_semaphore(query, params, database, max_retries, retry_delay,
+                                                 use_cache, cache_key, semaphore_timeout, cache_ttl)
+            finally:
+                _complete_inflight_query(cache_key, future, result)
+            return result
+
+    return _execute_with_semaphore(query, params, database, max_retries, retry_delay,
+                                   use_cache, None, semaphore_timeout, cache_ttl)
+
+def _in_event_loop():
+    """Thread hiện tại có đang chạy một asyncio event loop không"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def _join_inflight_query(cache_key):
+    """
+    Đăng ký truy vấn vào bảng single-flight
+
+    Returns:
+        Tuple (future, is_leader): caller đầu tiên là leader và thực thi truy vấn,
+        các caller sau chờ trên cùng future
+    """
+    global _coalesced_query_count
+
+    with _inflight_lock:
+        future = _inflight_queries.get(cache_key)
+        if future is not None:
+            _coalesced_query_count += 1
+            return future, False
+
+        future = concurrent.futures.Future()
+        _inflight_queries[cache_key] = future
+        return future, True
+
+def _complete_inflight_query(cache_key, future, result):
+    """Gỡ truy vấn khỏi bảng single-flight và trả kết quả cho các caller đang chờ"""
+    with _inflight_lock:
+        if _inflight_queries.get(cache_key) is future:
+            del _inflight_queries[cache_key]
+
+    if not future.done():
+        future.set_result(result)
+
+def _wait_for_inflight_query(future, cache_key, timeout):
+    """Chờ kết quả của truy vấn giống hệt đang được thread/coroutine khác thực thi"""
+    log_info("Coalescing with identical in-flight query")
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        log_warning(f"Timed out after {timeout}s waiting for identical in-flight query")
+        stale_data = get_stale_from_cache(cache_key)
+        return stale_data if stale_data is not None else []
+    except Exception as e:
+        log_error(f"Error waiting for in-flight query: {str(e)}")
+        return []
+
+def _execute_with_semaphore(query, params, database, max_retries, retry_delay, use_cache, cache_key, semaphore_timeout, cache_ttl):
+    """Thực thi truy vấn trong giới hạn semaphore và lưu kết quả vào cache"""
+    # Sử dụng limiter của bulkhead để giới hạn số lượng truy vấn đồng thời theo loại truy vấn
+    query_class = classify_query(query)
+    limiter = get_bulkhead(query_class).limiter
     acquired = False
     start_time = time.time()
+    query_start = None
+    outcome = {'failed': False}
 
     # Thêm jitter vào thời gian chờ để tránh thundering herd
     actual_timeout = semaphore_timeout * (0.8 + 0.4 * random.random())
 
     try:
         # Thử acquire semaphore với timeout
-        log_info(f"Waiting for query semaphore (timeout: {actual_timeout:.1f}s)...")
-        acquired = _query_semaphore.acquire(timeout=actual_timeout)
+        log_info(f"Waiting for {query_class} query slot (timeout: {actual_timeout:.1f}s, limit: {limiter.limit})...")
+        acquired = limiter.acquire(timeout=actual_timeout)
 
         if not acquired:
             log_warning(f"Failed to acquire query semaphore after {actual_timeout:.1f}s, too many concurrent queries")
 
             # Nếu không lấy được semaphore nhưng có kết quả trong cache, trả về kết quả cũ
-            # Mở rộng thời gian cache TTL trong trường hợp quá tải
-            if use_cache and cache_key in _cache:
-                with _cache_lock:
-                    if cache_key in _cache:
-                        timestamp, data = _cache[cache_key]
-                        cache_age = (datetime.now() - timestamp).total_seconds()
-                        # Cho phép sử dụng cache cũ hơn trong trường hợp quá tải
-                        extended_ttl = _cache_ttl * 2
-                        if cache_age <= extended_ttl:
-                            log_warning(f"Returning stale cache data due to semaphore timeout (age: {cache_age:.1f}s)")
-                            return data
-                        else:
-                            log_warning(f"Cache data too old ({cache_age:.1f}s > {extended_ttl}s), cannot use")
+            if use_cache:
+                stale_data = get_stale_from_cache(cache_key)
+                if stale_data is not None:
+                    return stale_data
 
             # Trả về kết quả rỗng nếu không có cache hoặc cache quá cũ
             return []
@@ -645,54 +1321,124 @@ def execute_query_with_semaphore(query, params=None, database=None, max_retries=
             log_info(f"Increasing max retries to {adjusted_max_retries} due to long semaphore wait time")
 
         # Thực hiện truy vấn
-        result = _execute_query_internal(query, params, database, adjusted_max_retries, retry_delay)
+        query_start = time.time()
+        result = _execute_query_internal(query, params, database, adjusted_max_retries, retry_delay, outcome)
+
+        # Truy vấn ghi: chỉ invalidate các mục cache chạm tới label/relationship bị thay đổi
+        if is_write_query(query):
+            invalidate_labels(_extract_write_tags(query))
 
         # Lưu kết quả vào cache
         if use_cache:
             if result:
-                store_in_cache(cache_key, result)
-            global _cache_miss_count
-            with _cache_stats_lock:
-                _cache_miss_count += 1
+                store_in_cache(cache_key, result, ttl=cache_ttl, stale_ttl=_stale_ttl_for(query),
+                               tags=extract_query_tags(query))
+            elif is_circuit_degraded(query_class):
+                # Truy vấn lỗi và circuit đã mở - phục vụ dữ liệu cũ nếu có
+                stale_data = get_stale_from_cache(cache_key)
+                if stale_data is not None:
+                    return stale_data
 
         return result
     except Exception as e:
         log_error(f"Error in execute_query_with_semaphore: {str(e)}")
+        outcome['failed'] = True
         return []
     finally:
-        # Đảm bảo release semaphore nếu đã acquire
+        # Đảm bảo release slot nếu đã acquire, kèm độ trễ để limiter điều chỉnh limit
         if acquired:
-            _query_semaphore.release()
-            log_info(f"Released query semaphore after {time.time() - start_time:.2f}s")
+            latency = time.time() - query_start if query_start is not None else None
+            limiter.release(latency, outcome['failed'], query)
+            log_info(f"Released query slot after {time.time() - start_time:.2f}s")
 
-def _execute_query_internal(query, params=None, database=None, max_retries=3, retry_delay=1):
-    """Execute a Cypher query with advanced retry mechanism and circuit breaker (internal implementation)"""
-    # Kiểm tra circuit breaker
-    if not check_circuit_breaker():
+def _record_query_text(query):
+    """
+    Ghi nhận câu truy vấn gửi tới Neo4j để tính tỷ lệ tái sử dụng plan cache
+
+    Các câu đã thấy được giữ trong LRU có giới hạn (như plan cache của server): khi đầy,
+    câu ít dùng nhất bị loại và lần gửi sau của nó được tính là câu mới.
+    """
+    global _plan_cache_executions, _plan_cache_distinct
+
+    text_hash = hash(query)
+    with _plan_cache_lock:
+        _plan_cache_executions += 1
+        if text_hash in _plan_cache_texts:
+            _plan_cache_texts.move_to_end(text_hash)
+            return
+        _plan_cache_distinct += 1
+        _plan_cache_texts[text_hash] = True
+        if len(_plan_cache_texts) > _plan_cache_max_texts:
+            _plan_cache_texts.popitem(last=False)
+
+def _record_profile(summary, query, params, execution_start):
+    """Ghi nhận kết quả PROFILE từ ResultSummary (lỗi khi đọc profile không làm hỏng truy vấn)"""
+    try:
+        profiler.record_profile(query, params, summary.profile, time.time() - execution_start)
+    except Exception as e:
+        log_warning(f"Could not record query profile: {str(e)}")
+
+def plan_cache_stats():
+    """Thống kê tái sử dụng plan cache (1 - số câu truy vấn khác nhau / số lần thực thi)"""
+    with _plan_cache_lock:
+        executions = _plan_cache_executions
+        distinct = _plan_cache_distinct
+
+    reuse_rate = 1 - distinct / executions if executions > 0 else 0
+    return {
+        'planCacheExecutions': executions,
+        'planCacheDistinctQueries': distinct,
+        'planCacheReuseRate': reuse_rate,
+        'planCacheReuseRatePercent': f"{reuse_rate * 100:.2f}%"
+    }
+
+def _run_managed_query(tx, query, params, columnar=False):
+    """
+    Transaction function cho execute_read/execute_write: chạy truy vấn và tiêu thụ toàn bộ kết quả
+
+    Có thể được driver gọi lại khi gặp lỗi tạm thời nên không được có side effect ngoài transaction.
+    Trả về (records, keys, summary); records là tuple giá trị nếu columnar, ngược lại là dict.
+    """
+    result = tx.run(query, params or {})
+
+    # Tiêu thụ kết quả ngay lập tức, có timeout để tránh treo
+    records = []
+    start_consume = time.time()
+    for record in result:
+        if time.time() - start_consume > _connection_timeout:
+            log_warning(f"Timeout while consuming query results after {_connection_timeout}s")
+            raise Exception(f"Timeout while consuming query results after {_connection_timeout}s")
+        # Dạng cột: giữ tuple giá trị, không dựng dict cho từng record
+        records.append(record.values() if columnar else record.data())
+
+    return records, list(result.keys()), result.consume()
+
+def _execute_query_internal(query, params=None, database=None, max_retries=3, retry_delay=1, outcome=None,
+                            columnar=False):
+    """Execute a Cypher query with advanced retry mechanism and circuit breaker (internal implementation)
+
+    outcome (dict, tùy chọn) được đặt outcome['failed'] = True khi truy vấn thất bại,
+    để phân biệt với kết quả rỗng hợp lệ. columnar=True trả về dict {cột: mảng NumPy}
+    thay vì danh sách dict.
+    """
+    # Kiểm tra circuit breaker (kết nối và của loại truy vấn)
+    query_class = classify_query(query)
+    if not check_circuit_breaker(query_class):
         log_warning("Circuit breaker is OPEN, skipping query execution")
         return []
 
-    session = None
+    _record_query_text(query)
+    execution_start = time.time()
+
+    is_write = is_write_query(query)
+
+    # Lấy mẫu PROFILE (opt-in) để ghi nhận db hits và plan của truy vấn
+    profile = profiler.should_profile(query, is_write)
+    run_query = profiler.profiled_query(query) if profile else query
+
     last_error = None
 
-    # Danh sách lỗi kết nối cần xử lý đặc biệt
-    connection_errors = [
-        "defunct connection",
-        "connection reset",
-        "connection refused",
-        "connection timed out",
-        "connection has been closed",
-        "socket closed",
-        "failed to read",
-        "broken pipe",
-        "existing exports of data",
-        "address already in use",
-        "too many open files",
-        "database unavailable",
-        "service unavailable",
-        "timeout during discovery",
-        "connection acquisition timed out"
-    ]
+    connection_errors = _connection_error_patterns
 
     # Sử dụng backoff strategy thông minh hơn
     for attempt in range(max_retries):
@@ -712,47 +1458,33 @@ def _execute_query_internal(query, params=None, database=None, max_retries=3, re
                     time.sleep(wait_time)
                 continue
 
-            # Lấy session từ pool hoặc tạo mới
-            session = get_session_from_pool()
-            if session is None:
-                log_error("Failed to get Neo4j session")
-                record_failure()
-                last_error = Exception("Failed to get Neo4j session")
+            # Đọc qua execute_read (driver có thể định tuyến tới read replica), ghi qua execute_write;
+            # session mới cho mỗi truy vấn để mang bookmark của phiên chat hiện tại
+            access_mode = routing.WRITE if is_write else routing.READ
+            try:
+                with driver.session(**routing.session_kwargs(access_mode, database)) as session:
+                    if _auto_commit_pattern.search(query):
+                        # CALL {...} IN TRANSACTIONS chỉ chạy được trong auto-commit transaction
+                        records, keys, summary = _run_managed_query(session, run_query, params, columnar)
+                    elif is_write:
+                        records, keys, summary = session.execute_write(_run_managed_query, run_query, params, columnar)
+                    else:
+                        records, keys, summary = session.execute_read(_run_managed_query, run_query, params, columnar)
 
-                # Chờ trước khi thử lại
-                if attempt < max_retries - 1:
-                    wait_time = add_jitter(retry_delay * (2 ** attempt))
-                    log_info(f"Retrying to get session in {wait_time:.2f} seconds... (attempt {attempt+1}/{max_retries})")
-                    time.sleep(wait_time)
-                continue
+                    if is_write:
+                        routing.update_bookmarks(session.last_bookmarks())
 
-            # Thực hiện truy vấn với timeout và xử lý lỗi tốt hơn
-            try:
-                if database:
-                    # Nếu có chỉ định database, sử dụng database đó
-                    log_info(f"Using specified database: {database}")
-                    result = session.run(f"USE {database}; {query}", params or {})
-                else:
-                    result = session.run(query, params or {})
+                if columnar:
+                    records = to_columns(keys, records)
 
-                # Tiêu thụ kết quả ngay lập tức để tránh lỗi defunct connection
-                # Sử dụng timeout để tránh treo khi tiêu thụ kết quả
-                records = []
-                start_consume = time.time()
-                for record in result:
-                    # Kiểm tra timeout khi tiêu thụ kết quả
-                    if time.time() - start_consume > _connection_timeout:
-                        log_warning(f"Timeout while consuming query results after {_connection_timeout}s")
-                        raise Exception(f"Timeout while consuming query results after {_connection_timeout}s")
-                    records.append(record.data())
+                if profile:
+                    _record_profile(summary, query, params, execution_start)
 
                 # Ghi nhận thành công cho circuit breaker
-                record_success()
-
-                # Trả session về pool để tái sử dụng
-                return_session_to_pool(session)
-                session = None
+                record_success(query_class)
 
+                record_query(query, params, time.time() - execution_start,
+                             column_count(records) if columnar else len(records))
                 return records
             except Exception as e:
                 # Xử lý lỗi khi thực hiện truy vấn
@@ -760,16 +1492,7 @@ def _execute_query_internal(query, params=None, database=None, max_retries=3, re
                 log_error(f"Error executing Neo4j query (attempt {attempt+1}/{max_retries}): {error_message}")
                 last_error = e
 
-                # Đóng session lỗi thay vì trả về pool
-                if session is not None:
-                    try:
-                        session.close()
-                    except:
-                        pass
-                    session = None
-
-                # Ghi nhận lỗi cho circuit breaker
-                record_failure()
+                # Lỗi được ghi nhận cho circuit breaker một lần ở except bên ngoài
 
                 # Nếu lỗi liên quan đến kết nối, thử khởi tạo lại driver
                 if any(err in error_message.lower() for err in connection_errors):
@@ -784,7 +1507,7 @@ def _execute_query_internal(query, params=None, database=None, max_retries=3, re
             last_error = e
 
             # Ghi nhận lỗi cho circuit breaker
-            record_failure()
+            record_failure(query_class, _is_connection_error(error_message))
 
             if attempt < max_retries - 1:
                 # Chờ trước khi thử lại với jitter để tránh thundering herd
@@ -804,38 +1527,863 @@ def _execute_query_internal(query, params=None, database=None, max_retries=3, re
                     log_error(f"Params: {params}")
                 if last_error:
                     log_error(f"Last error: {str(last_error)}")
+                if outcome is not None:
+                    outcome['failed'] = True
+                record_query(query, params, time.time() - execution_start, failed=True)
                 return []
 
-    # Đảm bảo session được đóng nếu vẫn còn mở
-    if session is not None:
-        try:
-            session.close()
-        except:
-            pass
-
+    if outcome is not None:
+        outcome['failed'] = True
+    record_query(query, params, time.time() - execution_start, failed=True)
     return []
 
-def execute_query(query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+def execute_query(query: str, params: Optional[Dict[str, Any]] = None, cache_ttl: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Execute a Cypher query and return the results
 
     Args:
         query: Cypher query to execute
         params: Parameters for the query
+        cache_ttl: TTL riêng cho kết quả trong cache (giây)
 
     Returns:
         List[Dict]: Query results
     """
     try:
         # Use semaphore and caching
-        result = execute_query_with_semaphore(query, params, use_cache=True)
+        result = execute_query_with_semaphore(query, params, use_cache=True, cache_ttl=cache_ttl)
         return result
     except Exception as e:
         log_error(f"Error executing query: {str(e)}")
         return []
 
+# Số record mỗi lần driver lấy từ server khi stream kết quả
+_stream_fetch_size = int(os.environ.get('NEO4J_STREAM_FETCH_SIZE', 500))
+
+def stream_query(query: str, params: Optional[Dict[str, Any]] = None, fetch_size: Optional[int] = None,
+                 database=None, max_retries=3, retry_delay=1) -> Iterator[Dict[str, Any]]:
+    """
+    Stream kết quả của một Cypher query theo từng record thay vì tải toàn bộ vào bộ nhớ
+
+    Record được lấy từ server theo từng lô fetch_size khi generator được duyệt, nên bộ nhớ
+    chỉ tỷ lệ với fetch_size chứ không với kích thước kết quả. Session dùng riêng cho
+    generator và luôn được đóng, kể cả khi caller dừng duyệt sớm (break, close(), exception).
+    Kết quả không đi qua cache.
+
+    Nếu lỗi xảy ra trước record đầu tiên, truy vấn được thử lại như execute_query; hết số lần
+    thử thì generator kết thúc rỗng. Lỗi giữa chừng được raise để caller không nhận nhầm
+    một kết quả bị cắt ngắn là đầy đủ.
+
+    Args:
+        query: Cypher query to execute
+        params: Parameters for the query
+        fetch_size: Số record mỗi lần lấy từ server (mặc định NEO4J_STREAM_FETCH_SIZE)
+
+    Yields:
+        Dict: Từng record dưới dạng dict
+    """
+    query_class = classify_query(query)
+    if not check_circuit_breaker(query_class):
+        log_warning("Circuit breaker is OPEN, skipping streaming query")
+        return
+
+    if fetch_size is None:
+        fetch_size = _stream_fetch_size
+
+    # Stream chiếm một slot truy vấn trong suốt thời gian duyệt
+    limiter = get_bulkhead(query_class).limiter
+    if not limiter.acquire(timeout=_query_timeout):
+        log_warning(f"Failed to acquire query slot for streaming query after {_query_timeout}s")
+        return
+
+    _record_query_text(query)
+    failed = False
+
+    try:
+        for attempt in range(max_retries):
+            driver = get_neo4j_driver()
+            if driver is None:
+                log_error("No Neo4j connection available for streaming query")
+                record_failure()
+                if attempt < max_retries - 1:
+                    time.sleep(add_jitter(retry_delay * (2 ** attempt)))
+                continue
+
+            yielded = 0
+            try:
+                # Auto-commit với access mode READ: vẫn được định tuyến tới read replica
+                session_kwargs = routing.session_kwargs(routing.READ, database, fetch_size=fetch_size)
+                with driver.session(**session_kwargs) as session:
+                    result = session.run(query, params or {})
+                    for record in result:
+                        yielded += 1
+                        yield record.data()
+                record_success(query_class)
+                log_info(f"Streamed {yielded} records (fetch size {fetch_size})")
+                return
+            except GeneratorExit:
+                # Caller dừng duyệt sớm - session đã được đóng bởi context manager
+                log_info(f"Streaming query closed early after {yielded} records")
+                raise
+            except Exception as e:
+                error_message = str(e)
+                record_failure(query_class, _is_connection_error(error_message))
+
+                if yielded > 0:
+                    failed = True
+                    log_error(f"Streaming query failed after {yielded} records: {error_message}")
+                    raise
+
+                log_error(f"Error in stream_query (attempt {attempt+1}/{max_retries}): {error_message}")
+                if any(err in error_message.lower() for err in _connection_error_patterns):
+                    log_warning("Connection issue detected, reinitializing driver...")
+                    close_neo4j_connection()
+
+                if attempt < max_retries - 1:
+                    wait_time = add_jitter(retry_delay * (2 ** attempt))
+                    log_info(f"Retrying streaming query in {wait_time:.2f} seconds... (attempt {attempt+1}/{max_retries})")
+                    time.sleep(wait_time)
+
+        failed = True
+        log_error(f"Streaming query failed after {max_retries} attempts: {query}")
+    finally:
+        # Không truyền độ trễ: thời gian stream phụ thuộc vào tốc độ duyệt của caller
+        limiter.release(None, failed)
+
+def _record_write_batch(rows, duration, failed, retries):
+    """Ghi nhận thống kê của một lô ghi"""
+    global _write_batch_count, _write_batch_rows, _write_batch_failures, _write_batch_retries
+    global _write_batch_total_time, _write_batch_max_time
+
+    with _write_batch_lock:
+        _write_batch_count += 1
+        _write_batch_retries += retries
+        _write_batch_total_time += duration
+        _write_batch_max_time = max(_write_batch_max_time, duration)
+        if failed:
+            _write_batch_failures += 1
+        else:
+            _write_batch_rows += rows
+
+def write_batch_stats():
+    """Thống kê các lô ghi UNWIND"""
+    with _write_batch_lock:
+        avg_time = _write_batch_total_time / _write_batch_count if _write_batch_count > 0 else 0
+        return {
+            'writeBatches': _write_batch_count,
+            'writeBatchRows': _write_batch_rows,
+            'writeBatchFailures': _write_batch_failures,
+            'writeBatchRetries': _write_batch_retries,
+            'writeBatchAvgTimeMs': round(avg_time * 1000, 2),
+            'writeBatchMaxTimeMs': round(_write_batch_max_time * 1000, 2)
+        }
+
+def _run_write_batch(tx, query, rows):
+    """Transaction function cho execute_write: chạy một lô và trả về số thay đổi"""
+    result = tx.run(query, rows=rows)
+    summary = result.consume()
+    return summary.counters
+
+def execute_write_batch(template: str, rows: List[Dict[str, Any]], batch_size: Optional[int] = None,
+                        database=None, max_retries=3, retry_delay=1) -> Dict[str, Any]:
+    """
+    Ghi hàng loạt: chia rows thành các lô và chạy mỗi lô bằng một câu `UNWIND $rows AS row ...`
+
+    Mỗi lô là một managed write transaction (session.execute_write) nên được driver tự retry
+    khi gặp lỗi tạm thời; ngoài ra lô lỗi được thử lại với exponential backoff như execute_query.
+    Sau khi ghi, các mục cache chạm tới label/relationship bị thay đổi được invalidate.
+
+    Args:
+        template: Câu Cypher xử lý một `row`, ví dụ
+            "MATCH (c:Customer {id: row.id}) SET c.embedding = row.embedding".
+            Nếu template chưa bắt đầu bằng UNWIND, "UNWIND $rows AS row" được thêm vào đầu.
+        rows: Danh sách dict tham số, mỗi dict là một `row`
+        batch_size: Số row mỗi lô (mặc định NEO4J_WRITE_BATCH_SIZE)
+
+    Returns:
+        Dict: {success, rows, batches, failedBatches, counters, durationMs}
+    """
+    if batch_size is None:
+        batch_size = _write_batch_size
+    batch_size = max(1, batch_size)
+    rows = list(rows or [])
+
+    query = template.strip()
+    if not query.upper().startswith('UNWIND'):
+        query = f"UNWIND $rows AS row\n{query}"
+
+    summary = {'success': True, 'rows': 0, 'batches': 0, 'failedBatches': 0, 'counters': {}, 'durationMs': 0}
+    if not rows:
+        return summary
+
+    start_time = time.time()
+    _record_query_text(query)
+
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        summary['batches'] += 1
+
+        if not _write_one_batch(query, batch, database, max_retries, retry_delay, summary['counters']):
+            summary['success'] = False
+            summary['failedBatches'] += 1
+            continue
+
+        summary['rows'] += len(batch)
+
+    # Chỉ invalidate một lần cho toàn bộ lần ghi (kể cả khi một số lô lỗi, vì các lô khác đã commit)
+    if summary['rows'] > 0:
+        invalidate_labels(_extract_write_tags(query))
+
+    summary['durationMs'] = round((time.time() - start_time) * 1000, 2)
+    log_info(f"Write batch finished: {summary['rows']}/{len(rows)} rows in {summary['batches']} batches "
+             f"({summary['failedBatches']} failed) in {summary['durationMs']:.0f}ms")
+    return summary
+
+def _write_one_batch(query, batch, database, max_retries, retry_delay, counters):
+    """Ghi một lô trong write transaction có retry; cộng dồn counters. Trả về True nếu thành công"""
+    batch_start = time.time()
+    retries = 0
+    limiter = get_bulkhead(WRITE).limiter
+
+    for attempt in range(max_retries):
+        if not check_circuit_breaker(WRITE):
+            log_warning("Circuit breaker is OPEN, skipping write batch")
+            break
+
+        if not limiter.acquire(timeout=_query_timeout):
+            log_warning(f"Failed to acquire query slot for write batch after {_query_timeout}s")
+            break
+
+        attempt_start = time.time()
+        failed = False
+        try:
+            driver = get_neo4j_driver()
+            if driver is None:
+                raise Exception("No Neo4j connection available")
+
+            with driver.session(**routing.session_kwargs(routing.WRITE, database)) as session:
+                batch_counters = session.execute_write(_run_write_batch, query, batch)
+                routing.update_bookmarks(session.last_bookmarks())
+
+            record_success(WRITE)
+            for name in ('nodes_created', 'nodes_deleted', 'relationships_created', 'relationships_deleted',
+                         'properties_set', 'labels_added', 'labels_removed'):
+                counters[name] = counters.get(name, 0) + getattr(batch_counters, name, 0)
+
+            _record_write_batch(len(batch), time.time() - batch_start, False, retries)
+            return True
+        except Exception as e:
+            failed = True
+            error_message = str(e)
+            log_error(f"Error in write batch of {len(batch)} rows (attempt {attempt+1}/{max_retries}): {error_message}")
+            record_failure(WRITE, _is_connection_error(error_message))
+
+            if any(err in error_message.lower() for err in _connection_error_patterns):
+                log_warning("Connection issue detected, reinitializing driver...")
+                close_neo4j_connection()
+        finally:
+            limiter.release(time.time() - attempt_start, failed, query)
+
+        if attempt < max_retries - 1:
+            retries += 1
+            wait_time = add_jitter(retry_delay * (2 ** attempt))
+            log_info(f"Retrying write batch in {wait_time:.2f} seconds... (attempt {attempt+1}/{max_retries})")
+            time.sleep(wait_time)
+
+    _record_write_batch(len(batch), time.time() - batch_start, True, retries)
+    return False
+
+def execute_queries_parallel(queries: List[Tuple[str, Optional[Dict[str, Any]]]], use_cache=True,
+                             semaphore_timeout=None, cache_ttl=None) -> List[List[Dict[str, Any]]]:
+    """
+    Chạy song song nhiều truy vấn đọc độc lập, mỗi truy vấn trên một session riêng
+
+    Mỗi truy vấn đi qua execute_query_with_semaphore (cache, single-flight, limiter, retry)
+    nên số truy vấn thực sự chạy đồng thời vẫn bị giới hạn bởi limiter và session pool.
+    Tổng thời gian xấp xỉ truy vấn chậm nhất thay vì tổng các truy vấn.
+
+    Args:
+        queries: Danh sách (query, params)
+
+    Returns:
+        List: Kết quả của từng truy vấn theo đúng thứ tự đầu vào ([] cho truy vấn lỗi)
+    """
+    if not queries:
+        return []
+
+    if len(queries) == 1:
+        query, params = queries[0]
+        return [execute_query_with_semaphore(query, params, use_cache=use_cache,
+                                             semaphore_timeout=semaphore_timeout, cache_ttl=cache_ttl)]
+
+    executor = _get_fanout_executor()
+    # Mỗi truy vấn chạy trong bản sao context của caller để giữ phiên chat (bookmark)
+    futures = [
+        executor.submit(contextvars.copy_context().run, execute_query_with_semaphore, query, params,
+                        use_cache=use_cache, semaphore_timeout=semaphore_timeout, cache_ttl=cache_ttl)
+        for query, params in queries
+    ]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            log_error(f"Error in parallel query: {str(e)}")
+            results.append([])
+    return results
+
+def _run_transaction_statements(tx, statements):
+    """Transaction function: chạy lần lượt các câu lệnh trong cùng một transaction"""
+    results = []
+    for query, params in statements:
+        result = tx.run(query, params or {})
+        results.append([record.data() for record in result])
+    return results
+
+def execute_transaction(statements: List[Tuple[str, Optional[Dict[str, Any]]]], database=None,
+                        max_retries=3, retry_delay=1) -> Optional[List[List[Dict[str, Any]]]]:
+    """
+    Chạy nhiều câu lệnh trong một write transaction duy nhất (session.execute_write)
+
+    Tất cả câu lệnh cùng commit hoặc cùng rollback; driver tự retry transaction khi gặp
+    lỗi tạm thời. Kết quả không đi qua cache, các mục cache liên quan được invalidate sau commit.
+
+    Args:
+        statements: Danh sách (query, params) theo thứ tự thực thi
+
+    Returns:
+        List: Kết quả của từng câu lệnh, hoặc None nếu transaction thất bại (đã rollback)
+    """
+    if not statements:
+        return []
+
+    limiter = get_bulkhead(WRITE).limiter
+
+    for attempt in range(max_retries):
+        if not check_circuit_breaker(WRITE):
+            log_warning("Circuit breaker is OPEN, skipping transaction")
+            return None
+
+        if not limiter.acquire(timeout=_query_timeout):
+            log_warning(f"Failed to acquire query slot for transaction after {_query_timeout}s")
+            return None
+
+        start_time = time.time()
+        failed = False
+        retryable = True
+        driver = None
+        try:
+            driver = get_neo4j_driver()
+            if driver is None:
+                raise Exception("No Neo4j connection available")
+
+            for query, _ in statements:
+                _record_query_text(query)
+
+            with driver.session(**routing.session_kwargs(routing.WRITE, database)) as session:
+                results = session.execute_write(_run_transaction_statements, statements)
+                routing.update_bookmarks(session.last_bookmarks())
+
+            record_success(WRITE)
+
+            # Invalidate sau khi commit
+            tags = set()
+            for query, _ in statements:
+                if is_write_query(query):
+                    tags |= _extract_write_tags(query)
+            if tags:
+                invalidate_labels(tags)
+
+            log_info(f"Transaction with {len(statements)} statements committed in {time.time() - start_time:.2f}s")
+            return results
+        except Exception as e:
+            failed = True
+            error_message = str(e)
+            log_error(f"Error in transaction (attempt {attempt+1}/{max_retries}): {error_message}")
+            is_connection_error = (_is_connection_error(error_message) or
+                                   isinstance(e, (exceptions.ServiceUnavailable, exceptions.SessionExpired)))
+            record_failure(WRITE, is_connection_error)
+
+            # execute_write đã retry lỗi tạm thời; chỉ thử lại khi mất kết nối, không lặp lại
+            # lỗi của chính transaction (sai cú pháp, vi phạm ràng buộc, ...)
+            retryable = is_connection_error or driver is None
+            if is_connection_error:
+                log_warning("Connection issue detected, reinitializing driver...")
+                close_neo4j_connection()
+        finally:
+            limiter.release(time.time() - start_time, failed,
+                            tuple(statement for statement, _ in statements))
+
+        if not retryable:
+            break
+
+        if attempt < max_retries - 1:
+            wait_time = add_jitter(retry_delay * (2 ** attempt))
+            log_info(f"Retrying transaction in {wait_time:.2f} seconds... (attempt {attempt+1}/{max_retries})")
+            time.sleep(wait_time)
+
+    log_error(f"Transaction failed after {attempt + 1} attempts")
+    return None
+
+def execute_query_columnar(query: str, params: Optional[Dict[str, Any]] = None, database=None,
+                           max_retries=3, retry_delay=1, use_cache=True, cache_ttl=None) -> Dict[str, Any]:
+    """
+    Execute a Cypher query and return the results column by column
+
+    Mỗi cột số (price, sugars_g, caffeine_mg, calories, ...) là một mảng NumPy int64/float64
+    (giá trị thiếu là NaN), các cột khác là mảng object, để code phía sau lọc và gom nhóm bằng
+    phép toán vector thay vì lặp qua từng dict. Dùng columnar.to_dataframe() nếu cần pandas.
+
+    Kết quả được cache riêng với dạng danh sách dict của cùng truy vấn.
+
+    Args:
+        query: Cypher query to execute
+        params: Parameters for the query
+        cache_ttl: TTL riêng cho kết quả trong cache (giây)
+
+    Returns:
+        Dict[str, np.ndarray]: {tên cột: mảng}, {} nếu truy vấn lỗi hoặc không có kết quả
+    """
+    if is_write_query(query):
+        use_cache = False
+
+    cache_key = None
+    if use_cache:
+        cache_key = generate_cache_key(query, params)
+        if cache_key is not None:
+            cache_key = f"{cache_key}:columnar"
+            cached_result = get_from_cache(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+    actual_timeout = _query_timeout * (0.8 + 0.4 * random.random())
+    limiter = get_bulkhead(classify_query(query)).limiter
+    if not limiter.acquire(timeout=actual_timeout):
+        log_warning(f"Failed to acquire query slot for columnar query after {actual_timeout:.1f}s")
+        stale_data = get_stale_from_cache(cache_key) if use_cache else None
+        return stale_data if stale_data is not None else {}
+
+    query_start = time.time()
+    outcome = {'failed': False}
+    try:
+        columns = _execute_query_internal(query, params, database, max_retries, retry_delay, outcome, columnar=True)
+    except Exception as e:
+        log_error(f"Error in execute_query_columnar: {str(e)}")
+        outcome['failed'] = True
+        columns = {}
+    finally:
+        limiter.release(time.time() - query_start, outcome['failed'], query)
+
+    # Lỗi trả về [] từ executor nội bộ
+    if not isinstance(columns, dict):
+        columns = {}
+
+    if use_cache and cache_key is not None:
+        if column_count(columns) > 0:
+            store_in_cache(cache_key, columns, ttl=cache_ttl, tags=extract_query_tags(query))
+        elif outcome['failed']:
+            stale_data = get_stale_from_cache(cache_key)
+            if stale_data is not None:
+                return stale_data
+
+    return columns
+
+def execute_point_lookup(query: str, params: Dict[str, Any], loader: BatchLoader, key, column: str,
+                         cache_ttl: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Tra cứu theo khóa qua BatchLoader, dùng chung cache với truy vấn đơn lẻ tương đương
+
+    Cache được tra theo (query, params) của truy vấn đơn lẻ, nên cache hit, stale-while-revalidate
+    và invalidate theo label vẫn hoạt động như execute_query_with_semaphore. Khi cache miss,
+    khóa được gom với các request đồng thời khác vào một câu `UNWIND $ids` của loader.
+
+    Args:
+        query: Truy vấn đơn lẻ tương đương (dùng làm cache key và để làm mới ở background)
+        params: Tham số của truy vấn đơn lẻ
+        loader: BatchLoader tra cứu theo lô
+        key: Khóa cần tra cứu
+        column: Tên cột kết quả của truy vấn đơn lẻ
+
+    Returns:
+        List[Dict]: [{column: giá trị}] hoặc [] nếu không tìm thấy
+    """
+    cache_key = generate_cache_key(query, params)
+    if cache_key is not None:
+        cached_result = _get_cached_or_stale(cache_key, query, params, None, cache_ttl)
+        if cached_result is not None:
+            return cached_result
+
+    value = loader.load(key)
+    result = [{column: value}] if value is not None else []
+
+    if result and cache_key is not None:
+        store_in_cache(cache_key, result, ttl=cache_ttl, stale_ttl=_stale_ttl_for(query),
+                       tags=extract_query_tags(query))
+    return result
+
+_PRODUCT_BY_ID_QUERY = """
+    MATCH (p:product)
+    WHERE p.id = $product_id OR p.Id = $product_id
+    RETURN p {.*} as product
+    LIMIT 1
+    """
+
+_PRODUCTS_BY_IDS_QUERY = """
+    UNWIND $ids AS id
+    MATCH (p:product)
+    WHERE p.id = id OR p.Id = id
+    WITH id, head(collect(p {.*})) AS product
+    RETURN id AS key, product
+    """
+
+def _load_products_by_ids(ids):
+    """Batch function của product loader: {id: product}"""
+    result = execute_query_with_semaphore(_PRODUCTS_BY_IDS_QUERY, {'ids': ids}, use_cache=False)
+    return {row['key']: row['product'] for row in result}
+
+_product_loader = BatchLoader(_load_products_by_ids, name="product")
+
 def get_product_by_id(product_id: str) -> Optional[Dict]:
-    """Lấy thông tin sản phẩm theo ID"""
+    """Lấy thông tin sản phẩm theo ID (gom với các tra cứu đồng thời khác)"""
+    try:
+        result = execute_point_lookup(_PRODUCT_BY_ID_QUERY, {'product_id': product_id},
+                                      _product_loader, product_id, 'product')
+        return result[0]['product'] if result else None
+    except Exception as e:
+        log_error(f"Error getting product by id: {str(e)}")
+        return None
+
+def _get_async_io_loop():
+    """Event loop nền của async driver (tạo ở lần gọi đầu tiên)"""
+    global _async_io_loop
+
+    with _async_driver_lock:
+        if _async_io_loop is None or _async_io_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="neo4j-async-io", daemon=True).start()
+            _async_io_loop = loop
+        return _async_io_loop
+
+async def _run_in_bookmark_session(session_id, coroutine_function, *args):
+    # Task trên loop nền không mang contextvars của caller: đặt lại phiên chat để đọc kèm bookmark
+    with routing.bookmark_session(session_id):
+        return await coroutine_function(*args)
+
+async def _run_on_async_io_loop(coroutine_function, *args):
+    """Chạy coroutine_function(*args) trên event loop của async driver và chờ kết quả từ loop hiện tại"""
+    if _driver_override:
+        # Driver được cung cấp (vd. stand-in) dùng trực tiếp trên loop của caller
+        return await coroutine_function(*args)
+
+    loop = _get_async_io_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coroutine_function(*args)
+
+    future = asyncio.run_coroutine_threadsafe(
+        _run_in_bookmark_session(routing.current_bookmark_session(), coroutine_function, *args), loop)
+    return await asyncio.wrap_future(future)
+
+async def get_async_neo4j_driver():
+    """Get the async Neo4j driver bound to the running event loop (loop nền của _run_on_async_io_loop)"""
+    global _async_driver, _async_driver_loop
+
+    # Kiểm tra circuit breaker trước (dùng chung với driver đồng bộ)
+    if not check_circuit_breaker():
+        log_warning("Circuit breaker is OPEN, preventing async Neo4j connection")
+        return None
+
+    if _driver_override and _async_driver is not None:
+        return _async_driver
+
+    loop = asyncio.get_running_loop()
+    created = False
+
+    with _async_driver_lock:
+        # Async driver gắn với event loop đã tạo ra nó, không dùng lại ở loop khác
+        if _async_driver is not None and _async_driver_loop is not loop:
+            log_warning("Async Neo4j driver belongs to another event loop, recreating...")
+            _close_async_driver_on_loop(_async_driver, _async_driver_loop)
+            _async_driver = None
+
+        if _async_driver is None:
+            try:
+                params = get_neo4j_connection_params()
+                log_info(f"Creating async Neo4j driver with connection pool size: {_max_connection_pool_size}")
+                _async_driver = AsyncGraphDatabase.driver(
+                    params['uri'],
+                    auth=(params['username'], params['password']),
+                    max_connection_pool_size=_max_connection_pool_size,
+                    connection_acquisition_timeout=_connection_acquisition_timeout,
+                    max_transaction_retry_time=_max_transaction_retry_time,
+                    connection_timeout=_connection_timeout,
+                    max_connection_lifetime=_connection_max_lifetime
+                )
+                _async_driver_loop = loop
+                created = True
+            except Exception as e:
+                log_error(f"Failed to create async Neo4j driver: {str(e)}")
+                _async_driver = None
+                record_failure()
+                return None
+
+        driver = _async_driver
+
+    if created:
+        try:
+            await driver.verify_connectivity()
+            record_success()
+            log_info("Async Neo4j driver connected")
+        except Exception as e:
+            log_error(f"Failed to verify async Neo4j connectivity: {str(e)}")
+            record_failure()
+            await close_async_neo4j_connection()
+            return None
+
+    return driver
+
+def _close_async_driver_on_loop(driver, loop):
+    """Đóng driver trên event loop của nó từ một loop/thread khác, trả về concurrent Future (None nếu loop đã dừng)"""
+    if loop is None or loop.is_closed() or not loop.is_running():
+        log_warning("Event loop of async Neo4j driver is not running, cannot close the driver")
+        return None
+    return asyncio.run_coroutine_threadsafe(driver.close(), loop)
+
+async def close_async_neo4j_connection():
+    """Close async Neo4j driver safely"""
+    global _async_driver, _async_driver_loop
+
+    if _driver_override:
+        return
+
+    with _async_driver_lock:
+        driver = _async_driver
+        driver_loop = _async_driver_loop
+        _async_driver = None
+        _async_driver_loop = None
+
+    if driver is None:
+        return
+
+    # Chỉ đóng được driver trên chính event loop đã tạo ra nó
+    try:
+        if driver_loop is asyncio.get_running_loop():
+            await driver.close()
+        else:
+            future = _close_async_driver_on_loop(driver, driver_loop)
+            if future is None:
+                return
+            await asyncio.wrap_future(future)
+        log_info("Async Neo4j connection closed")
+    except Exception as e:
+        log_error(f"Error closing async Neo4j connection: {str(e)}")
+
+async def execute_query_async(query: str, params: Optional[Dict[str, Any]] = None, database=None,
+                              max_retries=3, retry_delay=1, use_cache=True, semaphore_timeout=None,
+                              cache_ttl=None) -> List[Dict[str, Any]]:
+    """
+    Execute a Cypher query on the async driver without blocking the event loop
+
+    Cùng ngữ nghĩa với execute_query_with_semaphore: cache, giới hạn truy vấn
+    đồng thời, circuit breaker và retry với exponential backoff.
+
+    Args:
+        query: Cypher query to execute
+        params: Parameters for the query
+        cache_ttl: TTL riêng cho kết quả trong cache (giây)
+
+    Returns:
+        List[Dict]: Query results
+    """
+    if semaphore_timeout is None:
+        semaphore_timeout = _query_timeout
+
+    # Không cache kết quả của truy vấn ghi
+    if is_write_query(query):
+        use_cache = False
+
+    # Kiểm tra cache trước - dùng chung cache với đường đồng bộ
+    cache_key = None
+    if use_cache:
+        cache_key = generate_cache_key(query, params)
+        cached_result = _get_cached_or_stale(cache_key, query, params, database, cache_ttl)
+        if cached_result is not None:
+            log_info(f"Cache hit for async query: {query[:50]}...")
+            return cached_result
+
+        # Dùng chung bảng single-flight với đường đồng bộ
+        if cache_key is not None:
+            future, is_leader = _join_inflight_query(cache_key)
+            if not is_leader:
+                return await _wait_for_inflight_query_async(future, cache_key, semaphore_timeout)
+
+            result = []
+            try:
+                result = await _execute_with_semaphore_async(query, params, database, max_retries, retry_delay,
+                                                             use_cache, cache_key, semaphore_timeout, cache_ttl)
+            finally:
+                _complete_inflight_query(cache_key, future, result)
+            return result
+
+    return await _execute_with_semaphore_async(query, params, database, max_retries, retry_delay,
+                                               use_cache, None, semaphore_timeout, cache_ttl)
+
+async def _wait_for_inflight_query_async(future, cache_key, timeout):
+    """Chờ (không block event loop) kết quả của truy vấn giống hệt đang được thực thi"""
+    log_info("Coalescing with identical in-flight async query")
+    try:
+        # shield để timeout của caller này không hủy future dùng chung
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=timeout)
+    except asyncio.TimeoutError:
+        log_warning(f"Timed out after {timeout}s waiting for identical in-flight query")
+        stale_data = get_stale_from_cache(cache_key)
+        return stale_data if stale_data is not None else []
+    except Exception as e:
+        log_error(f"Error waiting for in-flight query: {str(e)}")
+        return []
+
+async def _execute_with_semaphore_async(query, params, database, max_retries, retry_delay, use_cache, cache_key, semaphore_timeout, cache_ttl):
+    """Thực thi async query trong giới hạn của limiter (dùng chung với đường đồng bộ) và lưu kết quả vào cache"""
+    start_time = time.time()
+    actual_timeout = semaphore_timeout * (0.8 + 0.4 * random.random())
+    query_start = None
+    outcome = {'failed': False}
+
+    query_class = classify_query(query)
+    limiter = get_bulkhead(query_class).limiter
+    if not await limiter.acquire_async(timeout=actual_timeout):
+        log_warning(f"Failed to acquire async query slot after {actual_timeout:.1f}s, too many concurrent queries")
+        if use_cache:
+            stale_data = get_stale_from_cache(cache_key)
+            if stale_data is not None:
+                return stale_data
+        return []
+
+    try:
+        wait_time = time.time() - start_time
+        adjusted_max_retries = max_retries
+        if wait_time > 5.0:
+            adjusted_max_retries = max(max_retries, 5)
+            log_info(f"Increasing max retries to {adjusted_max_retries} due to long semaphore wait time")
+
+        query_start = time.time()
+        result = await _run_on_async_io_loop(_execute_query_internal_async, query, params, database,
+                                             adjusted_max_retries, retry_delay, outcome)
+
+        if is_write_query(query):
+            invalidate_labels(_extract_write_tags(query))
+
+        if use_cache:
+            if result:
+                store_in_cache(cache_key, result, ttl=cache_ttl, stale_ttl=_stale_ttl_for(query),
+                               tags=extract_query_tags(query))
+            elif is_circuit_degraded(query_class):
+                stale_data = get_stale_from_cache(cache_key)
+                if stale_data is not None:
+                    return stale_data
+
+        return result
+    except Exception as e:
+        log_error(f"Error in execute_query_async: {str(e)}")
+        outcome['failed'] = True
+        return []
+    finally:
+        latency = time.time() - query_start if query_start is not None else None
+        limiter.release(latency, outcome['failed'], query)
+
+async def _consume_async_result(result) -> List[Dict[str, Any]]:
+    """Tiêu thụ toàn bộ kết quả của async query"""
+    records = []
+    async for record in result:
+        records.append(record.data())
+    return records
+
+async def _run_managed_query_async(tx, query, params):
+    """Transaction function cho async execute_read/execute_write: trả về (records, summary)"""
+    result = await tx.run(query, params or {})
+    # Tiêu thụ kết quả ngay trong transaction, có timeout để tránh treo
+    records = await asyncio.wait_for(_consume_async_result(result), timeout=_connection_timeout)
+    return records, await result.consume()
+
+async def _execute_query_internal_async(query, params=None, database=None, max_retries=3, retry_delay=1, outcome=None):
+    """Execute a Cypher query on the async driver with retry and circuit breaker (internal implementation)"""
+    query_class = classify_query(query)
+    if not check_circuit_breaker(query_class):
+        log_warning("Circuit breaker is OPEN, skipping async query execution")
+        return []
+
+    _record_query_text(query)
+    execution_start = time.time()
+    last_error = None
+
+    is_write = is_write_query(query)
+    profile = profiler.should_profile(query, is_write)
+    run_query = profiler.profiled_query(query) if profile else query
+
+    for attempt in range(max_retries):
+        try:
+            driver = await get_async_neo4j_driver()
+            if driver is None:
+                log_error("No async Neo4j connection available")
+                record_failure()
+                last_error = Exception("No async Neo4j connection available")
+
+                if attempt < max_retries - 1:
+                    wait_time = add_jitter(retry_delay * (2 ** attempt))
+                    log_info(f"Retrying to get async driver in {wait_time:.2f} seconds... (attempt {attempt+1}/{max_retries})")
+                    await asyncio.sleep(wait_time)
+                continue
+
+            access_mode = routing.WRITE if is_write else routing.READ
+            async with driver.session(**routing.session_kwargs(access_mode, database)) as session:
+                if _auto_commit_pattern.search(query):
+                    records, summary = await _run_managed_query_async(session, run_query, params)
+                elif is_write:
+                    records, summary = await session.execute_write(_run_managed_query_async, run_query, params)
+                else:
+                    records, summary = await session.execute_read(_run_managed_query_async, run_query, params)
+
+                if is_write:
+                    routing.update_bookmarks(await session.last_bookmarks())
+
+            if profile:
+                _record_profile(summary, query, params, execution_start)
+
+            record_success(query_class)
+            record_query(query, params, time.time() - execution_start, len(records))
+            return records
+
+        except Exception as e:
+            error_message = str(e) or e.__class__.__name__
+            log_error(f"Error in execute_query_async (attempt {attempt+1}/{max_retries}): {error_message}")
+            last_error = e
+
+            record_failure(query_class, _is_connection_error(error_message))
+
+            is_connection_error = any(err in error_message.lower() for err in _connection_error_patterns)
+            if is_connection_error:
+                log_warning("Connection issue detected, reinitializing async driver...")
+                await close_async_neo4j_connection()
+
+            if attempt < max_retries - 1:
+                wait_time = add_jitter(retry_delay * (2 ** attempt))
+                if is_connection_error:
+                    wait_time = min(wait_time * 2, 30)
+                log_info(f"Retrying async query in {wait_time:.2f} seconds... (attempt {attempt+1}/{max_retries})")
+                await asyncio.sleep(wait_time)
+
+    log_error(f"Async query failed after {max_retries} attempts: {query}")
+    if params:
+        log_error(f"Params: {params}")
+    if last_error:
+        log_error(f"Last error: {str(last_error)}")
+    if outcome is not None:
+        outcome['failed'] = True
+    record_query(query, params, time.time() - execution_start, failed=True)
+    return []
+
+async def get_product_by_id_async(product_id: str) -> Optional[Dict]:
+    """Lấy thông tin sản phẩm theo ID (async)"""
     query = """
     MATCH (p:product)
     WHERE p.id = $product_id OR p.Id = $product_id
@@ -844,11 +2392,10 @@ def get_product_by_id(product_id: str) -> Optional[Dict]:
     """
 
     try:
-        # Sử dụng cơ chế semaphore và caching
-        result = execute_query_with_semaphore(query, {'product_id': product_id}, use_cache=True)
+        result = await execute_query_async(query, {'product_id': product_id}, use_cache=True)
         return result[0]['product'] if result else None
     except Exception as e:
-        log_error(f"Error getting product by id: {str(e)}")
+        log_error(f"Error getting product by id (async): {str(e)}")
         return None
 
 def get_metrics():
@@ -886,19 +2433,48 @@ def get_metrics():
             metrics.update(size_result[0])
 
         # Thêm thông tin về cache
-        with _cache_lock:
-            metrics['cacheSize'] = len(_cache)
-            metrics['cacheEnabled'] = _cache_enabled
-            metrics['cacheTTL'] = _cache_ttl
+        metrics.update(cache_stats())
 
         # Thêm thông tin về circuit breaker
         with _circuit_breaker_lock:
             metrics['circuitBreakerState'] = _circuit_breaker_state
             metrics['circuitBreakerFailureCount'] = _circuit_breaker_failure_count
 
-        # Thêm thông tin về semaphore
-        metrics['maxConcurrentQueries'] = _max_concurrent_queries
-        metrics['availableQuerySlots'] = _query_semaphore._value
+        # Thêm thống kê định tuyến đọc/ghi và bookmark
+        metrics['routing'] = routing.routing_stats()
+
+        # Thêm thống kê của cost guard (LIMIT tự thêm, truy vấn bị từ chối)
+        metrics['costGuard'] = cost_guard_stats()
+
+        # Thêm thống kê của catalog mirror (số truy vấn trả lời tại chỗ, phiên bản catalog)
+        metrics['catalogMirror'] = catalog_mirror.mirror_stats()
+
+        # Thêm thông tin về bulkhead (circuit breaker và limiter của từng loại truy vấn)
+        bulkheads = bulkhead_stats()
+        metrics['bulkheads'] = bulkheads
+        total_limit = sum(stats['limit'] for stats in bulkheads.values())
+        total_inflight = sum(stats['inflight'] for stats in bulkheads.values())
+        metrics['maxConcurrentQueries'] = total_limit
+        metrics['availableQuerySlots'] = max(0, total_limit - total_inflight)
+        metrics['queryConcurrencyLimit'] = total_limit
+        metrics['queryInflight'] = total_inflight
+        metrics['queryQueueDepth'] = sum(stats['queueDepth'] for stats in bulkheads.values())
+        metrics['queryRejected'] = sum(stats['rejected'] for stats in bulkheads.values())
+        metrics['queryFailed'] = sum(stats['failed'] for stats in bulkheads.values())
+
+        # Thêm thông tin về tái sử dụng plan cache phía server
+        metrics.update(plan_cache_stats())
+
+        # Thêm thông tin về ghi hàng loạt
+        metrics.update(write_batch_stats())
+
+        # Thêm thông tin về gom tra cứu theo khóa
+        metrics['batchLoaders'] = loader_stats()
+
+        # Thêm thông tin về single-flight
+        with _inflight_lock:
+            metrics['coalescedQueries'] = _coalesced_query_count
+            metrics['inflightQueries'] = len(_inflight_queries)
 
         return metrics
 
@@ -918,13 +2494,25 @@ def cache_stats():
             'cacheSize': len(_cache),
             'cacheEnabled': _cache_enabled,
             'cacheTTL': _cache_ttl,
-            'cacheSizeLimit': _cache_size_limit
+            'cacheSizeLimit': _cache_size_limit,
+            'cacheBytes': _cache_bytes,
+            'cacheMaxBytes': _cache_max_bytes,
+            'cacheStaleTTL': _cache_stale_ttl
         }
 
-    # Lấy số lượng cache hit/miss
+    with _refresh_lock:
+        stats['cacheRefreshing'] = len(_refreshing_keys)
+
+    stats.update(disk_cache.stats())
+
+    # Lấy số lượng cache hit/miss/eviction
     with _cache_stats_lock:
         stats['cacheHits'] = _cache_hits
         stats['cacheMisses'] = _cache_misses
+        stats['cacheEvictions'] = _cache_evictions
+        stats['cacheStaleServed'] = _stale_served_count
+        stats['cacheBackgroundRefreshes'] = _background_refresh_count
+        stats['cacheInvalidations'] = _invalidation_count
         total = _cache_hits + _cache_misses
         stats['cacheHitRatio'] = _cache_hits / total if total > 0 else 0
         stats['cacheHitRatioPercent'] = f"{stats['cacheHitRatio'] * 100:.2f}%"
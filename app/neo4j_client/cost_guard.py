@@ -0,0 +1,385 @@
+"""
+Cypher cost guard - kiểm tra tĩnh câu truy vấn đọc trước khi gửi tới Neo4j
+Phát hiện kết quả không giới hạn (không có LIMIT), tích Descartes giữa các pattern
+không liên kết và regex không neo (=~ ".*x"); tự thêm LIMIT mặc định hoặc từ chối truy vấn
+"""
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+from ..utils.logger import log_warning
+
+# Cấu hình
+_default_limit = int(os.environ.get('NEO4J_DEFAULT_RESULT_LIMIT', 200))
+
+# Mệnh đề cấp cao nhất (không nằm trong (), [], {})
+_clause_pattern = re.compile(
+    r'\b(OPTIONAL\s+MATCH|MATCH|WHERE|WITH|RETURN|UNWIND|CALL|YIELD|UNION(?:\s+ALL)?|ORDER\s+BY|SKIP|LIMIT|'
+    r'CREATE|MERGE|SET|DETACH\s+DELETE|DELETE|REMOVE|FOREACH|LOAD\s+CSV)\b',
+    re.IGNORECASE
+)
+_write_clauses = {'CREATE', 'MERGE', 'SET', 'DELETE', 'DETACH DELETE', 'REMOVE', 'FOREACH', 'LOAD CSV'}
+_skip_pattern = re.compile(r'^\s*(EXPLAIN|PROFILE|SHOW|DROP|CALL\s+dbms\.)', re.IGNORECASE)
+
+_identifier_pattern = re.compile(r'\b([A-Za-z_]\w*)\b')
+_node_variable_pattern = re.compile(r'\(\s*([A-Za-z_]\w*)')
+_relationship_variable_pattern = re.compile(r'\[\s*([A-Za-z_]\w*)')
+_path_variable_pattern = re.compile(r'^\s*([A-Za-z_]\w*)\s*=')
+_alias_pattern = re.compile(r'^(.*?)\s+AS\s+([A-Za-z_]\w*)\s*$', re.IGNORECASE | re.DOTALL)
+_and_pattern = re.compile(r'\bAND\b', re.IGNORECASE)
+_aggregate_pattern = re.compile(
+    r'\b(count|sum|avg|min|max|collect|stDev|stDevP|percentileCont|percentileDisc)\s*\(',
+    re.IGNORECASE
+)
+# Điều kiện neo một biến vào giá trị cố định: v.prop = $param / 'chuỗi' / số
+_equality_anchor_pattern = r'\b{var}\.\w+\s*=\s*(\$\w+|\'[^\']*\'|"[^"]*"|-?\d)'
+# Regex bắt đầu bằng .* hoặc .+ (sau các flag như (?i)) không dùng được index, phải quét toàn bộ
+_unanchored_regex_pattern = re.compile(r'^(\(\?[a-zA-Z]+\))?\.[*+]')
+_regex_operand_pattern = re.compile(r'=~\s*(\'(?:[^\'\\]|\\.)*\'|"(?:[^"\\]|\\.)*"|\$\w+)')
+
+_guard_lock = threading.Lock()
+_guard_stats = {
+    'checked': 0,
+    'limitInjected': 0,
+    'rejected': 0,
+    'cartesianProducts': 0,
+    'unanchoredRegex': 0
+}
+
+class QueryCostError(ValueError):
+    """Truy vấn bị cost guard từ chối vì có thể quét hoặc trả về lượng dữ liệu không giới hạn"""
+
+    def __init__(self, message, issues=None):
+        super().__init__(message)
+        self.issues = issues or []
+
+def _mask_query(query):
+    """
+    Thay nội dung chuỗi, comment và tên trong backtick bằng ký tự trung tính (giữ nguyên độ dài)
+    để phân tích cú pháp mà không bị nhầm bởi từ khóa nằm trong chuỗi
+    """
+    masked = []
+    i = 0
+    length = len(query)
+    while i < length:
+        char = query[i]
+        if char in ('"', "'", '`'):
+            end = i + 1
+            while end < length and query[end] != char:
+                end += 2 if query[end] == '\\' and char != '`' else 1
+            end = min(end, length - 1)
+            filler = '_' if char == '`' else 'x'
+            masked.append(char + filler * (end - i - 1) + query[end])
+            i = end + 1
+        elif query.startswith('//', i):
+            end = query.find('\n', i)
+            end = length if end == -1 else end
+            masked.append(' ' * (end - i))
+            i = end
+        elif query.startswith('/*', i):
+            end = query.find('*/', i + 2)
+            end = length if end == -1 else end + 2
+            masked.append(' ' * (end - i))
+            i = end
+        else:
+            masked.append(char)
+            i += 1
+    return ''.join(masked)[:length]
+
+def _depths(text):
+    """Độ sâu lồng ngoặc tại mỗi vị trí"""
+    depths = []
+    depth = 0
+    for char in text:
+        if char in '([{':
+            depths.append(depth)
+            depth += 1
+        elif char in ')]}':
+            depth = max(depth - 1, 0)
+            depths.append(depth)
+        else:
+            depths.append(depth)
+    return depths
+
+def _split_top_level(text, separator_pattern):
+    """Tách chuỗi theo separator_pattern ở cấp cao nhất (không nằm trong ngoặc)"""
+    depths = _depths(text)
+    parts = []
+    start = 0
+    for match in separator_pattern.finditer(text):
+        if depths[match.start()] == 0:
+            parts.append(text[start:match.start()])
+            start = match.end()
+    parts.append(text[start:])
+    return [part for part in parts if part.strip()]
+
+_comma_pattern = re.compile(',')
+
+def _split_clauses(masked):
+    """Tách câu truy vấn thành các mệnh đề cấp cao nhất [(keyword, start, body_start, end)]"""
+    depths = _depths(masked)
+    positions = []
+    for match in _clause_pattern.finditer(masked):
+        if depths[match.start()] != 0:
+            continue
+        keyword = ' '.join(match.group(1).upper().split())
+        # STARTS WITH / ENDS WITH là toán tử chuỗi, không phải mệnh đề WITH
+        if keyword == 'WITH' and re.search(r'\b(STARTS|ENDS)\s*$', masked[:match.start()], re.IGNORECASE):
+            continue
+        positions.append((keyword, match.start(), match.end()))
+
+    clauses = []
+    for index, (keyword, start, body_start) in enumerate(positions):
+        end = positions[index + 1][1] if index + 1 < len(positions) else len(masked)
+        clauses.append((keyword, start, body_start, end))
+    return clauses
+
+class _Scope:
+    """Các nhóm biến liên kết với nhau trong một phần truy vấn (giữa hai mệnh đề WITH)"""
+
+    def __init__(self):
+        self.components = []  # [{'vars': set, 'anchored': bool}]
+
+    def variables(self):
+        return set().union(*(component['vars'] for component in self.components)) if self.components else set()
+
+    def add(self, variables, anchored=False):
+        """Thêm một nhóm biến, gộp với các nhóm có biến chung"""
+        merged = {'vars': set(variables), 'anchored': anchored}
+        remaining = []
+        for component in self.components:
+            if component['vars'] & merged['vars']:
+                merged['vars'] |= component['vars']
+                merged['anchored'] = merged['anchored'] or component['anchored']
+            else:
+                remaining.append(component)
+        remaining.append(merged)
+        self.components = remaining
+
+    def anchor(self, variable):
+        for component in self.components:
+            if variable in component['vars']:
+                component['anchored'] = True
+
+    def unanchored(self):
+        return [component for component in self.components if not component['anchored']]
+
+def _pattern_variables(pattern, scope_variables):
+    """Biến được khai báo hoặc tham chiếu trong một pattern, và pattern có thuộc tính neo {..} không"""
+    variables = set(_node_variable_pattern.findall(pattern))
+    variables |= set(_relationship_variable_pattern.findall(pattern))
+    path_match = _path_variable_pattern.match(pattern)
+    if path_match:
+        variables.add(path_match.group(1))
+    # Biến đã có trong scope được dùng trong thuộc tính của pattern, vd. (p {id: product_id})
+    variables |= set(_identifier_pattern.findall(pattern)) & scope_variables
+    return variables, '{' in pattern
+
+def _projected_variables(body, scope_variables):
+    """Ánh xạ {tên cũ: tên mới} các biến được WITH/YIELD chuyển tiếp nguyên vẹn"""
+    projected = {}
+    for item in _split_top_level(body, _comma_pattern):
+        item = item.strip()
+        if item == '*':
+            return {variable: variable for variable in scope_variables}
+        alias_match = _alias_pattern.match(item)
+        source, alias = (alias_match.group(1).strip(), alias_match.group(2)) if alias_match else (item, item)
+        if re.fullmatch(r'[A-Za-z_]\w*', source) and source in scope_variables:
+            projected[source] = alias
+    return projected
+
+def _find_cartesian_products(masked, clauses):
+    """Tìm các phần truy vấn có từ hai nhóm pattern không liên kết và không được neo trở lên"""
+    products = []
+    scope = _Scope()
+
+    def check_scope():
+        unanchored = scope.unanchored()
+        if len(unanchored) > 1:
+            products.append([sorted(component['vars']) for component in unanchored])
+
+    for keyword, start, body_start, end in clauses:
+        body = masked[body_start:end]
+
+        if keyword in ('MATCH', 'OPTIONAL MATCH'):
+            for pattern in _split_top_level(body, _comma_pattern):
+                variables, anchored = _pattern_variables(pattern, scope.variables())
+                if variables:
+                    scope.add(variables, anchored)
+
+        elif keyword == 'WHERE':
+            scope_variables = scope.variables()
+            for conjunct in _split_top_level(body, _and_pattern):
+                referenced = set(_identifier_pattern.findall(conjunct)) & scope_variables
+                if len(referenced) > 1:
+                    # Điều kiện join giữa các nhóm, vd. od.order_id = o.id
+                    scope.add(referenced)
+                for variable in referenced:
+                    if re.search(_equality_anchor_pattern.format(var=re.escape(variable)), conjunct):
+                        scope.anchor(variable)
+
+        elif keyword in ('UNWIND', 'YIELD'):
+            # Biến từ danh sách/procedure có kích thước do tham số quyết định - coi như đã neo
+            if keyword == 'UNWIND':
+                alias_match = _alias_pattern.match(body.strip())
+                new_variables = [alias_match.group(2)] if alias_match else []
+            else:
+                where_parts = re.split(r'\bWHERE\b', body, maxsplit=1, flags=re.IGNORECASE)
+                new_variables = [
+                    (_alias_pattern.match(item.strip()).group(2) if _alias_pattern.match(item.strip()) else item.strip())
+                    for item in _split_top_level(where_parts[0], _comma_pattern)
+                ]
+            for variable in new_variables:
+                if re.fullmatch(r'[A-Za-z_]\w*', variable):
+                    scope.add({variable}, anchored=True)
+
+        elif keyword in ('WITH', 'RETURN', 'UNION', 'UNION ALL'):
+            check_scope()
+            if keyword == 'WITH':
+                projected = _projected_variables(body, scope.variables())
+                new_scope = _Scope()
+                for component in scope.components:
+                    carried = {projected[variable] for variable in component['vars'] if variable in projected}
+                    if carried:
+                        new_scope.components.append({'vars': carried, 'anchored': component['anchored']})
+                scope = new_scope
+            else:
+                scope = _Scope()
+
+    check_scope()
+    return products
+
+def _is_aggregate_only(return_body):
+    """RETURN chỉ gồm hàm gom nhóm (vd. RETURN count(p)) - kết quả luôn là một hàng"""
+    body = re.split(r'\b(ORDER\s+BY|SKIP|LIMIT)\b', return_body, maxsplit=1, flags=re.IGNORECASE)[0]
+    body = re.sub(r'^\s*DISTINCT\b', '', body, flags=re.IGNORECASE)
+    items = _split_top_level(body, _comma_pattern)
+    return bool(items) and all(_aggregate_pattern.search(item) for item in items)
+
+def _find_unbounded_returns(clauses):
+    """Vị trí cuối của các nhánh (tách bởi UNION) có RETURN nhưng không có LIMIT"""
+    unbounded = []
+    branch = []
+    for clause in clauses + [('UNION', None, None, None)]:
+        if clause[0] in ('UNION', 'UNION ALL'):
+            keywords = [item[0] for item in branch]
+            if 'RETURN' in keywords:
+                last_return = len(keywords) - 1 - keywords[::-1].index('RETURN')
+                has_limit = 'LIMIT' in keywords[last_return:]
+                return_clause = branch[last_return]
+                return_body = return_clause[4]
+                if not has_limit and not _is_aggregate_only(return_body):
+                    unbounded.append(branch[-1][3])
+            branch = []
+        else:
+            branch.append(clause)
+    return unbounded
+
+def _find_unanchored_regex(query, params):
+    """Các regex (literal hoặc $param) bắt đầu bằng .* / .+"""
+    found = []
+    for match in _regex_operand_pattern.finditer(query):
+        operand = match.group(1)
+        if operand.startswith('$'):
+            value = (params or {}).get(operand[1:])
+            if not isinstance(value, str):
+                continue
+        else:
+            value = operand[1:-1]
+        if _unanchored_regex_pattern.match(value):
+            found.append(value)
+    return found
+
+def analyze_query(query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Phân tích tĩnh chi phí của một câu truy vấn
+
+    Returns:
+        Dict: isWrite, unboundedReturns (vị trí cần thêm LIMIT), cartesianProducts
+        (các nhóm biến không liên kết), unanchoredRegex (các regex không neo)
+    """
+    masked = _mask_query(query)
+    clauses = _split_clauses(masked)
+    clauses = [(keyword, start, body_start, end, masked[body_start:end])
+               for keyword, start, body_start, end in clauses]
+
+    is_write = any(clause[0] in _write_clauses for clause in clauses)
+    analysis = {
+        'isWrite': is_write,
+        'unboundedReturns': [],
+        'cartesianProducts': [],
+        'unanchoredRegex': _find_unanchored_regex(query, params)
+    }
+    if is_write or _skip_pattern.match(query):
+        return analysis
+
+    analysis['unboundedReturns'] = _find_unbounded_returns(clauses)
+    analysis['cartesianProducts'] = _find_cartesian_products(
+        masked, [clause[:4] for clause in clauses]
+    )
+    return analysis
+
+def _record(key, count=1):
+    with _guard_lock:
+        _guard_stats[key] += count
+
+def guard_query(query: str, params: Optional[Dict[str, Any]] = None, default_limit: Optional[int] = None) -> str:
+    """
+    Kiểm tra câu truy vấn đọc trước khi thực thi
+
+    Tích Descartes và regex không neo bị từ chối; nhánh RETURN không có LIMIT được thêm
+    LIMIT mặc định (NEO4J_DEFAULT_RESULT_LIMIT). Truy vấn ghi chỉ bị kiểm tra regex.
+
+    Args:
+        query: Câu truy vấn Cypher
+        params: Tham số của truy vấn (dùng để kiểm tra regex truyền qua $param)
+        default_limit: LIMIT thêm vào các nhánh không giới hạn
+
+    Returns:
+        str: Câu truy vấn (đã thêm LIMIT nếu cần)
+
+    Raises:
+        QueryCostError: Nếu truy vấn có tích Descartes hoặc regex không neo
+    """
+    _record('checked')
+    analysis = analyze_query(query, params)
+
+    issues = []
+    if analysis['cartesianProducts']:
+        _record('cartesianProducts')
+        groups = '; '.join(' / '.join(', '.join(group) for group in product)
+                           for product in analysis['cartesianProducts'])
+        issues.append(f"tích Descartes giữa các pattern không liên kết ({groups}) - "
+                      f"hãy nối chúng bằng quan hệ hoặc điều kiện WHERE")
+    if analysis['unanchoredRegex']:
+        _record('unanchoredRegex')
+        issues.append(f"regex không neo {analysis['unanchoredRegex']} phải quét toàn bộ node - "
+                      f"hãy dùng CONTAINS/STARTS WITH hoặc full-text index")
+
+    if issues:
+        _record('rejected')
+        raise QueryCostError("Truy vấn bị từ chối bởi cost guard: " + "; ".join(issues), issues)
+
+    if not analysis['unboundedReturns']:
+        return query
+
+    limit = default_limit or _default_limit
+    _record('limitInjected')
+    log_warning(f"Truy vấn không có LIMIT, tự động thêm LIMIT {limit}")
+
+    # Chèn từ cuối lên để vị trí các nhánh trước không bị dịch
+    guarded = query
+    for position in sorted(analysis['unboundedReturns'], reverse=True):
+        head = guarded[:position].rstrip()
+        semicolon = head.endswith(';')
+        if semicolon:
+            head = head[:-1].rstrip()
+        guarded = f"{head}\nLIMIT {limit}{';' if semicolon else ''}\n{guarded[position:].lstrip()}"
+    return guarded
+
+def cost_guard_stats() -> Dict[str, Any]:
+    """Thống kê của cost guard"""
+    with _guard_lock:
+        stats = dict(_guard_stats)
+    stats['defaultLimit'] = _default_limit
+    return stats
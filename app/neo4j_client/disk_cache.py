@@ -0,0 +1,378 @@
+"""
+Neo4j query result disk cache - tầng cache thứ hai nằm sau cache bộ nhớ
+Lưu kết quả truy vấn vào SQLite (WAL) để giữ cache qua các lần khởi động lại,
+tránh việc mỗi lần deploy đều phải truy vấn lại catalog từ Neo4j.
+Các mục được ghi ở background (write-behind) nên việc lưu vào cache bộ nhớ không phải
+chờ pickle và SQLite.
+"""
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from ..utils.logger import log_info, log_error, log_warning
+
+# Cấu hình - tắt mặc định, bật bằng NEO4J_DISK_CACHE=1
+_disk_cache_enabled = os.environ.get('NEO4J_DISK_CACHE', '0').lower() in ('1', 'true', 'yes')
+_disk_cache_path = os.environ.get(
+    'NEO4J_DISK_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'neo4j_query_cache.sqlite3')
+)
+_disk_cache_max_bytes = int(os.environ.get('NEO4J_DISK_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+_disk_cache_max_age = int(os.environ.get('NEO4J_DISK_CACHE_MAX_AGE', 24 * 3600))  # Tuổi tối đa của một mục (giây)
+_write_queue_max = int(os.environ.get('NEO4J_DISK_CACHE_WRITE_QUEUE', 1000))  # Số mục tối đa chờ ghi
+
+# Kết nối SQLite mở lazy ở lần truy cập đầu tiên, dùng chung giữa các thread
+_connection = None
+_connection_lock = threading.Lock()
+_open_failed = False  # Không thử mở lại nếu lần mở đầu tiên thất bại
+_total_bytes = 0
+
+# Hàng đợi ghi: {key: (data, ttl, stale_ttl, tags, created)}, ghi xuống SQLite bởi writer thread.
+# _write_epoch tăng mỗi lần xóa/invalidate để writer bỏ các mục đã lấy ra trước khi bị invalidate
+_pending_writes = OrderedDict()
+_pending_condition = threading.Condition()
+_write_epoch = 0
+_writer_thread = None
+
+# Thống kê
+_disk_hits = 0
+_disk_misses = 0
+_disk_writes = 0
+_disk_evictions = 0
+_dropped_writes = 0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_cache (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    ttl REAL NOT NULL,
+    stale_ttl REAL NOT NULL,
+    tags TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_query_cache_accessed ON query_cache(accessed);
+CREATE INDEX IF NOT EXISTS idx_query_cache_expires ON query_cache(expires);
+"""
+
+def is_enabled():
+    """Tầng cache đĩa có được bật và sử dụng được không"""
+    return _disk_cache_enabled and not _open_failed
+
+def _get_connection():
+    """Mở (lazy) kết nối SQLite và dọn các mục hết hạn (gọi khi đã giữ _connection_lock)"""
+    global _connection, _open_failed, _total_bytes
+
+    if _connection is not None or _open_failed:
+        return _connection
+
+    try:
+        directory = os.path.dirname(_disk_cache_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        connection = sqlite3.connect(_disk_cache_path, timeout=5, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+
+        # Dọn các mục đã hết hạn từ lần chạy trước
+        purged = connection.execute("DELETE FROM query_cache WHERE expires < ?", (time.time(),)).rowcount
+        _total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM query_cache").fetchone()[0]
+        count = connection.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+
+        _connection = connection
+        log_info(f"Disk query cache opened at {_disk_cache_path}: {count} entries, "
+                 f"{_total_bytes} bytes ({purged} expired entries purged)")
+    except Exception as e:
+        _open_failed = True
+        log_error(f"Could not open disk query cache, disabling it: {str(e)}")
+
+    return _connection
+
+def get(key):
+    """
+    Lấy một mục từ cache đĩa
+
+    Returns:
+        Dict {data, ttl, stale_ttl, tags, created} hoặc None nếu không có/đã hết hạn
+    """
+    global _disk_hits, _disk_misses
+
+    if not is_enabled() or key is None:
+        return None
+
+    with _connection_lock:
+        connection = _get_connection()
+        if connection is None:
+            return None
+
+        try:
+            now = time.time()
+            row = connection.execute(
+                "SELECT data, created, ttl, stale_ttl, tags FROM query_cache WHERE key = ? AND expires >= ?",
+                (key, now)
+            ).fetchone()
+
+            if row is None:
+                _disk_misses += 1
+                return None
+
+            connection.execute("UPDATE query_cache SET accessed = ? WHERE key = ?", (now, key))
+            _disk_hits += 1
+        except Exception as e:
+            log_error(f"Error reading disk query cache: {str(e)}")
+            return None
+
+    data, created, ttl, stale_ttl, tags = row
+    try:
+        return {
+            'data': pickle.loads(data),
+            'ttl': ttl,
+            'stale_ttl': stale_ttl,
+            'tags': frozenset(tag for tag in tags.split(',') if tag),
+            'created': created
+        }
+    except Exception as e:
+        log_warning(f"Corrupted disk cache entry, dropping it: {str(e)}")
+        delete(key)
+        return None
+
+def put(key, data, ttl, stale_ttl=0, tags=None):
+    """
+    Xếp một mục vào hàng đợi ghi cache đĩa
+
+    Writer thread pickle và ghi mục xuống SQLite ở background. Mục bị bỏ nếu hàng đợi đầy;
+    put lại cùng key trước khi được ghi chỉ giữ giá trị mới nhất.
+    """
+    global _writer_thread, _dropped_writes
+
+    if not is_enabled() or key is None:
+        return
+
+    with _pending_condition:
+        if key not in _pending_writes and len(_pending_writes) >= _write_queue_max:
+            _dropped_writes += 1
+            return
+
+        _pending_writes[key] = (data, ttl, stale_ttl, tags, time.time())
+        _pending_writes.move_to_end(key)
+
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name="neo4j-disk-cache-writer", daemon=True)
+            _writer_thread.start()
+        _pending_condition.notify()
+
+def _take_pending_writes():
+    """Lấy toàn bộ hàng đợi ghi kèm epoch hiện tại (gọi khi đã giữ _pending_condition)"""
+    batch = list(_pending_writes.items())
+    _pending_writes.clear()
+    return batch, _write_epoch
+
+def _writer_loop():
+    while True:
+        with _pending_condition:
+            while not _pending_writes:
+                _pending_condition.wait()
+            batch, epoch = _take_pending_writes()
+        _write_batch(batch, epoch)
+
+def _write_batch(batch, epoch):
+    """Ghi một lô mục xuống SQLite, loại các mục ít được dùng nhất nếu vượt giới hạn dung lượng"""
+    global _total_bytes, _disk_writes, _dropped_writes
+
+    rows = []
+    for key, (data, ttl, stale_ttl, tags, created) in batch:
+        try:
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            log_warning(f"Result cannot be stored in disk cache: {str(e)}")
+            continue
+
+        if len(blob) > _disk_cache_max_bytes:
+            continue
+
+        expires = created + min(max(ttl * 2, ttl + stale_ttl), _disk_cache_max_age)
+        # Bọc bằng dấu phẩy để tìm tag chính xác bằng LIKE
+        tag_text = ',' + ','.join(sorted(tags or ())) + ','
+        rows.append((key, sqlite3.Binary(blob), len(blob), created, expires, created, ttl, stale_ttl, tag_text))
+
+    if not rows:
+        return
+
+    with _connection_lock:
+        with _pending_condition:
+            if epoch != _write_epoch:
+                # Cache bị xóa/invalidate sau khi lô được lấy ra: các mục có thể đã cũ
+                _dropped_writes += len(rows)
+                return
+
+        connection = _get_connection()
+        if connection is None:
+            return
+
+        try:
+            for row in rows:
+                previous = connection.execute("SELECT size FROM query_cache WHERE key = ?", (row[0],)).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO query_cache (key, data, size, created, expires, accessed, ttl, stale_ttl, tags) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                _total_bytes += row[2] - (previous[0] if previous else 0)
+                _disk_writes += 1
+
+            if _total_bytes > _disk_cache_max_bytes:
+                _evict(connection)
+        except Exception as e:
+            log_error(f"Error writing disk query cache: {str(e)}")
+
+def _discard_pending_writes(matches):
+    """Bỏ các mục đang chờ ghi khớp matches(key, tags) và tăng epoch (trước khi xóa trên SQLite)"""
+    global _write_epoch
+
+    with _pending_condition:
+        for key in [key for key, entry in _pending_writes.items() if matches(key, entry[3] or ())]:
+            del _pending_writes[key]
+        _write_epoch += 1
+
+def _evict(connection):
+    """Loại các mục hết hạn rồi các mục ít được dùng nhất cho tới 90% giới hạn (gọi khi đã giữ lock)"""
+    global _total_bytes, _disk_evictions
+
+    evicted = connection.execute("DELETE FROM query_cache WHERE expires < ?", (time.time(),)).rowcount
+    _total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM query_cache").fetchone()[0]
+
+    target = int(_disk_cache_max_bytes * 0.9)
+    if _total_bytes > target:
+        rows = connection.execute("SELECT key, size FROM query_cache ORDER BY accessed ASC").fetchall()
+        victims = []
+        for key, size in rows:
+            if _total_bytes <= target:
+                break
+            victims.append((key,))
+            _total_bytes -= size
+        connection.executemany("DELETE FROM query_cache WHERE key = ?", victims)
+        evicted += len(victims)
+
+    _disk_evictions += evicted
+
+def delete(key):
+    """Xóa một mục khỏi cache đĩa"""
+    global _total_bytes
+
+    if not is_enabled() or key is None:
+        return
+
+    _discard_pending_writes(lambda pending_key, tags: pending_key == key)
+
+    with _connection_lock:
+        connection = _get_connection()
+        if connection is None:
+            return
+        try:
+            row = connection.execute("SELECT size FROM query_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                connection.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+                _total_bytes -= row[0]
+        except Exception as e:
+            log_error(f"Error deleting disk cache entry: {str(e)}")
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def invalidate_tags(tags, wildcard_tag='*'):
+    """Xóa các mục có tag nằm trong tags (và các mục wildcard); '*' trong tags xóa toàn bộ"""
+    global _total_bytes
+
+    if not is_enabled():
+        return 0
+
+    tags = set(tags)
+    if wildcard_tag in tags:
+        return clear()
+
+    _discard_pending_writes(lambda key, entry_tags: wildcard_tag in entry_tags or not tags.isdisjoint(entry_tags))
+
+    # Tag như order_detail chứa '_', là ký tự đại diện của LIKE: escape để so khớp chính xác
+    conditions = ' OR '.join(["tags LIKE ? ESCAPE '\\'"] * (len(tags) + 1))
+    patterns = [f'%,{_escape_like(tag)},%' for tag in tags] + [f'%,{_escape_like(wildcard_tag)},%']
+
+    with _connection_lock:
+        connection = _get_connection()
+        if connection is None:
+            return 0
+        try:
+            removed = connection.execute(f"DELETE FROM query_cache WHERE {conditions}", patterns).rowcount
+            _total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM query_cache").fetchone()[0]
+            return removed
+        except Exception as e:
+            log_error(f"Error invalidating disk query cache: {str(e)}")
+            return 0
+
+def clear():
+    """Xóa toàn bộ cache đĩa"""
+    global _total_bytes
+
+    if not is_enabled():
+        return 0
+
+    _discard_pending_writes(lambda key, tags: True)
+
+    with _connection_lock:
+        connection = _get_connection()
+        if connection is None:
+            return 0
+        try:
+            removed = connection.execute("DELETE FROM query_cache").rowcount
+            _total_bytes = 0
+            return removed
+        except Exception as e:
+            log_error(f"Error clearing disk query cache: {str(e)}")
+            return 0
+
+def flush():
+    """Ghi ngay các mục đang chờ trong hàng đợi ghi"""
+    with _pending_condition:
+        batch, epoch = _take_pending_writes()
+    if batch:
+        _write_batch(batch, epoch)
+
+def close():
+    """Ghi các mục đang chờ rồi đóng kết nối SQLite (mở lại lazy ở lần truy cập sau)"""
+    global _connection
+
+    if is_enabled():
+        flush()
+
+    with _connection_lock:
+        if _connection is not None:
+            try:
+                _connection.close()
+            except Exception as e:
+                log_error(f"Error closing disk query cache: {str(e)}")
+            finally:
+                _connection = None
+
+def stats():
+    """Lấy thống kê về cache đĩa"""
+    with _pending_condition:
+        pending = len(_pending_writes)
+
+    with _connection_lock:
+        return {
+            'diskCacheEnabled': is_enabled(),
+            'diskCachePath': _disk_cache_path,
+            'diskCacheBytes': _total_bytes,
+            'diskCacheMaxBytes': _disk_cache_max_bytes,
+            'diskCacheHits': _disk_hits,
+            'diskCacheMisses': _disk_misses,
+            'diskCacheWrites': _disk_writes,
+            'diskCacheEvictions': _disk_evictions,
+            'diskCachePendingWrites': pending,
+            'diskCacheDroppedWrites': _dropped_writes
+        }
@@ -0,0 +1,135 @@
+"""
+Neo4j index bootstrap - tạo các index cần thiết (nếu chưa có) khi khởi động
+Gồm range index cho các thuộc tính tra cứu chính xác, text index và full-text
+index cho tìm kiếm tên sản phẩm, danh mục và cửa hàng thay cho regex scan
+"""
+import os
+import time
+import threading
+from ..utils.logger import log_info, log_error, log_warning
+
+# Bật/tắt bằng biến môi trường (mặc định bật)
+_bootstrap_enabled = os.environ.get('NEO4J_BOOTSTRAP_INDEXES', '1').lower() in ('1', 'true', 'yes')
+
+# Full-text index dùng cho tìm kiếm tên
+PRODUCT_SEARCH_INDEX = "product_search"
+CATEGORY_SEARCH_INDEX = "category_search"
+STORE_SEARCH_INDEX = "store_search"
+
+# (tên index, câu lệnh tạo)
+INDEX_DEFINITIONS = [
+    # Range index cho tra cứu chính xác / sắp xếp
+    ("product_id", "CREATE INDEX product_id IF NOT EXISTS FOR (p:Product) ON (p.id)"),
+    ("product_name", "CREATE INDEX product_name IF NOT EXISTS FOR (p:Product) ON (p.name)"),
+    ("customer_id", "CREATE INDEX customer_id IF NOT EXISTS FOR (c:Customer) ON (c.id)"),
+    ("variant_sales_rank", "CREATE INDEX variant_sales_rank IF NOT EXISTS FOR (v:Variant) ON (v.sales_rank)"),
+    # Text index cho CONTAINS / STARTS WITH
+    ("product_name_text", "CREATE TEXT INDEX product_name_text IF NOT EXISTS FOR (p:Product) ON (p.name)"),
+    ("category_name_text", "CREATE TEXT INDEX category_name_text IF NOT EXISTS FOR (c:Category) ON (c.name_cat)"),
+    # Full-text index cho tìm kiếm tên có xếp hạng theo score
+    (PRODUCT_SEARCH_INDEX,
+     f"CREATE FULLTEXT INDEX {PRODUCT_SEARCH_INDEX} IF NOT EXISTS FOR (p:Product) ON EACH [p.name, p.descriptions]"),
+    (CATEGORY_SEARCH_INDEX,
+     f"CREATE FULLTEXT INDEX {CATEGORY_SEARCH_INDEX} IF NOT EXISTS FOR (c:Category) ON EACH [c.name_cat, c.description]"),
+    # Dữ liệu cửa hàng dùng cả label Store (name) và store (name_store)
+    (STORE_SEARCH_INDEX,
+     f"CREATE FULLTEXT INDEX {STORE_SEARCH_INDEX} IF NOT EXISTS FOR (s:Store|store) ON EACH [s.name, s.name_store, s.address]"),
+]
+
+# Trạng thái index đã biết {tên: state}, cập nhật khi bootstrap và định kỳ sau đó
+_index_states = {}
+_index_states_lock = threading.Lock()
+_last_index_check = None
+_index_check_interval = 60  # Kiểm tra lại trạng thái index chưa ONLINE sau mỗi khoảng này (giây)
+_bootstrap_done = False
+
+def ensure_indexes(driver):
+    """
+    Tạo các index còn thiếu và ghi nhận trạng thái index (chỉ chạy một lần mỗi process)
+
+    Dùng trực tiếp driver vừa kết nối vì được gọi trong quá trình khởi tạo kết nối.
+
+    Args:
+        driver: Neo4j driver đã kết nối
+    """
+    global _bootstrap_done
+
+    if _bootstrap_done or driver is None:
+        return
+    _bootstrap_done = True
+
+    if not _bootstrap_enabled:
+        log_info("Neo4j index bootstrap disabled")
+        return
+
+    created = 0
+    with driver.session() as session:
+        for name, statement in INDEX_DEFINITIONS:
+            try:
+                session.run(statement).consume()
+                created += 1
+            except Exception as e:
+                # Không có quyền tạo index hoặc phiên bản Neo4j không hỗ trợ loại index này
+                log_warning(f"Could not ensure index '{name}': {str(e)}")
+
+        try:
+            records = session.run("SHOW INDEXES YIELD name, state RETURN name, state").data()
+            _update_index_states(records)
+        except Exception as e:
+            log_warning(f"Could not read index states: {str(e)}")
+
+    log_info(f"Neo4j index bootstrap finished: {created}/{len(INDEX_DEFINITIONS)} index statements applied")
+
+def _update_index_states(records):
+    global _last_index_check
+
+    with _index_states_lock:
+        _index_states.clear()
+        for record in records:
+            _index_states[record.get('name')] = record.get('state')
+        _last_index_check = time.time()
+
+def refresh_index_states():
+    """Đọc lại trạng thái index từ Neo4j (ví dụ khi index đang POPULATING)"""
+    from .connection import execute_query_with_semaphore
+
+    records = execute_query_with_semaphore(
+        "SHOW INDEXES YIELD name, state RETURN name, state",
+        use_cache=False,
+        max_retries=1
+    )
+    if records:
+        _update_index_states(records)
+
+def has_index(name):
+    """
+    Index đã ONLINE và dùng được chưa
+
+    Nếu index chưa ONLINE, trạng thái được kiểm tra lại sau mỗi _index_check_interval giây.
+    """
+    global _last_index_check
+
+    with _index_states_lock:
+        state = _index_states.get(name)
+        if state == 'ONLINE':
+            return True
+
+        should_refresh = _last_index_check is None or time.time() - _last_index_check > _index_check_interval
+        if should_refresh:
+            # Đánh dấu trước để chỉ một thread làm mới
+            _last_index_check = time.time()
+
+    if should_refresh:
+        try:
+            refresh_index_states()
+        except Exception as e:
+            log_error(f"Error refreshing index states: {str(e)}")
+        with _index_states_lock:
+            state = _index_states.get(name)
+
+    return state == 'ONLINE'
+
+def index_states():
+    """Lấy trạng thái các index đã biết"""
+    with _index_states_lock:
+        return dict(_index_states)
@@ -0,0 +1,171 @@
+"""
+Query profiler - chạy PROFILE cho 1/N truy vấn đọc (opt-in)
+Ghi nhận db hits, page cache hits/misses và cây operator theo fingerprint truy vấn,
+giữ lại các plan tốn kém nhất để xem qua monitoring blueprint
+"""
+import os
+import re
+import time
+import threading
+from .query_stats import fingerprint
+
+# Cấu hình - tắt mặc định, bật bằng NEO4J_PROFILE_SAMPLE_RATE=N (profile 1/N truy vấn)
+_sample_rate = int(os.environ.get('NEO4J_PROFILE_SAMPLE_RATE', 0))
+_worst_plans_size = int(os.environ.get('NEO4J_PROFILE_WORST_PLANS', 20))
+_max_fingerprints = 1000
+_max_details_length = 300  # Độ dài tối đa phần mô tả của mỗi operator
+
+# Truy vấn không profile: ghi dữ liệu, đã có EXPLAIN/PROFILE, lệnh quản trị
+_skip_pattern = re.compile(
+    r'^\s*(PROFILE|EXPLAIN|SHOW|CREATE\s+(INDEX|TEXT|FULLTEXT|CONSTRAINT)|DROP|CALL\s+dbms\.)',
+    re.IGNORECASE
+)
+
+_profile_lock = threading.Lock()
+_query_counter = 0
+_profiled_count = 0
+_fingerprint_profiles = {}  # {fingerprint id: dict thống kê}
+_worst_plans = []  # Các plan có nhiều db hits nhất, sắp xếp giảm dần
+
+def is_enabled():
+    return _sample_rate > 0
+
+def should_profile(query, is_write=False):
+    """Truy vấn này có được chọn để chạy PROFILE không (1/N truy vấn đọc)"""
+    global _query_counter
+
+    if _sample_rate <= 0 or is_write or _skip_pattern.match(query):
+        return False
+
+    with _profile_lock:
+        _query_counter += 1
+        return _query_counter % _sample_rate == 0
+
+def profiled_query(query):
+    """Thêm tiền tố PROFILE vào câu truy vấn"""
+    return f"PROFILE {query}"
+
+def _summarize_operator(operator):
+    """Rút gọn một node của cây profile và tính tổng db hits/page cache của cả nhánh"""
+    args = operator.get('args') or {}
+    children = [_summarize_operator(child) for child in operator.get('children') or []]
+
+    details = args.get('Details') or args.get('details') or ''
+    if len(details) > _max_details_length:
+        details = details[:_max_details_length] + '...'
+
+    node = {
+        'operator': operator.get('operatorType') or operator.get('operator_type'),
+        'details': details,
+        'rows': operator.get('rows', 0),
+        'dbHits': operator.get('dbHits', operator.get('db_hits', 0)),
+        'pageCacheHits': operator.get('pageCacheHits', operator.get('page_cache_hits', 0)),
+        'pageCacheMisses': operator.get('pageCacheMisses', operator.get('page_cache_misses', 0)),
+        'children': children
+    }
+    node['totalDbHits'] = node['dbHits'] + sum(child['totalDbHits'] for child in children)
+    node['totalPageCacheHits'] = node['pageCacheHits'] + sum(child['totalPageCacheHits'] for child in children)
+    node['totalPageCacheMisses'] = node['pageCacheMisses'] + sum(child['totalPageCacheMisses'] for child in children)
+    return node
+
+def record_profile(query, params, profile, duration):
+    """
+    Ghi nhận kết quả PROFILE của một truy vấn
+
+    Args:
+        query: Câu truy vấn gốc (không có tiền tố PROFILE)
+        params: Tham số của truy vấn
+        profile: ResultSummary.profile (dict) do driver trả về
+        duration: Thời gian thực thi (giây)
+    """
+    global _profiled_count
+
+    if not profile:
+        return
+
+    fingerprint_id, normalized = fingerprint(query)
+    plan = _summarize_operator(profile)
+    db_hits = plan['totalDbHits']
+
+    entry = {
+        'fingerprint': fingerprint_id,
+        'query': query,
+        'params': {key: repr(value)[:200] for key, value in (params or {}).items()},
+        'durationMs': round(duration * 1000, 2),
+        'dbHits': db_hits,
+        'pageCacheHits': plan['totalPageCacheHits'],
+        'pageCacheMisses': plan['totalPageCacheMisses'],
+        'rows': plan['rows'],
+        'plan': plan,
+        'timestamp': time.time()
+    }
+
+    with _profile_lock:
+        _profiled_count += 1
+
+        stats = _fingerprint_profiles.get(fingerprint_id)
+        if stats is None:
+            if len(_fingerprint_profiles) >= _max_fingerprints:
+                stats = None
+            else:
+                stats = {
+                    'fingerprint': fingerprint_id,
+                    'query': normalized,
+                    'samples': 0,
+                    'totalDbHits': 0,
+                    'maxDbHits': 0,
+                    'totalPageCacheHits': 0,
+                    'totalPageCacheMisses': 0,
+                    'worstPlan': None
+                }
+                _fingerprint_profiles[fingerprint_id] = stats
+
+        if stats is not None:
+            stats['samples'] += 1
+            stats['totalDbHits'] += db_hits
+            stats['totalPageCacheHits'] += entry['pageCacheHits']
+            stats['totalPageCacheMisses'] += entry['pageCacheMisses']
+            if stats['worstPlan'] is None or db_hits >= stats['maxDbHits']:
+                stats['maxDbHits'] = db_hits
+                stats['worstPlan'] = entry
+
+        # Giữ _worst_plans_size plan tốn kém nhất, mỗi fingerprint một plan
+        _worst_plans[:] = [plan_entry for plan_entry in _worst_plans
+                           if plan_entry['fingerprint'] != fingerprint_id or plan_entry['dbHits'] > db_hits]
+        if not any(plan_entry['fingerprint'] == fingerprint_id for plan_entry in _worst_plans):
+            _worst_plans.append(entry)
+        _worst_plans.sort(key=lambda plan_entry: plan_entry['dbHits'], reverse=True)
+        del _worst_plans[_worst_plans_size:]
+
+def get_profile_stats(limit=50, include_plans=True):
+    """Lấy thống kê PROFILE theo fingerprint và các plan tốn kém nhất"""
+    with _profile_lock:
+        fingerprints = []
+        for stats in _fingerprint_profiles.values():
+            item = dict(stats)
+            item['avgDbHits'] = round(stats['totalDbHits'] / stats['samples'], 2) if stats['samples'] > 0 else 0
+            if not include_plans:
+                item.pop('worstPlan', None)
+            fingerprints.append(item)
+        worst_plans = list(_worst_plans) if include_plans else [
+            {key: value for key, value in entry.items() if key != 'plan'} for entry in _worst_plans
+        ]
+        profiled = _profiled_count
+
+    fingerprints.sort(key=lambda item: item['totalDbHits'], reverse=True)
+    return {
+        'enabled': is_enabled(),
+        'sampleRate': _sample_rate,
+        'profiledQueries': profiled,
+        'fingerprints': fingerprints[:limit],
+        'worstPlans': worst_plans
+    }
+
+def reset_profile_stats():
+    """Xóa toàn bộ thống kê PROFILE"""
+    global _profiled_count
+
+    with _profile_lock:
+        _fingerprint_profiles.clear()
+        _worst_plans.clear()
+        _profiled_count = 0
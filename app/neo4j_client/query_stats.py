@@ -0,0 +1,193 @@
+"""
+Query statistics - thống kê truy vấn Neo4j theo fingerprint
+Fingerprint là câu truy vấn đã chuẩn hóa (bỏ literal, gộp khoảng trắng), nên mọi lần chạy
+của cùng một template được gom chung: histogram độ trễ, số hàng, số lỗi và các lần chạy chậm nhất
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import deque
+
+# Cấu hình
+_slow_query_threshold_ms = float(os.environ.get('NEO4J_SLOW_QUERY_MS', 500))
+_slow_query_log_size = int(os.environ.get('NEO4J_SLOW_QUERY_LOG_SIZE', 100))
+_max_fingerprints = 1000  # Giới hạn số fingerprint được theo dõi
+_max_param_length = 200  # Độ dài tối đa của mỗi tham số khi lưu vào slow log
+
+# Biên trên của các bucket histogram độ trễ (ms), bucket cuối là +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_string_literal_pattern = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_number_literal_pattern = re.compile(r'(?<![\w$.])-?\d+(?:\.\d+)?(?![\w.])')
+_literal_list_pattern = re.compile(r'\[\s*\?(?:\s*,\s*\?)*\s*\]')
+_whitespace_pattern = re.compile(r'\s+')
+
+_stats_lock = threading.Lock()
+_fingerprints = {}  # {fingerprint id: _FingerprintStats}
+_slow_queries = deque(maxlen=_slow_query_log_size)  # Ring buffer các lần chạy chậm
+_untracked_count = 0  # Số lần chạy không được theo dõi do vượt _max_fingerprints
+
+def normalize_query(query):
+    """Chuẩn hóa câu truy vấn: literal chuỗi/số thành ?, danh sách literal thành [?], gộp khoảng trắng"""
+    text = _string_literal_pattern.sub('?', query)
+    text = _number_literal_pattern.sub('?', text)
+    text = _literal_list_pattern.sub('[?]', text)
+    return _whitespace_pattern.sub(' ', text).strip()
+
+def fingerprint(query):
+    """Lấy (id, câu truy vấn chuẩn hóa) của một câu truy vấn"""
+    normalized = normalize_query(query)
+    return hashlib.md5(normalized.encode()).hexdigest()[:16], normalized
+
+class _FingerprintStats:
+    """Thống kê của một fingerprint"""
+    __slots__ = ('query', 'count', 'errors', 'rows', 'total_ms', 'min_ms', 'max_ms', 'buckets', 'last_seen')
+
+    def __init__(self, query):
+        self.query = query
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.last_seen = None
+
+    def record(self, duration_ms, rows, failed):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.min_ms = duration_ms if self.min_ms is None else min(self.min_ms, duration_ms)
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.last_seen = time.time()
+        if failed:
+            self.errors += 1
+        else:
+            self.rows += rows
+
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        """Ước tính percentile từ histogram (biên trên của bucket chứa percentile)"""
+        if self.count == 0:
+            return 0
+        target = fraction * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.buckets):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self, fingerprint_id):
+        successes = self.count - self.errors
+        histogram = {f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)}
+        histogram['le_inf'] = self.buckets[-1]
+        return {
+            'fingerprint': fingerprint_id,
+            'query': self.query,
+            'count': self.count,
+            'errors': self.errors,
+            'errorRate': self.errors / self.count if self.count > 0 else 0,
+            'totalTimeMs': round(self.total_ms, 2),
+            'avgTimeMs': round(self.total_ms / self.count, 2) if self.count > 0 else 0,
+            'minTimeMs': round(self.min_ms, 2) if self.min_ms is not None else 0,
+            'maxTimeMs': round(self.max_ms, 2),
+            'p50TimeMs': self.percentile(0.5),
+            'p95TimeMs': self.percentile(0.95),
+            'p99TimeMs': self.percentile(0.99),
+            'totalRows': self.rows,
+            'avgRows': round(self.rows / successes, 2) if successes > 0 else 0,
+            'latencyHistogramMs': histogram,
+            'lastSeen': self.last_seen
+        }
+
+def _truncate_params(params):
+    """Rút gọn tham số (vd. embedding, danh sách dài) trước khi lưu vào slow log"""
+    truncated = {}
+    for key, value in (params or {}).items():
+        text = repr(value)
+        truncated[key] = text if len(text) <= _max_param_length else text[:_max_param_length] + '...'
+    return truncated
+
+def record_query(query, params, duration, rows=0, failed=False):
+    """
+    Ghi nhận một lần thực thi truy vấn
+
+    Args:
+        query: Câu truy vấn đã gửi tới Neo4j
+        params: Tham số của truy vấn
+        duration: Thời gian thực thi (giây)
+        rows: Số hàng trả về
+        failed: Truy vấn thất bại
+    """
+    global _untracked_count
+
+    fingerprint_id, normalized = fingerprint(query)
+    duration_ms = duration * 1000
+
+    with _stats_lock:
+        stats = _fingerprints.get(fingerprint_id)
+        if stats is None:
+            if len(_fingerprints) >= _max_fingerprints:
+                _untracked_count += 1
+                stats = None
+            else:
+                stats = _FingerprintStats(normalized)
+                _fingerprints[fingerprint_id] = stats
+
+        if stats is not None:
+            stats.record(duration_ms, rows, failed)
+
+        if duration_ms >= _slow_query_threshold_ms:
+            _slow_queries.append({
+                'fingerprint': fingerprint_id,
+                'query': query,
+                'params': _truncate_params(params),
+                'durationMs': round(duration_ms, 2),
+                'rows': rows,
+                'failed': failed,
+                'timestamp': time.time()
+            })
+
+def get_query_stats(sort_by='totalTimeMs', limit=50):
+    """
+    Lấy thống kê theo fingerprint và các lần chạy chậm nhất
+
+    Args:
+        sort_by: Trường dùng để sắp xếp fingerprint (giảm dần)
+        limit: Số fingerprint tối đa trả về
+    """
+    with _stats_lock:
+        fingerprints = [stats.to_dict(fingerprint_id) for fingerprint_id, stats in _fingerprints.items()]
+        slow_queries = sorted(_slow_queries, key=lambda entry: entry['durationMs'], reverse=True)
+        untracked = _untracked_count
+
+    if fingerprints and sort_by not in fingerprints[0]:
+        sort_by = 'totalTimeMs'
+    fingerprints.sort(key=lambda entry: entry[sort_by] or 0, reverse=True)
+
+    return {
+        'fingerprintCount': len(fingerprints),
+        'untrackedExecutions': untracked,
+        'slowQueryThresholdMs': _slow_query_threshold_ms,
+        'latencyBucketsMs': list(LATENCY_BUCKETS_MS),
+        'fingerprints': fingerprints[:limit],
+        'slowQueries': slow_queries
+    }
+
+def reset_query_stats():
+    """Xóa toàn bộ thống kê truy vấn"""
+    global _untracked_count
+
+    with _stats_lock:
+        _fingerprints.clear()
+        _slow_queries.clear()
+        _untracked_count = 0
@@ -0,0 +1,49 @@
+"""
+Query template layer - tạo câu truy vấn Cypher có nội dung cố định kèm $params
+Giá trị người dùng không bao giờ được chèn trực tiếp vào câu truy vấn, nhờ vậy
+Neo4j tái sử dụng được plan đã biên dịch và cache key phía client ổn định hơn
+"""
+import re
+from typing import Any, Dict, Iterable, NamedTuple
+
+# Ký tự đặc biệt trong cú pháp truy vấn Lucene cần escape
+_lucene_special_chars = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+class CypherQuery(NamedTuple):
+    """Câu truy vấn Cypher cố định và tham số đi kèm"""
+    text: str
+    params: Dict[str, Any]
+
+def cypher_query(text: str, **params) -> CypherQuery:
+    """Tạo CypherQuery từ câu truy vấn và các tham số"""
+    return CypherQuery(text, params)
+
+def contains_any(expression: str, param: str) -> str:
+    """
+    Điều kiện không phân biệt hoa thường: expression chứa ít nhất một chuỗi trong $param
+
+    Thay cho `expression =~ "(?i).*x.*"`: giá trị được so khớp như chuỗi thường
+    (không phải regex) và không phải biên dịch regex mới cho mỗi câu hỏi.
+    """
+    return f"any(term IN ${param} WHERE toLower({expression}) CONTAINS toLower(term))"
+
+def escape_lucene(term: str) -> str:
+    """Escape các ký tự đặc biệt của Lucene trong một chuỗi tìm kiếm"""
+    return _lucene_special_chars.sub(r'\\\1', term)
+
+def fulltext_search_text(terms: Iterable[str]) -> str:
+    """
+    Tạo chuỗi truy vấn Lucene cho db.index.fulltext.queryNodes từ danh sách cụm từ
+
+    Mỗi cụm từ khớp khi tất cả các từ của nó xuất hiện (từ cuối cho phép khớp tiền tố);
+    các cụm từ được nối bằng OR. Chuỗi này được truyền qua tham số, không chèn vào Cypher.
+    """
+    clauses = []
+    for term in terms:
+        # Truy vấn wildcard không qua analyzer nên cần chữ thường như trong index
+        words = [escape_lucene(word) for word in str(term).lower().split() if word]
+        if not words:
+            continue
+        words[-1] = words[-1] + '*'
+        clauses.append('(' + ' AND '.join(words) + ')')
+    return ' OR '.join(clauses)
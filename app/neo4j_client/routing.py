@@ -0,0 +1,133 @@
+"""
+Read/write routing - chọn access mode và bookmark cho mỗi session Neo4j
+Truy vấn đọc chạy bằng execute_read (được driver định tuyến tới read replica khi dùng
+URI neo4j://), truy vấn ghi bằng execute_write tới leader. Bookmark được giữ theo phiên
+chat để khách hàng luôn đọc được dữ liệu do chính mình vừa ghi (causal consistency).
+"""
+import os
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from neo4j import READ_ACCESS, WRITE_ACCESS
+
+READ = READ_ACCESS
+WRITE = WRITE_ACCESS
+
+# Cấu hình
+_max_bookmark_sessions = int(os.environ.get('NEO4J_BOOKMARK_SESSIONS', 10000))
+_decision_log_size = int(os.environ.get('NEO4J_ROUTING_LOG_SIZE', 100))
+
+# Phiên chat của request hiện tại (đặt ở ranh giới request, agent không cần biết)
+_bookmark_session = contextvars.ContextVar('neo4j_bookmark_session', default=None)
+
+_routing_lock = threading.Lock()
+_session_bookmarks = OrderedDict()  # {session id: neo4j.Bookmarks}, cuối = mới dùng nhất
+_route_counts = {READ: 0, WRITE: 0}
+_bookmarked_reads = 0  # Số lần đọc có kèm bookmark (chờ replica bắt kịp lần ghi trước)
+_bookmark_updates = 0
+_recent_decisions = deque(maxlen=_decision_log_size)
+
+def set_bookmark_session(session_id):
+    """Đặt phiên chat cho context hiện tại, trả về token để reset_bookmark_session"""
+    return _bookmark_session.set(str(session_id) if session_id is not None else None)
+
+def reset_bookmark_session(token):
+    """Khôi phục phiên chat trước đó của context"""
+    _bookmark_session.reset(token)
+
+def current_bookmark_session():
+    """Phiên chat của context hiện tại (None nếu không có)"""
+    return _bookmark_session.get()
+
+@contextmanager
+def bookmark_session(session_id):
+    """Chạy một khối lệnh trong phiên chat session_id"""
+    token = set_bookmark_session(session_id)
+    try:
+        yield
+    finally:
+        reset_bookmark_session(token)
+
+def get_bookmarks(session_id=None):
+    """Bookmark mới nhất của một phiên chat (mặc định phiên hiện tại)"""
+    session_id = session_id or current_bookmark_session()
+    if session_id is None:
+        return None
+
+    with _routing_lock:
+        bookmarks = _session_bookmarks.get(session_id)
+        if bookmarks is not None:
+            _session_bookmarks.move_to_end(session_id)
+        return bookmarks
+
+def update_bookmarks(bookmarks, session_id=None):
+    """Lưu bookmark sau một lần ghi của phiên chat (mặc định phiên hiện tại)"""
+    global _bookmark_updates
+
+    session_id = session_id or current_bookmark_session()
+    if session_id is None or not bookmarks:
+        return
+
+    with _routing_lock:
+        _session_bookmarks[session_id] = bookmarks
+        _session_bookmarks.move_to_end(session_id)
+        _bookmark_updates += 1
+        while len(_session_bookmarks) > _max_bookmark_sessions:
+            _session_bookmarks.popitem(last=False)
+
+def forget_bookmarks(session_id):
+    """Xóa bookmark của một phiên chat (vd. khi đăng xuất)"""
+    with _routing_lock:
+        _session_bookmarks.pop(str(session_id), None)
+
+def session_kwargs(access_mode, database=None, **extra):
+    """
+    Tham số tạo session cho một truy vấn và ghi nhận quyết định định tuyến
+
+    Args:
+        access_mode: READ hoặc WRITE
+        database: Database (mặc định database mặc định của server)
+        extra: Tham số session khác (vd. fetch_size)
+
+    Returns:
+        Dict: kwargs cho driver.session()
+    """
+    global _bookmarked_reads
+
+    session_id = current_bookmark_session()
+    bookmarks = get_bookmarks(session_id)
+
+    kwargs = dict(extra)
+    kwargs['default_access_mode'] = access_mode
+    if database:
+        kwargs['database'] = database
+    if bookmarks is not None:
+        kwargs['bookmarks'] = bookmarks
+
+    with _routing_lock:
+        _route_counts[access_mode] = _route_counts.get(access_mode, 0) + 1
+        if access_mode == READ and bookmarks is not None:
+            _bookmarked_reads += 1
+        _recent_decisions.append({
+            'accessMode': access_mode,
+            'database': database,
+            'session': session_id,
+            'bookmarked': bookmarks is not None,
+            'timestamp': time.time()
+        })
+
+    return kwargs
+
+def routing_stats():
+    """Thống kê định tuyến đọc/ghi và bookmark"""
+    with _routing_lock:
+        return {
+            'reads': _route_counts.get(READ, 0),
+            'writes': _route_counts.get(WRITE, 0),
+            'bookmarkedReads': _bookmarked_reads,
+            'bookmarkUpdates': _bookmark_updates,
+            'bookmarkSessions': len(_session_bookmarks),
+            'recentDecisions': list(_recent_decisions)
+        }
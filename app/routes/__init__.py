@@ -1,8 +1,9 @@
 """
 Routes package initialization
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, session, g
 from ..utils.logger import log_error
+from ..neo4j_client import routing
 
 class APIError(Exception):
     """Custom exception cho API errors"""
@@ -15,6 +16,19 @@ def create_blueprint(name):
     """Create blueprint với error handling"""
     bp = Blueprint(name, __name__)
 
+    @bp.before_request
+    def bind_bookmark_session():
+        # Truy vấn Neo4j trong request mang bookmark của phiên chat (đọc được dữ liệu vừa ghi)
+        user_id = session.get('user_id', 'guest')
+        session_id = user_id if user_id != 'guest' else session.sid if hasattr(session, 'sid') else None
+        g.neo4j_bookmark_token = routing.set_bookmark_session(session_id)
+
+    @bp.teardown_request
+    def unbind_bookmark_session(error=None):
+        token = g.pop('neo4j_bookmark_token', None)
+        if token is not None:
+            routing.reset_bookmark_session(token)
+
     @bp.errorhandler(APIError)
     def handle_api_error(error):
         log_error(f"API Error: {str(error)}", {
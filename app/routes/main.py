@@ -37,6 +37,10 @@ def logout():
             from ..utils.logger import log_error
             log_error(f"Lỗi khi xóa lịch sử chat từ ChatHistoryAgent: {str(e)}")
 
+        # Xóa bookmark Neo4j của phiên
+        from ..neo4j_client.routing import forget_bookmarks
+        forget_bookmarks(session_id)
+
         # Xóa thông tin người dùng khỏi phiên
         session.pop('user_id', None)
         session.pop('user_name', None)
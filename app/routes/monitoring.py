@@ -2,6 +2,8 @@ from flask import Blueprint, request
 from flask_login import login_required
 from ..utils.monitoring import monitoring_service, HealthStatus
 from ..neo4j_client.connection import get_metrics as neo4j_get_metrics
+from ..neo4j_client.query_stats import get_query_stats, reset_query_stats
+from ..neo4j_client.profiler import get_profile_stats, reset_profile_stats
 from ..utils.backup import backup_service
 from ..utils.scheduler import scheduler_service
 from ..utils.logger import log_error, log_info
@@ -92,6 +94,88 @@ def get_neo4j_metrics():
             error_code='NEO4J_METRICS_ERROR'
         )
 
+@monitoring.route('/metrics/neo4j/queries', methods=['GET'])
+@login_required
+@log_request
+def get_neo4j_query_metrics():
+    """API endpoint để lấy thống kê truy vấn Neo4j theo fingerprint và slow query log"""
+    try:
+        sort_by = request.args.get('sort', 'totalTimeMs')
+        limit = int(request.args.get('limit', 50))
+
+        stats = get_query_stats(sort_by=sort_by, limit=limit)
+        return formatter.success(data=stats)
+
+    except ValueError:
+        return formatter.validation_error({
+            'limit': 'limit phải là một số nguyên'
+        })
+    except Exception as e:
+        log_error(f"Lỗi khi lấy thống kê truy vấn Neo4j: {str(e)}")
+        return formatter.error(
+            message='Lỗi khi lấy thống kê truy vấn Neo4j',
+            status_code=500,
+            error_code='NEO4J_QUERY_METRICS_ERROR'
+        )
+
+@monitoring.route('/metrics/neo4j/queries/clear', methods=['POST'])
+@login_required
+@log_request
+def clear_neo4j_query_metrics():
+    """API endpoint để xóa thống kê truy vấn Neo4j"""
+    try:
+        reset_query_stats()
+        return formatter.success(message='Đã xóa thống kê truy vấn Neo4j')
+
+    except Exception as e:
+        log_error(f"Lỗi khi xóa thống kê truy vấn Neo4j: {str(e)}")
+        return formatter.error(
+            message='Lỗi khi xóa thống kê truy vấn Neo4j',
+            status_code=500,
+            error_code='CLEAR_NEO4J_QUERY_METRICS_ERROR'
+        )
+
+@monitoring.route('/metrics/neo4j/profiles', methods=['GET'])
+@login_required
+@log_request
+def get_neo4j_profile_metrics():
+    """API endpoint để lấy kết quả PROFILE lấy mẫu và các plan tốn kém nhất"""
+    try:
+        limit = int(request.args.get('limit', 50))
+        include_plans = request.args.get('plans', 'true').lower() != 'false'
+
+        stats = get_profile_stats(limit=limit, include_plans=include_plans)
+        return formatter.success(data=stats)
+
+    except ValueError:
+        return formatter.validation_error({
+            'limit': 'limit phải là một số nguyên'
+        })
+    except Exception as e:
+        log_error(f"Lỗi khi lấy kết quả PROFILE truy vấn Neo4j: {str(e)}")
+        return formatter.error(
+            message='Lỗi khi lấy kết quả PROFILE truy vấn Neo4j',
+            status_code=500,
+            error_code='NEO4J_PROFILE_METRICS_ERROR'
+        )
+
+@monitoring.route('/metrics/neo4j/profiles/clear', methods=['POST'])
+@login_required
+@log_request
+def clear_neo4j_profile_metrics():
+    """API endpoint để xóa kết quả PROFILE truy vấn Neo4j"""
+    try:
+        reset_profile_stats()
+        return formatter.success(message='Đã xóa kết quả PROFILE truy vấn Neo4j')
+
+    except Exception as e:
+        log_error(f"Lỗi khi xóa kết quả PROFILE truy vấn Neo4j: {str(e)}")
+        return formatter.error(
+            message='Lỗi khi xóa kết quả PROFILE truy vấn Neo4j',
+            status_code=500,
+            error_code='CLEAR_NEO4J_PROFILE_METRICS_ERROR'
+        )
+
 @monitoring.route('/metrics/performance', methods=['GET'])
 @login_required
 @log_request
@@ -6,6 +6,7 @@ from . import create_blueprint, APIError
 from ..utils.logger import log_info, log_error
 from ..utils.middleware import rate_limit, log_request, init_request_context
 from ..agents.order_agent.logic import OrderAgent
+from ..neo4j_client.connection import invalidate_labels
 from ..utils.response_formatter import formatter
 
 # Create blueprint
@@ -103,6 +104,9 @@ def create_order():
         order_agent = OrderAgent()
         order = order_agent.create_order(user_id, data)
 
+        # Chỉ làm mới cache đơn hàng, giữ nguyên cache catalog
+        invalidate_labels({"Order", "Order_Detail"})
+
         return jsonify({
             'success': True,
             'message': 'Đơn hàng đã được tạo thành công',
@@ -0,0 +1,100 @@
+from neo4j import Bookmarks
+from app.neo4j_client import connection, routing
+from app.neo4j_client.batch_loader import BatchLoader
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __iter__(self):
+        return iter(_Record(row) for row in self._rows)
+
+    def keys(self):
+        return list(self._rows[0].keys()) if self._rows else []
+
+    def consume(self):
+        return None
+
+class _Record:
+    def __init__(self, row):
+        self._row = row
+
+    def data(self):
+        return dict(self._row)
+
+    def values(self):
+        return tuple(self._row.values())
+
+class _Session:
+    """Stand-in session: ghi nhận access mode và bookmark, trả về id đã tra cứu"""
+
+    def __init__(self, driver, kwargs):
+        self._driver = driver
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, params):
+        self._driver.sessions.append((self.kwargs, query))
+        return _Result([{'key': id, 'customer': {'id': id}} for id in params.get('ids', [])])
+
+    def execute_read(self, fn, *args):
+        return fn(self, *args)
+
+    execute_write = execute_read
+
+    def last_bookmarks(self):
+        return Bookmarks.from_raw_values(["bookmark:1"])
+
+class _StandInDriver:
+    def __init__(self):
+        self.sessions = []
+
+    def session(self, **kwargs):
+        return _Session(self, kwargs)
+
+def _load_customers(ids):
+    result = connection.execute_query_with_semaphore(
+        "UNWIND $ids AS id MATCH (c:Customer {id: id}) RETURN id AS key, c {.*} AS customer",
+        {'ids': ids}, use_cache=False)
+    return {row['key']: row['customer'] for row in result}
+
+def test_batched_read_after_write_is_bookmarked():
+    driver = _StandInDriver()
+    connection.use_driver(driver)
+    loader = BatchLoader(_load_customers, name="test_customer")
+    try:
+        with routing.bookmark_session("customer-1"):
+            connection.execute_query_with_semaphore(
+                "MATCH (c:Customer {id: $id}) SET c.name = $name", {'id': 1, 'name': 'An'})
+            assert loader.load(1) == {'id': 1}
+
+        write_kwargs, _ = driver.sessions[0]
+        read_kwargs, read_query = driver.sessions[-1]
+        assert write_kwargs['default_access_mode'] == routing.WRITE
+        assert "UNWIND $ids" in read_query
+        assert read_kwargs['default_access_mode'] == routing.READ
+        assert read_kwargs['bookmarks'].raw_values == frozenset({"bookmark:1"})
+        assert loader.stats()['bookmarkedLoads'] == 1
+    finally:
+        routing.forget_bookmarks("customer-1")
+        connection.use_driver(None)
+
+def test_read_without_bookmarks_is_batched():
+    driver = _StandInDriver()
+    connection.use_driver(driver)
+    loader = BatchLoader(_load_customers, name="test_customer_batched")
+    try:
+        with routing.bookmark_session("customer-2"):
+            assert loader.load(2) == {'id': 2}
+
+        read_kwargs, _ = driver.sessions[-1]
+        assert 'bookmarks' not in read_kwargs
+        assert loader.stats()['batches'] == 1
+        assert loader.stats()['bookmarkedLoads'] == 0
+    finally:
+        connection.use_driver(None)
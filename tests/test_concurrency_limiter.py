@@ -0,0 +1,42 @@
+import random
+from app.neo4j_client.concurrency_limiter import AdaptiveConcurrencyLimiter
+
+FAST = "MATCH (c:Category) RETURN c.id"
+SLOW = "MATCH (v:Variant)-[:PRODUCT_ID]->(p:Product) RETURN v, p"
+
+def _run(limiter, releases, latency_for):
+    rng = random.Random(42)
+    for _ in range(releases):
+        assert limiter.acquire(timeout=0)
+        fingerprint, latency = latency_for(rng)
+        limiter.release(latency, fingerprint=fingerprint)
+
+def _mixed(scale=1.0):
+    def latency_for(rng):
+        if rng.random() < 0.7:
+            return FAST, 0.005 * rng.uniform(0.8, 1.2) * scale
+        return SLOW, 0.4 * rng.uniform(0.8, 1.2) * scale
+    return latency_for
+
+def test_mixed_latency_workload_keeps_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, decrease_cooldown=0)
+    _run(limiter, 3000, _mixed())
+    assert limiter.limit >= 20
+    assert limiter.stats()['limitDecreases'] == 0
+
+def test_latency_spike_decreases_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, decrease_cooldown=0)
+    _run(limiter, 500, _mixed())
+    _run(limiter, 50, _mixed(scale=4.0))
+    assert limiter.limit < 20
+
+def test_limit_recovers_without_saturation():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, decrease_cooldown=0)
+    _run(limiter, 500, _mixed())
+    _run(limiter, 50, _mixed(scale=4.0))
+    decreased = limiter.limit
+
+    # Một truy vấn tại một thời điểm: limit không bao giờ bị dùng gần hết
+    _run(limiter, 3000, _mixed())
+    assert decreased < limiter.limit
+    assert limiter.limit >= 20
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from app.neo4j_client import catalog_mirror
+
+# GraphRAG agent cần các phụ thuộc của app (PhoBERT config, sklearn, ...)
+core = pytest.importorskip("app.agents.graphrag_agent.core")
+from app.agents.graphrag_agent.core import GraphRAGCore
+from app.agents.graphrag_agent.vector_store import VectorStore
+
+VARIANTS = [
+    {'product_id': 'p1', 'product_name': 'Cà phê sữa', 'category_id': 'c1', 'category_name': 'Cà phê',
+     'variant_id': 'v1', 'beverage_option': 'Đá', 'price': 30000, 'sales_rank': 2},
+    {'product_id': 'p2', 'product_name': 'Trà đào', 'category_id': 'c2', 'category_name': 'Trà',
+     'variant_id': 'v2', 'beverage_option': 'Đá', 'price': 35000, 'sales_rank': 1},
+    {'product_id': 'p2', 'product_name': 'Trà đào', 'category_id': 'c2', 'category_name': 'Trà',
+     'variant_id': 'v3', 'beverage_option': 'Nóng', 'price': 35000, 'sales_rank': 3},
+]
+
+class _PhoBERT:
+    is_loaded = True
+
+    def get_embedding(self, text):
+        return np.array([0.0, 1.0], dtype=np.float32)
+
+def _intent(names):
+    return {'intent_text': 'đồ uống thanh mát', 'product_names': {'vi': names, 'en': []},
+            'category_names': [], 'filters': {}, 'is_store_query': False, 'is_order_query': False}
+
+def _setup(monkeypatch):
+    snapshot = catalog_mirror._CatalogSnapshot(VARIANTS, [], [], [], {}, 'test')
+    store = VectorStore(np.array([[1.0, 0.0], [0.0, 1.0]]), ['product', 'product'], ['p1', 'p2'],
+                        ['Cà phê sữa', 'Trà đào'], ['p1', 'p2'])
+    monkeypatch.setattr(catalog_mirror, '_snapshot', snapshot)
+    monkeypatch.setattr(catalog_mirror, '_mirror_enabled', True)
+    monkeypatch.setattr(catalog_mirror, '_stale', False)
+    monkeypatch.setattr(core, 'get_vector_store', lambda: store)
+    monkeypatch.setattr(core, 'get_phobert_manager', lambda: _PhoBERT())
+
+def test_semantic_search_ranks_unmatched_intent_by_embedding(monkeypatch):
+    _setup(monkeypatch)
+    rows = GraphRAGCore().semantic_search(_intent(['sinh tố']))
+    # Keyword filter matches nothing, so the whole catalog is ranked: Trà đào first, variants by sales_rank
+    assert [row['variant_id'] for row in rows] == ['v2', 'v3', 'v1']
+
+def test_semantic_search_is_narrowed_by_keyword_matches(monkeypatch):
+    _setup(monkeypatch)
+    rows = GraphRAGCore().semantic_search(_intent(['cà phê']))
+    assert [row['variant_id'] for row in rows] == ['v1']
+
+def test_semantic_search_skips_store_intents(monkeypatch):
+    _setup(monkeypatch)
+    intent = _intent(['sinh tố'])
+    intent['is_store_query'] = True
+    assert GraphRAGCore().semantic_search(intent) is None